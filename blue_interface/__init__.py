@@ -1,3 +1,22 @@
-from .blue_interface import BlueInterface
+import sys
 
-__all__ = ["BlueInterface"]
+from .blue_interface import BlueInterface, BlueSession, BlueState
+from .history import BlueHistory
+from .ik_cache import IKCache
+from .streaming import MotionHandle
+from .workspace import WorkspaceMap
+
+__all__ = [
+    "BlueInterface",
+    "BlueSession",
+    "BlueState",
+    "BlueHistory",
+    "IKCache",
+    "MotionHandle",
+    "WorkspaceMap",
+]
+
+if sys.version_info >= (3, 6):
+    from .async_blue_interface import AsyncBlueInterface
+
+    __all__.append("AsyncBlueInterface")
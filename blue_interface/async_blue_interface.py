@@ -0,0 +1,454 @@
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .async_rosbridge_client import AsyncROSBridgeClient
+from .rosbridge_client import ROSBridgeServiceError
+from .blue_interface import _BlueController, _BlueInterfaceBase, _is_no_solution
+from .ik_cache import IKCache
+from .workspace import WorkspaceMap
+
+
+class AsyncBlueInterface(_BlueInterfaceBase):
+    """An asyncio interface for controlling the Blue robot through rosbridge.
+
+    Every method that talks to the robot is a coroutine, so a single event loop
+    can drive many arms and many outstanding requests. Create instances with
+    `create()`:
+
+    .. code-block:: python
+
+       blue = await AsyncBlueInterface.create(side="right", ip="127.0.0.1")
+       joint_positions = await blue.inverse_kinematics(position, orientation)
+       await blue.set_joint_positions(joint_positions, duration=3.0)
+       await blue.shutdown()
+
+    Args:
+        side (str): side of the arm, "left" or "right"
+        rosbridge (AsyncROSBridgeClient): A connected rosbridge client. Can be
+            shared between arms, which then also share one joint state
+            subscription.
+        compression (str, optional): Compression requested from rosbridge for
+            the joint state and end effector pose streams; one of "none" or
+            "cbor". Defaults to "cbor".
+        state_rate (float, optional): Maximum rate, in Hz, at which rosbridge
+            sends joint states and end effector poses. Defaults to None, which
+            receives every joint state.
+        history_size (int, optional): Number of recent joint states to keep
+            for `get_history()`. Defaults to None, which keeps no history.
+        pose_source (str, optional): "local" or "tf"; see `BlueInterface`.
+            Defaults to "local".
+        ik_cache (IKCache, optional): A cache for `inverse_kinematics()`
+            results. Defaults to None, which disables caching.
+        workspace_map (WorkspaceMap, optional): Seeds for
+            `inverse_kinematics()` calls without one; see `BlueInterface`.
+            Defaults to None.
+        service_timeout (float, optional): Seconds to wait for each ROS
+            service call before raising `asyncio.TimeoutError`. Defaults to
+            10.
+    """
+
+    def __init__(
+        self,
+        side,  # type: str
+        rosbridge,  # type: AsyncROSBridgeClient
+        compression="cbor",  # type: str
+        state_rate=None,  # type: Optional[float]
+        history_size=None,  # type: Optional[int]
+        pose_source="local",  # type: str
+        ik_cache=None,  # type: Optional[IKCache]
+        workspace_map=None,  # type: Optional[WorkspaceMap]
+        service_timeout=10.0,  # type: float
+    ):  # type: (...) -> None
+        self._owns_connection = False
+        self._service_timeout = service_timeout
+        self._state_ready = asyncio.Event()
+        self._state_queues = []  # type: List[asyncio.Queue]
+        self._RBC = rosbridge  # type: AsyncROSBridgeClient
+        _BlueInterfaceBase.__init__(
+            self,
+            side,
+            rosbridge,
+            compression,
+            state_rate,
+            history_size=history_size,
+            pose_source=pose_source,
+            ik_cache=ik_cache,
+            workspace_map=workspace_map,
+        )
+
+    @classmethod
+    async def create(
+        cls,
+        side,  # type: str
+        ip,  # type: str
+        port=9090,  # type: int
+        compression="cbor",  # type: str
+        state_rate=None,  # type: Optional[float]
+        startup_timeout=10.0,  # type: Optional[float]
+        history_size=None,  # type: Optional[int]
+        pose_source="local",  # type: str
+        ik_cache=None,  # type: Optional[IKCache]
+        workspace_map=None,  # type: Optional[WorkspaceMap]
+        service_timeout=10.0,  # type: float
+    ):  # type: (...) -> AsyncBlueInterface
+        """Connect to rosbridge, load controllers, and wait for the first robot
+        state.
+
+        Args:
+            side (str): side of the arm, "left" or "right"
+            ip (str): The IP address of the robot, which by default should have
+                a running rosbridge server.
+            port (int, optional): The websocket port number for rosbridge.
+                Defaults to 9090.
+            compression (str, optional): See `AsyncBlueInterface`.
+            state_rate (float, optional): See `AsyncBlueInterface`.
+            startup_timeout (float, optional): Seconds to wait for the first
+                robot state before raising `asyncio.TimeoutError`. None waits
+                forever. Defaults to 10.
+            history_size (int, optional): See `AsyncBlueInterface`.
+            pose_source (str, optional): See `AsyncBlueInterface`.
+            ik_cache (IKCache, optional): See `AsyncBlueInterface`.
+            workspace_map (WorkspaceMap, optional): See `AsyncBlueInterface`.
+            service_timeout (float, optional): See `AsyncBlueInterface`.
+
+        Returns:
+            AsyncBlueInterface: A ready-to-use interface.
+        """
+        loop = asyncio.get_event_loop()
+        start_time = loop.time()
+        rosbridge = AsyncROSBridgeClient(ip, port)
+        await rosbridge.connect()
+        connect_time = loop.time() - start_time
+        try:
+            blue = cls(
+                side,
+                rosbridge,
+                compression,
+                state_rate,
+                history_size=history_size,
+                pose_source=pose_source,
+                ik_cache=ik_cache,
+                workspace_map=workspace_map,
+                service_timeout=service_timeout,
+            )
+            blue._owns_connection = True
+            await blue.start(startup_timeout)
+        except BaseException:
+            await rosbridge.close()
+            raise
+        blue._startup_times["connect"] = connect_time
+        blue._startup_times["total"] += connect_time
+        return blue
+
+    async def start(
+        self,
+        startup_timeout=10.0,  # type: Optional[float]
+    ):  # type: (...) -> None
+        """Load and stop all controllers, then wait for the first robot state.
+        Called by `create()`; only needed when constructing directly.
+
+        Args:
+            startup_timeout (float, optional): Seconds to wait for the first
+                robot state before raising `asyncio.TimeoutError`. None waits
+                forever. Defaults to 10.
+        """
+        loop = asyncio.get_event_loop()
+        start_time = loop.time()
+        await asyncio.gather(
+            *[self._load_controller(c) for c in self._managed_controllers]
+        )
+        await self._switch_controller([], self._managed_controllers)
+        controllers_time = loop.time()
+        try:
+            await asyncio.wait_for(self._state_ready.wait(), startup_timeout)
+        except asyncio.TimeoutError:
+            raise asyncio.TimeoutError(self._state_timeout_message(startup_timeout))
+        self._record_startup_times(
+            start_time, start_time, controllers_time, loop.time()
+        )
+
+    async def shutdown(self):  # type: (...) -> None
+        """Clean up and close connection to host computer. All control will be
+        disabled. Unlike `BlueInterface`, this does not run automatically when
+        your script exits. The connection is only closed if it was opened by
+        `create()`."""
+        await self._switch_controller([], self._managed_controllers)
+        await asyncio.gather(
+            *[self._unload_controller(c) for c in self._managed_controllers]
+        )
+        self._joint_state_stream.detach(self._joint_state_callback)
+        if self._owns_connection:
+            await self._RBC.close()
+
+    async def calibrate_gripper(self):  # type: (...) -> None
+        """Run the gripper position calibration process.
+        This will automatically determine the gripper position by apply a closing
+        torque and detecting when the gripper has fully closed."""
+
+        gripper_enabled = self._gripper_enabled
+        if gripper_enabled:
+            await self.disable_gripper()
+
+        await self._RBC.call_service(
+            self._calibrate_gripper_client, {}, self._service_timeout
+        )
+
+        if gripper_enabled:
+            await self.enable_gripper()
+
+    async def command_gripper(
+        self,
+        position,  # type: float
+        effort,  # type: float
+        wait=False,  # type: bool
+    ):  # type: (...) -> None
+        """Send a goal to gripper, and optionally wait for the goal to be reached.
+
+        Args:
+            position (float64): gap size between gripper fingers in cm.
+            effort (float64): maximum effort the gripper with exert before
+                stalling in N.
+            wait (bool, optional): Wait until the gripper reaches the goal or
+                stalls, raising `asyncio.TimeoutError` if that takes longer
+                than `service_timeout`. Defaults to False.
+        """
+        if not self._gripper_enabled:
+            await self.enable_gripper()
+
+        goal_msg = {"command": {"position": position, "max_effort": effort}}
+        done = asyncio.get_event_loop().create_future()
+
+        def callback(result, status):
+            if (result["stalled"] or result["reached_goal"]) and not done.done():
+                done.set_result(None)
+
+        self._gripper_goal_id = self._gripper_action_client.send_goal(
+            goal_msg, callback, callback
+        )
+        if wait:
+            await asyncio.wait_for(done, self._service_timeout)
+
+    async def set_joint_positions(
+        self,
+        joint_positions,  # type: np.ndarray
+        duration=0.0,  # type: float
+        soft_position_control=False,  # type: bool
+    ):  # type: (...) -> None
+        """Move arm to specified position in joint space.
+
+        Args:
+            joint_positions (iterable): An array of 7 joint angles, in radians,
+                ordered from proximal to distal.
+            duration (float, optional): Seconds to take to reach the target,
+                interpolating in joint space. Defaults to 0.
+            soft_position_control (bool, optional): Use "software" position
+                control. Defaults to False.
+        """
+        joint_positions = np.asarray(joint_positions)
+        assert len(joint_positions) == 7
+
+        await self._set_control_mode(
+            _BlueController.SOFT_POSITION
+            if soft_position_control
+            else _BlueController.POSITION
+        )
+
+        loop = asyncio.get_event_loop()
+        start_positions = self.get_joint_positions()
+        start_time = loop.time()
+        end_time = start_time + duration
+        while loop.time() < end_time:
+            scale = (loop.time() - start_time) / duration
+            self._set_joint_positions(
+                start_positions + scale * (joint_positions - start_positions),
+                soft_position_control,
+            )
+            await asyncio.sleep(1.0 / 60.0)
+
+        self._set_joint_positions(joint_positions, soft_position_control)
+
+    async def set_joint_torques(
+        self,
+        joint_torques,  # type: np.ndarray
+    ):  # type: (...) -> None
+        """Command joint torques to the arm.
+
+        Args:
+            joint_torques (iterable): An array of 7 joint torques, in Nm,
+            ordered from proximal to distal.
+        """
+        joint_torques = np.asarray(joint_torques)
+        assert len(joint_torques) == 7
+
+        await self._set_control_mode(_BlueController.TORQUE)
+
+        self._joint_torque_publisher.publish_float64_array(joint_torques)
+
+    async def disable_control(self):  # type: (...) -> None
+        """Set joint control mode to gravity compensation only."""
+        await self._set_control_mode(_BlueController.GRAV_COMP)
+
+    async def enable_gripper(self):  # type: (...) -> None
+        """Enables the gripper. The gripper will begin to hold position."""
+        await self._switch_controller(
+            [self._controller_lookup[_BlueController.GRIPPER]], []
+        )
+        self._gripper_enabled = True
+
+    async def disable_gripper(self):  # type: (...) -> None
+        """Disables the gripper. The gripper will become compliant."""
+        await self._switch_controller(
+            [], [self._controller_lookup[_BlueController.GRIPPER]]
+        )
+        self._gripper_enabled = False
+
+    async def inverse_kinematics(
+        self,
+        position,  # type: np.ndarray
+        orientation,  # type: np.ndarray
+        seed_joint_positions=[],  # type: Sequence
+        solver="trac-ik",  # type: str
+    ):  # type: (...) -> np.ndarray
+        """Given a desired cartesian pose for the end effector, compute the
+        necessary joint angles. Many calls can be awaited concurrently.
+
+        Args:
+            position (iterable): A length-3 array containing a cartesian position
+                (x,y,z), wrt the world frame.
+            orientation (iterable): A length-4 array containing a quaternion
+                (x,y,z,w), wrt the world frame.
+            seed_joint_positions (iterable, optional): An array of 7 joint
+                angles, to be used to initalize the IK solver.
+            solver (str, optional): "trac-ik" or "local"; see
+                `BlueInterface.inverse_kinematics()`. Defaults to "trac-ik".
+        Returns:
+            numpy.ndarray: An array of 7 joint angles, or an empty array if no
+            solution was found.
+        """
+        cache = self._ik_cache
+        if cache is not None:
+            key = cache.key(
+                position, orientation, seed_joint_positions, solver, self._side
+            )
+            solution = cache.get(key)
+            if solution is not None:
+                return solution
+        seed_joint_positions = self._ik_seed(
+            position, orientation, seed_joint_positions
+        )
+
+        found = True
+        if solver == "local":
+            solution = self._local_inverse_kinematics(
+                position, orientation, seed_joint_positions
+            )
+            # A local solve can fail from one start and succeed from another
+            found = len(solution) != 0
+        else:
+            request_msg = self._inverse_kinematics_request(
+                position, orientation, seed_joint_positions, solver
+            )
+            try:
+                values = await self._RBC.call_service(
+                    self._inverse_kinematics_client, request_msg, self._service_timeout
+                )
+            except ROSBridgeServiceError as e:
+                solution = np.asarray([])
+                found = _is_no_solution(e.values)
+            else:
+                solution = np.asarray(values["ik_joint_positions"])
+
+        if cache is not None and found:
+            cache.put(key, solution)
+        return solution
+
+    async def joint_states(self):  # type: (...) -> AsyncIterator[Dict[str, np.ndarray]]
+        """Iterate over joint states as they arrive. If the consumer falls
+        behind, intermediate states are skipped and only the newest is kept.
+
+        Yields:
+            dict: Joint state in the form {"position": numpy.ndarray,
+            "velocity": numpy.ndarray, "effort": numpy.ndarray}, each with 7
+            values ordered from proximal to distal.
+        """
+        queue = asyncio.Queue(maxsize=1)  # type: asyncio.Queue
+        self._state_queues.append(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._state_queues.remove(queue)
+
+    def _joint_state_callback(
+        self,
+        message,  # type: Dict[str, Any]
+    ):  # type: (...) -> None
+        _BlueInterfaceBase._joint_state_callback(self, message)
+        if len(self._state_queues) == 0 or self._state is None:
+            return
+        state = {
+            "position": self.get_joint_positions(),
+            "velocity": self.get_joint_velocities(),
+            "effort": self.get_joint_torques(),
+        }
+        for queue in self._state_queues:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(state)
+
+    async def _set_control_mode(
+        self,
+        mode,  # type: _BlueController
+    ):  # type: (...) -> bool
+        if mode == self._control_mode:
+            return True
+        await self._switch_controller(
+            [self._controller_lookup[mode]],
+            [self._controller_lookup[self._control_mode]],
+            new_control_mode=mode,
+        )
+        return mode == self._control_mode
+
+    async def _switch_controller(
+        self,
+        start,  # type: List[str]
+        stop,  # type: List[str]
+        new_control_mode=None,  # type: Optional[_BlueController]
+    ):  # type: (...) -> None
+        request_msg = self._switch_controller_request(start, stop)
+        try:
+            await self._RBC.call_service(
+                self._switch_controller_service_client,
+                request_msg,
+                self._service_timeout,
+            )
+        except ROSBridgeServiceError:
+            # The control mode is left unchanged
+            pass
+        else:
+            if new_control_mode is not None:
+                self._control_mode = new_control_mode
+
+        # Even after the controller is successfully switched, it needs a moment
+        # to instantiate the command topic subscriber, etc
+        await asyncio.sleep(0.01)
+
+    async def _load_controller(
+        self,
+        name,  # type: str
+    ):  # type: (...) -> None
+        await self._RBC.call_service(
+            self._load_controller_service_client, {"name": name}, self._service_timeout
+        )
+
+    async def _unload_controller(
+        self,
+        name,  # type: str
+    ):  # type: (...) -> None
+        await self._RBC.call_service(
+            self._unload_controller_service_client,
+            {"name": name},
+            self._service_timeout,
+        )
@@ -0,0 +1,167 @@
+"""This module provides an asyncio client for rosbridge, built on the `websockets`
+package. It shares all message handling with `ROSBridgeClient`.
+"""
+
+import asyncio
+import traceback
+from typing import Dict, Optional
+
+from .rosbridge_client import ROSBridgeProtocol, ROSBridgeServiceError
+
+
+class AsyncROSBridgeClient(ROSBridgeProtocol):
+    """AsyncROSBridgeClient manages a connection to the server from an asyncio event loop.
+
+    Publishers, subscribers, services and action clients are created exactly like with ROSBridgeClient.
+    All callbacks run on the event loop, and outgoing frames are queued and written by a background task,
+    so nothing here blocks the loop. Many clients can share one loop.
+    """
+
+    def __init__(self, ip, port=9090):
+        """Constructor for AsyncROSBridgeClient. Call `connect()` before use.
+
+        Args:
+            ip (str): The robot IP address.
+            port (int, optional): The WebSocket port number for rosbridge. Defaults to 9090.
+        """
+        ROSBridgeProtocol.__init__(self)
+        self._url = "ws://{}:{}".format(ip, port)
+        self._websocket = None
+        self._outgoing = None  # type: Optional[asyncio.Queue]
+        self._latest = {}  # type: Dict[str, str]
+        self._tasks = []
+
+    async def connect(self):
+        """Open the connection to rosbridge and start the reader and writer tasks."""
+        try:
+            import websockets
+        except ImportError:
+            raise ImportError(
+                "AsyncROSBridgeClient requires the `websockets` package; "
+                "install it with `pip install blue_interface[asyncio]`"
+            )
+
+        self._websocket = await websockets.connect(self._url, max_size=None)
+        self._outgoing = asyncio.Queue()
+        loop = asyncio.get_event_loop()
+        self._tasks = [
+            loop.create_task(self._read_loop()),
+            loop.create_task(self._write_loop()),
+        ]
+        print("Connected with rosbridge")
+
+    async def close(self):
+        """Flush queued frames and close the connection."""
+        if self._websocket is None:
+            return
+        reader, writer = self._tasks
+        if not writer.done():
+            # The writer stops if sending fails, leaving the rest unsent
+            flushed = asyncio.ensure_future(self._outgoing.join())
+            await asyncio.wait([flushed, writer], return_when=asyncio.FIRST_COMPLETED)
+            flushed.cancel()
+        for task in self._tasks:
+            task.cancel()
+        await self._websocket.close()
+        self._websocket = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def send(self, payload):
+        """Queue a text frame to be sent to the server.
+
+        Args:
+            payload (str): The serialized rosbridge message.
+        """
+        self._outgoing.put_nowait((None, payload))
+
+    def send_latest(self, key, payload):
+        """Queue a text frame that replaces any unsent frame queued with the same key.
+
+        Args:
+            key (str): Frames with equal keys supersede each other, eg. a topic name.
+            payload (str): The serialized rosbridge message.
+        """
+        if key not in self._latest:
+            self._outgoing.put_nowait((key, None))
+        self._latest[key] = payload
+
+    async def call_service(self, service, request, timeout=None):
+        """Call a ROS service and wait for its response.
+
+        Args:
+            service (_Service): A service client created with `service()`.
+            request (dict): A request message to send.
+            timeout (float, optional): Seconds to wait for the response. Defaults to None, which
+                waits forever.
+
+        Returns:
+            The response values from the service server.
+
+        Raises:
+            ROSBridgeServiceError: If the service call fails.
+            asyncio.TimeoutError: If no response arrives within `timeout`.
+        """
+        future = asyncio.get_event_loop().create_future()
+
+        def callback(success, values):
+            if future.done():
+                return
+            if success:
+                future.set_result(values)
+            else:
+                future.set_exception(
+                    ROSBridgeServiceError(service._service_name, values)
+                )
+
+        service_id = service.request(request, callback)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            # Late responses, after a timeout or cancellation, are dropped
+            self.unregister_service_callback(service_id)
+
+    async def _read_loop(self):
+        try:
+            async for frame in self._websocket:
+                # A bad frame mustn't end the reader, which every pending call
+                # and subscription depends on
+                try:
+                    self._handle_frame(frame, isinstance(frame, bytes))
+                except Exception:
+                    print("Error handling frame from rosbridge:")
+                    traceback.print_exc()
+        finally:
+            print("Disconnected with rosbridge")
+
+    async def _write_loop(self):
+        while True:
+            key, payload = await self._outgoing.get()
+            if key is not None:
+                payload = self._latest.pop(key)
+            try:
+                await self._websocket.send(payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print("Error sending to rosbridge: {}".format(e))
+                self._fail_service_calls(e)
+                return
+            finally:
+                self._outgoing.task_done()
+
+    def _fail_service_calls(self, error):
+        """Fail every service call waiting for a response, since none will arrive.
+
+        Args:
+            error (Exception): Why the calls failed.
+        """
+        for service_id in list(self._services):
+            callback = self.unregister_service_callback(service_id)
+            if callback is not None:
+                callback(False, "Connection to rosbridge failed: {}".format(error))
@@ -1,34 +1,86 @@
 import atexit
+import collections
+import json
 import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, Future, TimeoutError, wait
 from enum import Enum
-from typing import Any, Dict, List, Optional, Sequence
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
 
 import numpy as np
 
-from .rosbridge_client import ROSBridgeClient
-
-
-class BlueInterface:
-    """A Python interface for controlling the Blue robot through rosbridge.
+from .history import BlueHistory, _HistoryBuffer
+from .ik_cache import IKCache
+from .kinematics import KinematicChain
+from .rosbridge_client import (
+    ROSBridgeClient,
+    ROSBridgeProtocol,
+    ROSBridgeServiceError,
+)
+from .streaming import (
+    MotionHandle,
+    _linear_joint_motion,
+    _StreamScheduler,
+    _TorqueController,
+)
+from .trajectory import (
+    _densify_path,
+    _min_jerk,
+    _PathMotion,
+    _plan_trajectory,
+    _table_motion,
+    _VelocityMotion,
+)
+from .workspace import WorkspaceMap
+
+
+class _BlueInterfaceBase:
+    """Transport-independent parts of the Blue arm API: ROS names, pub/sub setup,
+    robot state bookkeeping, and request message construction. Shared by
+    `BlueInterface` and `AsyncBlueInterface`.
+
+    Subclasses must set `self._state_ready` to an event (`threading.Event` or
+    `asyncio.Event`) before calling this constructor; it's set once the first
+    joint state and end effector pose have both arrived.
 
     Args:
         side (str): side of the arm, "left" or "right"
-        ip (str): The IP address of the robot, which by default should have
-            a running rosbridge server.
-        port (int, optional): The websocket port number for rosbridge.
-            Defaults to 9090.
+        rosbridge (ROSBridgeProtocol): A connected rosbridge client.
+        compression (str): Compression requested for the state streams.
+        state_rate (float, optional): Maximum state stream rate, in Hz.
+        history_size (int, optional): Number of joint states to keep for
+            `get_history()`.
+        pose_source (str, optional): Where the end effector pose comes from;
+            "local" or "tf".
+        ik_cache (IKCache, optional): Cache for inverse kinematics solutions.
+        workspace_map (WorkspaceMap, optional): Source of inverse kinematics
+            seeds.
     """
 
+    _state_ready = None  # type: Any
+
     def __init__(
         self,
         side,  # type: str
-        ip,  # type: str
-        port=9090,  # type: int
+        rosbridge,  # type: ROSBridgeProtocol
+        compression,  # type: str
+        state_rate,  # type: Optional[float]
+        history_size=None,  # type: Optional[int]
+        pose_source="local",  # type: str
+        ik_cache=None,  # type: Optional[IKCache]
+        workspace_map=None,  # type: Optional[WorkspaceMap]
     ):  # type: (...) -> None
         assert side == "left" or side == "right"
-
-        self._RBC = ROSBridgeClient(ip, port)
+        assert compression == "none" or compression == "cbor"
+        assert state_rate is None or state_rate > 0
+        assert history_size is None or history_size > 0
+        assert pose_source == "local" or pose_source == "tf"
+        self._RBC = rosbridge
+        self._side = side
+        self._compression = compression
+        self._ik_cache = ik_cache
+        self._workspace_map = workspace_map
+        self._tf_rate = 30.0 if state_rate is None else min(30.0, state_rate)
 
         # ROS topic names
         topic_prefix = "/" + side + "_arm/"
@@ -41,7 +93,6 @@ class BlueInterface:
         ROS_TORQUE_TOPIC = (
             topic_prefix + "blue_controllers/joint_torque_controller/command"
         )
-        ROS_JOINT_STATE_TOPIC = "/joint_states"
         ROS_GRIPPER_TOPIC = (
             topic_prefix + "blue_controllers/gripper_controller/gripper_cmd"
         )
@@ -73,28 +124,51 @@ class BlueInterface:
             _BlueController.GRIPPER: "blue_controllers/gripper_controller",
             _BlueController.TORQUE: "blue_controllers/joint_torque_controller",
         }
+        self._managed_controllers = [
+            self._controller_lookup[_BlueController.POSITION],
+            self._controller_lookup[_BlueController.SOFT_POSITION],
+            self._controller_lookup[_BlueController.GRIPPER],
+            self._controller_lookup[_BlueController.TORQUE],
+        ]
+        self._control_mode = _BlueController.GRAV_COMP
+        self._gripper_enabled = False
 
-        # Robot state values! These will be populated later
-        self._joint_positions = None  # type: Optional[np.ndarray]
-        self._cartesian_pose = None  # type: Optional[Dict[str, np.ndarray]]
-        self._joint_torques = None  # type: Optional[np.ndarray]
-        self._joint_velocities = None  # type: Optional[np.ndarray]
+        # Robot state values! These will be populated later. `_state` is
+        # replaced wholesale for every joint state, never modified in place
+        self._state = None  # type: Optional[BlueState]
+        self._state_seq = 0
+        self._end_effector_pose = None  # type: Optional[np.ndarray]
         self._gripper_goal_id = None  # type: Optional[int]
         self._gripper_position = None  # type: Optional[float]
         self._gripper_effort = None  # type: Optional[float]
-
-        # Joint state pub/sub
-        self._joint_state_subscriber = self._RBC.subscriber(
-            ROS_JOINT_STATE_TOPIC, "sensor_msgs/JointState", self._joint_state_callback
+        self._startup_times = {}  # type: Dict[str, float]
+        self._history = (
+            None if history_size is None else _HistoryBuffer(history_size)
+        )  # type: Optional[_HistoryBuffer]
+
+        # Joint states are copied into a new read-only (3, 7) array for each
+        # message, using index arrays that are cached for each joint name layout
+        self._joint_state_buffer = np.zeros((3, 7))
+        self._joint_state_layout_names = ()  # type: Tuple[str, ...]
+        self._joint_state_layout = self._joint_state_layout_for(())
+
+        # Joint state pub/sub; the joint state stream is shared by all arms on
+        # the same rosbridge connection
+        self._joint_state_stream = _JointStateStream.shared(
+            self._RBC,
+            compression,
+            state_rate,
+            self._joint_names + [self._gripper_joint_name],
+            self._joint_state_callback,
         )
         self._joint_position_publisher = self._RBC.publisher(
-            ROS_POSITION_TOPIC, "std_msgs/Float64MultiArray"
+            ROS_POSITION_TOPIC, "std_msgs/Float64MultiArray", latest_only=True
         )
         self._joint_soft_position_publisher = self._RBC.publisher(
-            ROS_SOFT_POSITION_TOPIC, "std_msgs/Float64MultiArray"
+            ROS_SOFT_POSITION_TOPIC, "std_msgs/Float64MultiArray", latest_only=True
         )
         self._joint_torque_publisher = self._RBC.publisher(
-            ROS_TORQUE_TOPIC, "std_msgs/Float64MultiArray"
+            ROS_TORQUE_TOPIC, "std_msgs/Float64MultiArray", latest_only=True
         )
 
         # Controller manager services
@@ -126,110 +200,23 @@ class BlueInterface:
             "/republish_tfs", "tf2_web_republisher/RepublishTFs"
         )
 
+        # Parameter service, for fetching the URDF
+        self._get_param_client = self._RBC.service(
+            "/rosapi/get_param", "rosapi/GetParam"
+        )
+        self._kinematics = None  # type: Optional[KinematicChain]
+
         # Gripper action client
         self._gripper_action_client = self._RBC.action_client(
             ROS_GRIPPER_TOPIC, "control_msgs/GripperCommandAction"
         )
 
-        # Start listening to world->end effector transforms
-        self._request_end_effector_tfs()
-
-        # Cleaner exiting
-        atexit.register(self.shutdown)
-
-        # Load controllers
-        self._load_controller(self._controller_lookup[_BlueController.POSITION])
-        self._load_controller(self._controller_lookup[_BlueController.SOFT_POSITION])
-        self._load_controller(self._controller_lookup[_BlueController.GRIPPER])
-        self._load_controller(self._controller_lookup[_BlueController.TORQUE])
-
-        # Make controllers are stopped
-        self._switch_controller(
-            [],
-            [
-                self._controller_lookup[_BlueController.POSITION],
-                self._controller_lookup[_BlueController.SOFT_POSITION],
-                self._controller_lookup[_BlueController.GRIPPER],
-                self._controller_lookup[_BlueController.TORQUE],
-            ],
-        )
-        self._control_mode = _BlueController.GRAV_COMP
-        self._gripper_enabled = False
-
-        while self._cartesian_pose is None or self._joint_positions is None:
-            time.sleep(0.1)
-
-    def shutdown(self):  # type: (...) -> None
-        """Clean up and close connection to host computer. All control will be
-        disabled. This can be called manually, but will also run automatically
-        when your script exits."""
-
-        self._switch_controller(
-            [],
-            [
-                self._controller_lookup[_BlueController.POSITION],
-                self._controller_lookup[_BlueController.SOFT_POSITION],
-                self._controller_lookup[_BlueController.GRIPPER],
-                self._controller_lookup[_BlueController.TORQUE],
-            ],
-        )
-        self._unload_controller(self._controller_lookup[_BlueController.POSITION])
-        self._unload_controller(self._controller_lookup[_BlueController.SOFT_POSITION])
-        self._unload_controller(self._controller_lookup[_BlueController.GRIPPER])
-        self._unload_controller(self._controller_lookup[_BlueController.TORQUE])
-        self._RBC.close()
-
-    def calibrate_gripper(self):  # type: (...) -> None
-        """Run the gripper position calibration process.
-        This will automatically determine the gripper position by apply a closing
-        torque and detecting when the gripper has fully closed."""
-
-        gripper_enabled = self._gripper_enabled
-        if gripper_enabled:
-            self.disable_gripper()
-
-        s = threading.Semaphore(0)
-
-        def callback(success, values):
-            s.release()
-
-        self._calibrate_gripper_client.request({}, callback)
-        s.acquire()
-
-        if gripper_enabled:
-            self.enable_gripper()
-
-    def command_gripper(
-        self,
-        position,  # type: float
-        effort,  # type: float
-        wait=False,  # type: bool
-    ):  # type: (...) -> None
-        """Send a goal to gripper, and optionally wait for the goal to be reached.
-
-        Args:
-            position (float64): gap size between gripper fingers in cm.
-            effort (float64): maximum effort the gripper with exert before
-                stalling in N.
-        """
-        # TODO: change robot-side so position and effort in correct units
-
-        if not self._gripper_enabled:
-            self.enable_gripper()
-
-        goal_msg = {"command": {"position": position, "max_effort": effort}}
-
-        s = threading.Semaphore(0)
-
-        def callback(result, status):
-            if result["stalled"] or result["reached_goal"]:
-                s.release()
-
-        self._gripper_goal_id = self._gripper_action_client.send_goal(
-            goal_msg, callback, callback
-        )
-        if wait:
-            s.acquire()
+        # Compute the end effector pose locally from joint states, or start
+        # listening to world->end effector transforms
+        if pose_source == "local":
+            self._request_kinematics()
+        else:
+            self._request_end_effector_tfs()
 
     def cancel_gripper_command(self):  # type: (...) -> None
         """Cancel current gripper command, halting gripper in current position."""
@@ -242,8 +229,10 @@ class BlueInterface:
             float64: the gripper gap in cm.
 
         """
-        assert self._gripper_position is not None, "Gripper position not yet populated!"
-        return self._gripper_position
+        state = self._state
+        assert state is not None, "Gripper position not yet populated!"
+        assert state.gripper_position is not None, "Gripper position not yet populated!"
+        return state.gripper_position
 
     def get_gripper_effort(self):  # type: (...) -> float
         """Get the current effort exerted by the gripper.
@@ -251,77 +240,10 @@ class BlueInterface:
         Returns:
             float64: the gripper effort in N
         """
-        assert self._gripper_effort is not None, "Gripper effort not yet populated!"
-        return self._gripper_effort
-
-    def set_joint_positions(
-        self,
-        joint_positions,  # type: Sequence
-        duration=0.0,  # type: float
-        soft_position_control=False,  # type: bool
-    ):  # type: (...) -> None
-        """Move arm to specified position in joint space.
-
-        Args:
-            joint_positions (iterable): An array of 7 joint angles, in radians,
-                ordered from proximal to distal.
-            duration (float, optional): Seconds to take to reach the target,
-                interpolating in joint space. Defaults to 0.
-            soft_position_control (bool, optional): Use "software" position
-                control, which runs position control loop at the ROS-level,
-                rather than on the motor drivers. This should be rarely needed.
-                Defaults to False.
-        """
-        joint_positions = np.asarray(joint_positions)
-        assert len(joint_positions) == 7
-
-        self._set_control_mode(
-            _BlueController.SOFT_POSITION
-            if soft_position_control
-            else _BlueController.POSITION
-        )
-
-        start_positions = self.get_joint_positions()
-        start_time = time.time()
-        end_time = start_time + duration
-        while time.time() < end_time:
-            scale = (time.time() - start_time) / duration
-            self._set_joint_positions(
-                start_positions + scale * (joint_positions - start_positions),
-                soft_position_control,
-            )
-            time.sleep(1.0 / 60.0)
-
-        self._set_joint_positions(joint_positions, soft_position_control)
-
-    def _set_joint_positions(
-        self,
-        joint_positions,  # type: Sequence
-        soft_position_control,  # type: bool
-    ):  # type: (...) -> None
-        joint_positions_msg = {"layout": {}, "data": list(joint_positions)}
-        if soft_position_control:
-            self._joint_soft_position_publisher.publish(joint_positions_msg)
-        else:
-            self._joint_position_publisher.publish(joint_positions_msg)
-
-    def set_joint_torques(
-        self, joint_torques  # type: Sequence
-    ):  # type: (...) -> None
-        """Command joint torques to the arm.
-
-        Args:
-            joint_torques (iterable): An array of 7 joint torques, in Nm,
-            ordered from proximal to distal.
-        """
-
-        joint_torques = list(joint_torques)
-        assert len(joint_torques) == 7
-
-        self._set_control_mode(_BlueController.TORQUE)
-
-        joint_torques_msg = {"layout": {}, "data": list(joint_torques)}
-        self._joint_torque_publisher.publish(joint_torques_msg)
+        state = self._state
+        assert state is not None, "Gripper effort not yet populated!"
+        assert state.gripper_effort is not None, "Gripper effort not yet populated!"
+        return state.gripper_effort
 
     def get_joint_positions(self):  # type: (...) -> np.ndarray
         """Get the current joint angles, in radians.
@@ -330,8 +252,9 @@ class BlueInterface:
             numpy.ndarray: An array of 7 angles, in radians, ordered from
             proximal to distal.
         """
-        assert self._joint_positions is not None, "Joint positions not populated!"
-        return self._joint_positions
+        state = self._state
+        assert state is not None, "Joint positions not populated!"
+        return state.joint_positions.copy()
 
     def get_cartesian_pose(self):  # type: (...) -> Dict[str, np.ndarray]
         """Get the current cartesian pose of the end effector, with respect to
@@ -342,8 +265,9 @@ class BlueInterface:
             "orientation": numpy.array([x,y,z,w]} defined with respect to the
             world frame.
         """
-        assert self._cartesian_pose is not None, "Cartesian pose not populated!"
-        return self._cartesian_pose
+        pose = self._end_effector_pose
+        assert pose is not None, "Cartesian pose not populated!"
+        return {"position": pose[:3].copy(), "orientation": pose[3:].copy()}
 
     def get_joint_torques(self):  # type: (...) -> np.ndarray
         """Get the current joint torques.
@@ -352,8 +276,9 @@ class BlueInterface:
             numpy.ndarray: An array of 7 joint torques, in Nm, ordered from
             proximal to distal.
         """
-        assert self._joint_torques is not None, "Joint torques not populated!"
-        return self._joint_torques
+        state = self._state
+        assert state is not None, "Joint torques not populated!"
+        return state.joint_torques.copy()
 
     def get_joint_velocities(self):  # type: (...) -> np.ndarray
         """Get the current joint velocities.
@@ -362,22 +287,60 @@ class BlueInterface:
             numpy.ndarray: An array of 7 joint torques, in Nm, ordered from
             proximal to distal.
         """
-        assert self._joint_velocities is not None, "Joint velocities not populated!"
-        return self._joint_velocities
+        state = self._state
+        assert state is not None, "Joint velocities not populated!"
+        return state.joint_velocities.copy()
 
-    def disable_control(self):  # type: (...) -> None
-        """Set joint control mode to gravity compensation only."""
-        self._set_control_mode(_BlueController.GRAV_COMP)
+    def get_state(self):  # type: (...) -> BlueState
+        """Get a consistent snapshot of the arm state. Every value in it comes
+        from the same joint state message, along with the newest end effector
+        pose and gripper state at the time that message arrived. Snapshots are
+        immutable, so they can be kept and shared between threads.
 
-    def enable_gripper(self):  # type: (...) -> None
-        """Enables the gripper. The gripper will begin to hold position."""
-        self._switch_controller([self._controller_lookup[_BlueController.GRIPPER]], [])
-        self._gripper_enabled = True
+        Returns:
+            BlueState: The newest state snapshot.
+        """
+        state = self._state
+        assert state is not None, "Robot state not populated!"
+        return state
 
-    def disable_gripper(self):  # type: (...) -> None
-        """Disables the gripper. The gripper will become compliant."""
-        self._switch_controller([], [self._controller_lookup[_BlueController.GRIPPER]])
-        self._gripper_enabled = False
+    def get_kinematics(self):  # type: (...) -> KinematicChain
+        """Get the arm's kinematic model, for computing end effector poses and
+        Jacobians locally. Only available with `pose_source="local"`, once
+        the robot's URDF has been loaded.
+
+        Returns:
+            KinematicChain: The chain from the world frame to the end
+            effector, with the 7 arm joints ordered from proximal to distal.
+        """
+        kinematics = self._kinematics
+        assert kinematics is not None, "Kinematics not loaded!"
+        return kinematics
+
+    def get_history(
+        self,
+        window=None,  # type: Optional[float]
+        since_seq=None,  # type: Optional[int]
+    ):  # type: (...) -> BlueHistory
+        """Get recent joint states. Requires `history_size` to be set when the
+        interface is created. Pass exactly one of `window` or `since_seq`.
+
+        Args:
+            window (float, optional): Get the states received in this many
+                seconds before the newest one.
+            since_seq (int, optional): Get the states with a `seq` greater
+                than this, eg the `seq` of a `BlueState` from `get_state()`.
+
+        Returns:
+            BlueHistory: The states, oldest first, as read-only views into
+            the history buffer; see `BlueHistory` for how long they stay
+            unchanged. At most `history_size` states are returned.
+        """
+        assert self._history is not None, "History is disabled; set history_size"
+        assert (window is None) != (since_seq is None), "Pass window or since_seq"
+        if window is not None:
+            return self._history.window(window)
+        return self._history.since_seq(since_seq)  # type: ignore
 
     def gripper_enabled(self):  # type: (...) -> bool
         """Check if gripper is enabled to take commands.
@@ -387,93 +350,259 @@ class BlueInterface:
         """
         return self._gripper_enabled
 
-    def inverse_kinematics(
-        self,
-        position,  # type: np.ndarray
-        orientation,  # type: np.ndarray
-        seed_joint_positions=[],  # type: Sequence
-    ):  # type: (...) -> np.ndarray
-        """Given a desired cartesian pose for the end effector, compute the
-        necessary joint angles. Note that the system is underparameterized and
-        there are an infinite number of possible solutions; this will only
-        return a single possible one.
+    def get_startup_times(self):  # type: (...) -> Dict[str, float]
+        """Get a breakdown of how long startup took.
 
-        Args:
-            position (iterable): A length-3 array containing a cartesian position
-                (x,y,z), wrt the world frame.
-            orientation (iterable): A length-4 array containing a quaternion
-                (x,y,z,w), wrt the world frame.
-            seed_joint_positions (iterable, optional): An array of 7 joint
-                angles, to be used to initalize the IK solver.
         Returns:
-            numpy.ndarray: An array of 7 joint angles, or an empty array if no
-            solution was found.
+            dict: Durations in seconds, in the form {"connect": float,
+            "controllers": float, "state": float, "total": float}.
+            "connect" is the time spent opening the rosbridge connection (zero
+            when it's shared), "controllers" the time spent loading and
+            stopping controllers, and "state" the time spent waiting for the
+            first robot state after that.
         """
+        return dict(self._startup_times)
 
-        output = []
-        s = threading.Semaphore(0)
+    def _record_startup_times(
+        self,
+        start_time,  # type: float
+        connected_time,  # type: float
+        controllers_time,  # type: float
+        ready_time,  # type: float
+    ):  # type: (...) -> None
+        self._startup_times = {
+            "connect": connected_time - start_time,
+            "controllers": controllers_time - connected_time,
+            "state": ready_time - controllers_time,
+            "total": ready_time - start_time,
+        }
 
-        def callback(success, values):
-            if success:
-                output.extend(values["ik_joint_positions"])
-            s.release()
+    def _set_joint_positions(
+        self,
+        joint_positions,  # type: np.ndarray
+        soft_position_control,  # type: bool
+    ):  # type: (...) -> None
+        if soft_position_control:
+            self._joint_soft_position_publisher.publish_float64_array(joint_positions)
+        else:
+            self._joint_position_publisher.publish_float64_array(joint_positions)
 
-        request_msg = {
+    def _inverse_kinematics_request(
+        self,
+        position,  # type: np.ndarray
+        orientation,  # type: np.ndarray
+        seed_joint_positions,  # type: Sequence
+        solver="trac-ik",  # type: str
+    ):  # type: (...) -> Dict[str, Any]
+        return {
             "end_effector_pose": {
                 "header": {"frame_id": self._WORLD_FRAME},
                 "pose": {
-                    "position": dict(zip("xyz", position)),
-                    "orientation": dict(zip("xyzw", orientation)),
+                    "position": dict(zip("xyz", map(float, position))),
+                    "orientation": dict(zip("xyzw", map(float, orientation))),
                 },
             },
-            "solver": "trac-ik",
-            "seed_joint_positions": seed_joint_positions,
+            "solver": solver,
+            "seed_joint_positions": [float(v) for v in seed_joint_positions],
         }
-        self._inverse_kinematics_client.request(request_msg, callback)
-        s.acquire()
 
-        return np.asarray(output)
+    def _ik_seed(
+        self,
+        position,  # type: np.ndarray
+        orientation,  # type: np.ndarray
+        seed_joint_positions,  # type: Sequence
+    ):  # type: (...) -> Any
+        if len(seed_joint_positions) != 0 or self._workspace_map is None:
+            return seed_joint_positions
+        return self._workspace_map.nearest(position, orientation)
+
+    def _local_inverse_kinematics(
+        self,
+        position,  # type: np.ndarray
+        orientation,  # type: np.ndarray
+        seed_joint_positions,  # type: Sequence
+    ):  # type: (...) -> np.ndarray
+        seed = np.asarray(seed_joint_positions, dtype=np.float64)
+        if len(seed) == 0:
+            seed = self.get_joint_positions()
+        joint_positions, success = self.get_kinematics().inverse_kinematics(
+            position, orientation, seed
+        )
+        if not success:
+            return np.asarray([])
+        return joint_positions
+
+    def _switch_controller_request(
+        self,
+        start,  # type: List[str]
+        stop,  # type: List[str]
+    ):  # type: (...) -> Dict[str, Any]
+        return {
+            "start_controllers": start,
+            "stop_controllers": stop,
+            "strictness": 1,  # best effort
+        }
 
     def _joint_state_callback(
-        self, message  # type: Dict[str, Any]
+        self,
+        message,  # type: Dict[str, Any]
     ):  # type: (...) -> None
-        joint_positions_temp = []
-        joint_torques_temp = []
-        joint_velocities_temp = []
-
-        for name in self._joint_names:
-            if name not in message["name"]:
-                continue
+        receive_time = time.time()
+        names = tuple(message["name"])
+        if names != self._joint_state_layout_names:
+            self._joint_state_layout = self._joint_state_layout_for(names)
+            self._joint_state_layout_names = names
+        slots, indices, gripper_index = self._joint_state_layout
+
+        if gripper_index is not None:
+            self._gripper_position = float(message["position"][gripper_index])
+            self._gripper_effort = float(message["effort"][gripper_index])
+
+        if len(indices) != 0:
+            if len(slots) == 7:
+                buffer = np.empty((3, 7))
             else:
-                self.index = message["name"].index(name)
-                joint_positions_temp.append(message["position"][self.index])
-                joint_torques_temp.append(message["effort"][self.index])
-                joint_velocities_temp.append(message["velocity"][self.index])
-
-        if self._gripper_joint_name in message["name"]:
-            index = message["name"].index(self._gripper_joint_name)
-            self._gripper_position = message["position"][index]
-            self._gripper_effort = message["effort"][index]
-
-        if len(joint_positions_temp) != 0:
-            self._joint_positions = np.array(joint_positions_temp)
-        if len(joint_torques_temp) != 0:
-            self._joint_torques = np.array(joint_torques_temp)
-        if len(joint_velocities_temp) != 0:
-            self._joint_velocities = np.array(joint_velocities_temp)
+                buffer = self._joint_state_buffer.copy()
+            for row, key in enumerate(("position", "velocity", "effort")):
+                values = np.asarray(message[key], dtype=np.float64)
+                if len(slots) == 7:
+                    np.take(values, indices, out=buffer[row])
+                else:
+                    buffer[row, slots] = values[indices]
+            buffer.flags.writeable = False
+            self._joint_state_buffer = buffer
+            if self._kinematics is not None:
+                self._end_effector_pose = self._local_pose(buffer[0])
+        elif self._state is None:
+            return
+
+        self._publish_state(receive_time, _header_stamp(message))
+
+        if not self._state_ready.is_set():
+            self._check_state_ready()
+
+    def _joint_state_layout_for(
+        self,
+        names,  # type: Tuple[str, ...]
+    ):  # type: (...) -> Tuple[np.ndarray, np.ndarray, Optional[int]]
+        """Find where this arm's joints are in a joint state message.
+
+        Returns:
+            tuple: Indices into our 7-joint buffers, the message indices to copy
+            into them, and the message index of the gripper joint (or None).
+        """
+        index_of = dict((name, i) for i, name in enumerate(names))
+        slots = [i for i, name in enumerate(self._joint_names) if name in index_of]
+        indices = [index_of[self._joint_names[i]] for i in slots]
+        return (
+            np.array(slots, dtype=np.intp),
+            np.array(indices, dtype=np.intp),
+            index_of.get(self._gripper_joint_name),
+        )
+
+    def _publish_state(
+        self,
+        receive_time,  # type: float
+        stamp,  # type: Optional[float]
+    ):  # type: (...) -> None
+        """Build a snapshot from the newest values and swap it in. Readers grab
+        the `_state` reference once, so they never see a partial update."""
+        self._state_seq += 1
+        buffer = self._joint_state_buffer
+        pose = self._end_effector_pose
+        self._state = BlueState(
+            self._state_seq,
+            receive_time,
+            stamp,
+            buffer[0],
+            buffer[1],
+            buffer[2],
+            self._gripper_position,
+            self._gripper_effort,
+            None if pose is None else pose[:3],
+            None if pose is None else pose[3:],
+        )
+        if self._history is not None:
+            self._history.append(self._state_seq, receive_time, stamp, buffer)
 
     def _process_tfs(
-        self, message  # type: Dict[str, Any]
+        self,
+        message,  # type: Dict[str, Any]
     ):  # type: (...) -> None
         pose = message["transforms"][0]["transform"]
         trans = pose["translation"]
         rot = pose["rotation"]
-        cartesian_pose_temp = {}
-        cartesian_pose_temp["position"] = np.array([trans["x"], trans["y"], trans["z"]])
-        cartesian_pose_temp["orientation"] = np.array(
-            [rot["x"], rot["y"], rot["z"], rot["w"]]
+        end_effector_pose = np.array(
+            [
+                trans["x"],
+                trans["y"],
+                trans["z"],
+                rot["x"],
+                rot["y"],
+                rot["z"],
+                rot["w"],
+            ]
+        )
+        end_effector_pose.flags.writeable = False
+        self._end_effector_pose = end_effector_pose
+
+        if not self._state_ready.is_set():
+            self._check_state_ready()
+
+    def _check_state_ready(self):  # type: (...) -> None
+        if self._state is not None and self._end_effector_pose is not None:
+            self._state_ready.set()
+
+    def _state_timeout_message(
+        self,
+        timeout,  # type: Optional[float]
+    ):  # type: (...) -> str
+        missing = [
+            name
+            for name, value in (
+                ("joint state", self._state),
+                ("end effector pose", self._end_effector_pose),
+            )
+            if value is None
+        ]
+        return "Timed out after {}s waiting for the first {} from the robot".format(
+            timeout, " and ".join(missing)
+        )
+
+    def _local_pose(
+        self,
+        joint_positions,  # type: np.ndarray
+    ):  # type: (...) -> np.ndarray
+        position, orientation = self._kinematics.forward_kinematics(  # type: ignore
+            joint_positions
+        )
+        pose = np.concatenate([position, orientation])
+        pose.flags.writeable = False
+        return pose
+
+    def _request_kinematics(self):  # type: (...) -> None
+        """Fetch the URDF and build the kinematic chain used for the end
+        effector pose. Falls back to TF if that fails."""
+
+        def _get_param_callback(success, values):
+            try:
+                assert success, values
+                self._kinematics = KinematicChain.from_urdf(
+                    json.loads(values["value"]),
+                    self._WORLD_FRAME,
+                    self._END_EFFECTOR_FRAME,
+                    self._joint_names,
+                )
+            except Exception as e:
+                print(
+                    "Couldn't load kinematics from /robot_description ({}), "
+                    "using TF for the end effector pose".format(e)
+                )
+                self._request_end_effector_tfs()
+
+        self._get_param_client.request(
+            {"name": "/robot_description", "default": ""}, _get_param_callback
         )
-        self._cartesian_pose = cartesian_pose_temp
 
     def _request_end_effector_tfs(self):  # type: (...) -> None
         goal_msg = {
@@ -481,7 +610,7 @@ class BlueInterface:
             "target_frame": self._WORLD_FRAME,
             "angular_thres": 0,
             "trans_thres": 0,
-            "rate": 30,
+            "rate": self._tf_rate,
             "timeout": {"secs": 2.0, "nsecs": 0.0},
         }
 
@@ -491,73 +620,1345 @@ class BlueInterface:
                     values["topic_name"],
                     "tf2_web_republisher/TFArray",
                     self._process_tfs,
+                    compression=self._compression,
                 )
 
         self._tf_service_client.request(goal_msg, _tf_service_callback)
 
-    def _set_control_mode(
-        self, mode  # type: _BlueController
-    ):  # type: (...) -> bool
-        if mode == self._control_mode:
-            return True
-        self._switch_controller(
-            [self._controller_lookup[mode]],
-            [self._controller_lookup[self._control_mode]],
-            new_control_mode=mode,
-        )
-        return mode == self._control_mode
-
-    def _switch_controller(
-        self,
-        start,  # type: List[str]
-        stop,  # type: List[str]
-        new_control_mode=None,  # type: Optional[_BlueController]
-    ):  # type: (...) -> None
-        request_msg = {
-            "start_controllers": start,
-            "stop_controllers": stop,
-            "strictness": 1,  # best effort
-        }
-
-        s = threading.Semaphore(0)
 
-        def callback(success, values):
-            if success and new_control_mode is not None:
-                self._control_mode = new_control_mode
-            s.release()
+class BlueInterface(_BlueInterfaceBase):
+    """A Python interface for controlling the Blue robot through rosbridge.
 
-        self._switch_controller_service_client.request(request_msg, callback)
-        s.acquire()
+    Args:
+        side (str): side of the arm, "left" or "right"
+        ip (str): The IP address of the robot, which by default should have
+            a running rosbridge server. Not needed when `session` is passed.
+        port (int, optional): The websocket port number for rosbridge.
+            Defaults to 9090.
+        compression (str, optional): Compression requested from rosbridge for
+            the joint state and end effector pose streams; one of "none" or
+            "cbor". CBOR requires a rosbridge server with binary support, but
+            is much cheaper to decode. Defaults to "cbor".
+        state_rate (float, optional): Maximum rate, in Hz, at which rosbridge
+            sends joint states and end effector poses. Scripts that only poll
+            state occasionally can set this low to save bandwidth and CPU.
+            Defaults to None, which receives every joint state.
+        service_timeout (float, optional): Seconds to wait for a response from
+            a ROS service (IK, controller switching, etc) before raising
+            `concurrent.futures.TimeoutError`. None waits forever. Defaults to
+            10.
+        session (BlueSession, optional): A connection shared with other arms.
+            When set, `ip`, `port`, `compression`, and `state_rate` are taken
+            from the session. Defaults to None, which opens a new connection.
+        startup_timeout (float, optional): Seconds to wait for the connection
+            to open, and then for the first robot state to arrive, before
+            raising `concurrent.futures.TimeoutError`. None waits forever.
+            Defaults to 10.
+        history_size (int, optional): Number of recent joint states to keep
+            for `get_history()`. Defaults to None, which keeps no history.
+        pose_source (str, optional): "local" computes the end effector pose
+            from each joint state, using kinematics from the robot's URDF.
+            "tf" instead subscribes to a transform stream, which lags the
+            joint states and costs more bandwidth. If the URDF can't be
+            loaded, "local" falls back to "tf". Defaults to "local".
+        ik_cache (IKCache, optional): A cache for `inverse_kinematics()`
+            results, which can be shared between arms on the same robot since
+            entries are keyed by arm. Defaults to None, which disables
+            caching.
+        workspace_map (WorkspaceMap, optional): When set,
+            `inverse_kinematics()` calls without a seed are seeded with the
+            stored configuration closest to the target pose. Defaults to None.
+        stream_rate (float, optional): Rate, in Hz, at which interpolated
+            motions like `set_joint_positions()` stream targets to the arm.
+            Defaults to 60.
+    """
+
+    def __init__(
+        self,
+        side,  # type: str
+        ip=None,  # type: Optional[str]
+        port=9090,  # type: int
+        compression="cbor",  # type: str
+        state_rate=None,  # type: Optional[float]
+        service_timeout=10.0,  # type: Optional[float]
+        session=None,  # type: Optional[BlueSession]
+        startup_timeout=10.0,  # type: Optional[float]
+        history_size=None,  # type: Optional[int]
+        pose_source="local",  # type: str
+        ik_cache=None,  # type: Optional[IKCache]
+        workspace_map=None,  # type: Optional[WorkspaceMap]
+        stream_rate=60.0,  # type: float
+    ):  # type: (...) -> None
+        assert (ip is None) != (session is None), "Pass exactly one of ip or session"
+        self._service_timeout = service_timeout
+        self._session = session
+        self._is_shutdown = False
+        self._state_ready = threading.Event()
+        self._state_condition = threading.Condition()
+        self._scheduler = _StreamScheduler(stream_rate)
+        self._velocity_motion = None  # type: Optional[_VelocityMotion]
+        self._torque_controller = None  # type: Optional[_TorqueController]
+        start_time = time.time()
+        if session is None:
+            rosbridge = ROSBridgeClient(ip, port, startup_timeout)
+        else:
+            rosbridge = session._RBC
+            compression = session._compression
+            state_rate = session._state_rate
+        connected_time = time.time()
+        self._RBC = rosbridge  # type: ROSBridgeClient
+        _BlueInterfaceBase.__init__(
+            self,
+            side,
+            rosbridge,
+            compression,
+            state_rate,
+            history_size=history_size,
+            pose_source=pose_source,
+            ik_cache=ik_cache,
+            workspace_map=workspace_map,
+        )
+
+        # Cleaner exiting
+        atexit.register(self.shutdown)
+
+        # Load controllers; all requests are sent before waiting on any of them
+        for future in [
+            self._load_controller_async(controller)
+            for controller in self._managed_controllers
+        ]:
+            future.result()
+
+        # Make controllers are stopped
+        self._switch_controller([], self._managed_controllers)
+        controllers_time = time.time()
+
+        if not self._state_ready.wait(startup_timeout):
+            raise TimeoutError(self._state_timeout_message(startup_timeout))
+        self._record_startup_times(
+            start_time, connected_time, controllers_time, time.time()
+        )
+
+    def shutdown(self):  # type: (...) -> None
+        """Clean up and close connection to host computer. All control will be
+        disabled. This can be called manually, but will also run automatically
+        when your script exits. Connections shared through a `BlueSession`
+        stay open."""
+
+        if self._is_shutdown:
+            return
+        self._is_shutdown = True
+
+        self._scheduler.stop()
+        self._end_torque_controller("cancelled")
+        self._switch_controller([], self._managed_controllers)
+        for future in [
+            self._unload_controller_async(controller)
+            for controller in self._managed_controllers
+        ]:
+            future.result()
+        self._joint_state_stream.detach(self._joint_state_callback)
+        if self._session is None:
+            self._RBC.close()
+
+    def calibrate_gripper(self):  # type: (...) -> None
+        """Run the gripper position calibration process.
+        This will automatically determine the gripper position by apply a closing
+        torque and detecting when the gripper has fully closed."""
+
+        gripper_enabled = self._gripper_enabled
+        if gripper_enabled:
+            self.disable_gripper()
+
+        self._calibrate_gripper_client.call({}, self._service_timeout)
+
+        if gripper_enabled:
+            self.enable_gripper()
+
+    def command_gripper(
+        self,
+        position,  # type: float
+        effort,  # type: float
+        wait=False,  # type: bool
+    ):  # type: (...) -> None
+        """Send a goal to gripper, and optionally wait for the goal to be reached.
+
+        Args:
+            position (float64): gap size between gripper fingers in cm.
+            effort (float64): maximum effort the gripper with exert before
+                stalling in N.
+            wait (bool, optional): Wait until the gripper reaches the goal or
+                stalls, raising `concurrent.futures.TimeoutError` if that
+                takes longer than `service_timeout`. Defaults to False.
+        """
+        future = self.command_gripper_async(position, effort)
+        if wait:
+            future.result(self._service_timeout)
+
+    def command_gripper_async(
+        self,
+        position,  # type: float
+        effort,  # type: float
+    ):  # type: (...) -> Future
+        """Non-blocking version of `command_gripper()`. If the gripper is
+        disabled, it's enabled first, which waits for the controller switch.
+
+        Args:
+            position (float64): gap size between gripper fingers in cm.
+            effort (float64): maximum effort the gripper with exert before
+                stalling in N.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the gripper's result message
+            once it reaches the goal or stalls.
+        """
+        # TODO: change robot-side so position and effort in correct units
+
+        if not self._gripper_enabled:
+            self.enable_gripper()
+
+        goal_msg = {"command": {"position": position, "max_effort": effort}}
+        future = Future()  # type: Future
+
+        def callback(result, status):
+            if result["stalled"] or result["reached_goal"]:
+                if future.set_running_or_notify_cancel():
+                    future.set_result(result)
+
+        self._gripper_goal_id = self._gripper_action_client.send_goal(
+            goal_msg, callback, callback
+        )
+        return future
+
+    def set_joint_positions(
+        self,
+        joint_positions,  # type: np.ndarray
+        duration=0.0,  # type: float
+        soft_position_control=False,  # type: bool
+        wait=True,  # type: bool
+    ):  # type: (...) -> MotionHandle
+        """Move arm to specified position in joint space.
+
+        The motion is streamed from a background thread at `stream_rate`, so
+        with `wait=False` this returns right away. Starting another motion
+        preempts this one, continuing from the last target it sent.
+
+        Args:
+            joint_positions (iterable): An array of 7 joint angles, in radians,
+                ordered from proximal to distal.
+            duration (float, optional): Seconds to take to reach the target,
+                interpolating in joint space. Defaults to 0.
+            soft_position_control (bool, optional): Use "software" position
+                control, which runs position control loop at the ROS-level,
+                rather than on the motor drivers. This should be rarely needed.
+                Defaults to False.
+            wait (bool, optional): Block until the motion ends. Defaults to
+                True.
+
+        Returns:
+            MotionHandle: A handle for waiting on or cancelling the motion.
+        """
+        joint_positions = np.asarray(joint_positions, dtype=np.float64)
+        assert len(joint_positions) == 7
+
+        return self._stream(
+            _linear_joint_motion(
+                self._stream_start_positions(), joint_positions, duration
+            ),
+            soft_position_control,
+            wait,
+        )
+
+    def execute_trajectory(
+        self,
+        waypoints,  # type: np.ndarray
+        times,  # type: Sequence[float]
+        profile="min_jerk",  # type: str
+        max_velocity=None,  # type: Optional[Any]
+        max_acceleration=None,  # type: Optional[Any]
+        soft_position_control=False,  # type: bool
+        wait=True,  # type: bool
+    ):  # type: (...) -> MotionHandle
+        """Move arm through a sequence of joint space waypoints.
+
+        The whole trajectory is sampled up front at `stream_rate`, then
+        streamed like `set_joint_positions()`. It starts from the current
+        position and starts and ends at rest.
+
+        Args:
+            waypoints (np.ndarray): An (N, 7) array of joint angles, in
+                radians, to pass through.
+            times (iterable): N strictly increasing times, in seconds from the
+                start of the motion, at which to reach each waypoint.
+            profile (str, optional): How to move between waypoints. "min_jerk"
+                comes to a stop at each waypoint along a minimum jerk path,
+                "quintic" passes through them without stopping unless the path
+                reverses, and "cubic" follows a C2 cubic spline. Defaults to
+                "min_jerk".
+            max_velocity (float or iterable, optional): Joint velocity limit,
+                in radians per second, for all joints or for each. If the
+                trajectory would exceed it, its times are stretched until it
+                doesn't. Defaults to None.
+            max_acceleration (float or iterable, optional): Joint acceleration
+                limit, in radians per second squared, handled like
+                `max_velocity`. Defaults to None.
+            soft_position_control (bool, optional): See
+                `set_joint_positions()`. Defaults to False.
+            wait (bool, optional): Block until the motion ends. Defaults to
+                True.
+
+        Returns:
+            MotionHandle: A handle for waiting on or cancelling the motion.
+        """
+        waypoints = np.asarray(waypoints, dtype=np.float64)
+        assert waypoints.ndim == 2 and waypoints.shape[1] == 7
+
+        period = self._scheduler.period
+        table = _plan_trajectory(
+            self._stream_start_positions(),
+            waypoints,
+            np.asarray(times, dtype=np.float64),
+            profile,
+            period,
+            max_velocity,
+            max_acceleration,
+        )
+        return self._stream(_table_motion(table, period), soft_position_control, wait)
+
+    def move_cartesian(
+        self,
+        positions,  # type: np.ndarray
+        orientations,  # type: np.ndarray
+        duration,  # type: float
+        max_step=0.01,  # type: float
+        max_angle_step=0.05,  # type: float
+        max_joint_step=0.2,  # type: float
+        lookahead=0.5,  # type: float
+        max_in_flight=8,  # type: int
+        solver="trac-ik",  # type: str
+        soft_position_control=False,  # type: bool
+        wait=True,  # type: bool
+    ):  # type: (...) -> MotionHandle
+        """Move the end effector along a cartesian path, eg a straight line or
+        an arc, starting from its current pose.
+
+        The path is subdivided into small steps and timed to start and end
+        at rest. Inverse kinematics for the steps is solved in the
+        background, as in `inverse_kinematics_many()`, with each step seeded
+        from the one before. Streaming starts as soon as the first
+        `lookahead` seconds are solved; if the arm ever catches up with the
+        solver it waits in place, and then carries on.
+
+        If a step has no solution, or its solution jumps away from the
+        previous one, the arm stops at the last good step and the returned
+        handle's status is "failed".
+
+        Args:
+            positions (numpy.ndarray): (N, 3) cartesian positions (x,y,z), wrt
+                the world frame, to move through.
+            orientations (numpy.ndarray): (N, 4) quaternions (x,y,z,w), wrt the
+                world frame, to move through.
+            duration (float): Seconds to take to follow the path.
+            max_step (float, optional): Largest distance between steps, in
+                meters. Defaults to 0.01.
+            max_angle_step (float, optional): Largest rotation between steps,
+                in radians. Defaults to 0.05.
+            max_joint_step (float, optional): Largest change in any joint
+                between steps, in radians. Defaults to 0.2.
+            lookahead (float, optional): Seconds of the path to solve before
+                starting to move. Defaults to 0.5.
+            max_in_flight (int, optional): Maximum number of outstanding
+                inverse kinematics requests. Defaults to 8.
+            solver (str, optional): See `inverse_kinematics()`. Defaults to
+                "trac-ik".
+            soft_position_control (bool, optional): See
+                `set_joint_positions()`. Defaults to False.
+            wait (bool, optional): Block until the motion ends. Defaults to
+                True.
+
+        Returns:
+            MotionHandle: A handle for waiting on or cancelling the motion.
+        """
+        positions = np.asarray(positions, dtype=np.float64)
+        orientations = np.asarray(orientations, dtype=np.float64)
+        count = len(positions)
+        assert positions.shape == (count, 3) and orientations.shape == (count, 4)
+        assert duration > 0
+
+        start_positions = self._stream_start_positions()
+        start_pose = None  # type: Optional[np.ndarray]
+        if self._kinematics is not None:
+            start_pose = self._local_pose(start_positions)
+        else:
+            start_pose = self._end_effector_pose
+            assert start_pose is not None, "Cartesian pose not populated!"
+        positions, orientations, progress = _densify_path(
+            np.vstack([start_pose[:3], positions]),
+            np.vstack([start_pose[3:], orientations]),
+            max_step,
+            max_angle_step,
+        )
+
+        period = self._scheduler.period
+        ticks = int(np.ceil(duration / period - 1e-9)) + 1
+        path_progress = np.interp(
+            _min_jerk(np.arange(ticks) * period / duration),
+            progress,
+            np.arange(len(progress), dtype=np.float64),
+        )
+
+        solutions = np.full((len(positions), 7), np.nan)
+        success = np.zeros(len(positions), dtype=bool)
+        solutions[0] = start_positions
+        success[0] = True
+        motion = _PathMotion(path_progress, period, solutions, success, max_joint_step)
+
+        def solve():
+            try:
+                self._inverse_kinematics_pipeline(
+                    positions,
+                    orientations,
+                    None,
+                    True,
+                    max_in_flight,
+                    solver,
+                    solutions,
+                    success,
+                    motion.solved,
+                )
+            except Exception as e:
+                motion.fail(e)
+
+        solve_thread = threading.Thread(target=solve)
+        solve_thread.daemon = True
+        solve_thread.start()
+
+        motion.wait_ready(lookahead)
+        motion.handle = self._stream(motion, soft_position_control, False)
+        if wait:
+            motion.handle.wait()
+        return motion.handle
+
+    def set_cartesian_velocity(
+        self,
+        twist,  # type: np.ndarray
+        timeout=0.2,  # type: float
+        damping=0.05,  # type: float
+        max_joint_velocity=1.0,  # type: float
+        soft_position_control=False,  # type: bool
+    ):  # type: (...) -> MotionHandle
+        """Move the end effector at a cartesian velocity, eg for teleoperation.
+
+        Joint velocities come from the Jacobian at the latest joint state,
+        computed locally, and are integrated into position targets streamed
+        at `stream_rate`. Calling this again while the motion is running just
+        swaps in the new `twist`, which takes effect on the next target, so
+        it's cheap to call at a high rate; the other arguments only apply when
+        a motion starts. The motion runs until it's
+        cancelled or another motion starts; if no new velocity arrives within
+        `timeout`, the arm holds position until one does.
+
+        Needs the arm's kinematics, so it's unavailable with
+        `pose_source="tf"` or if the URDF couldn't be loaded.
+
+        Args:
+            twist (iterable): Linear (x,y,z) velocity, in meters per second,
+                followed by angular (x,y,z) velocity, in radians per second,
+                of the end effector wrt the world frame.
+            timeout (float, optional): Seconds to keep moving after the last
+                call. Defaults to 0.2.
+            damping (float, optional): Damping for the Jacobian
+                pseudo-inverse; larger values slow down near singularities.
+                Defaults to 0.05.
+            max_joint_velocity (float, optional): Largest joint velocity, in
+                radians per second. Faster motions are scaled down, keeping
+                their direction. Defaults to 1.
+            soft_position_control (bool, optional): See
+                `set_joint_positions()`. Defaults to False.
+
+        Returns:
+            MotionHandle: A handle for cancelling the motion.
+        """
+        twist = np.array(twist, dtype=np.float64)
+        assert twist.shape == (6,)
+        chain = self._kinematics
+        assert chain is not None, "Cartesian velocity control needs kinematics"
+
+        mode = (
+            _BlueController.SOFT_POSITION
+            if soft_position_control
+            else _BlueController.POSITION
+        )
+        motion = self._velocity_motion
+        if motion is not None and not motion.handle.done():
+            if self._control_mode == mode:
+                motion.set_twist(twist)
+                return motion.handle
+
+        motion = _VelocityMotion(
+            chain,
+            lambda: self._state.joint_positions,  # type: ignore
+            self._stream_start_positions(),
+            timeout,
+            damping,
+            max_joint_velocity,
+        )
+        motion.set_twist(twist)
+        motion.handle = self._stream(motion, soft_position_control, False)
+        self._velocity_motion = motion
+        return motion.handle
+
+    def get_stream_stats(self):  # type: (...) -> Dict[str, float]
+        """Get timing statistics for motions streamed to the arm, eg by
+        `set_joint_positions()`.
+
+        Returns:
+            dict: {"ticks": number of targets sent, "overruns": number of
+            targets sent more than one period late, "mean_lateness": average
+            seconds each target was sent after its deadline, "max_lateness":
+            the worst case}.
+        """
+        return self._scheduler.stats()
+
+    def set_joint_torques(
+        self,
+        joint_torques,  # type: np.ndarray
+    ):  # type: (...) -> None
+        """Command joint torques to the arm.
+
+        Args:
+            joint_torques (iterable): An array of 7 joint torques, in Nm,
+            ordered from proximal to distal.
+        """
+
+        joint_torques = np.asarray(joint_torques)
+        assert len(joint_torques) == 7
+
+        self._scheduler.cancel()
+        self._end_torque_controller("preempted")
+        self._set_control_mode(_BlueController.TORQUE)
+
+        self._joint_torque_publisher.publish_float64_array(joint_torques)
+
+    def run_torque_controller(
+        self,
+        fn,  # type: Callable[[BlueState], Sequence[float]]
+    ):  # type: (...) -> MotionHandle
+        """Run a torque controller, eg for impedance or force control, that's
+        called on every new robot state:
+
+        .. code-block:: python
+
+           def controller(state):
+               return stiffness * (target - state.joint_positions)
+
+           handle = blue.run_torque_controller(controller)
+
+        `fn` runs on the thread that receives joint states and its torques
+        are published straight away, so the time from sensing to acting is
+        just the time `fn` takes. It must return quickly; states that arrive
+        while it's running wait for it.
+
+        The controller runs until it's cancelled, or until another command,
+        eg `set_joint_positions()` or `disable_control()`, preempts it. If
+        `fn` raises, zero torques are sent, and the handle's status becomes
+        "failed" with the exception as its `error`.
+
+        Args:
+            fn (function): Called with each new `BlueState`, returning an
+                array of 7 joint torques, in Nm, ordered from proximal to
+                distal.
+
+        Returns:
+            MotionHandle: A handle for waiting on or cancelling the controller.
+        """
+        self._scheduler.cancel()
+        self._end_torque_controller("preempted")
+        self._set_control_mode(_BlueController.TORQUE)
+        handle = MotionHandle(self._cancel_torque_controller)
+        self._torque_controller = _TorqueController(
+            fn, self._joint_torque_publisher.publish_float64_array, handle
+        )
+        return handle
+
+    def get_torque_controller_stats(self):  # type: (...) -> Dict[str, float]
+        """Get timing statistics for the current or most recent controller
+        started by `run_torque_controller()`.
+
+        Returns:
+            dict: {"cycles": number of states handled, "mean_compute" and
+            "max_compute": seconds spent in the controller and publishing its
+            torques, "mean_latency", "max_latency", and "last_latency":
+            seconds from receiving a state to publishing torques for it}.
+        """
+        controller = self._torque_controller
+        assert controller is not None, "No torque controller has been run"
+        return controller.stats()
+
+    def disable_control(self):  # type: (...) -> None
+        """Set joint control mode to gravity compensation only."""
+        self._scheduler.cancel()
+        self._end_torque_controller("cancelled")
+        self._set_control_mode(_BlueController.GRAV_COMP)
+
+    def enable_gripper(self):  # type: (...) -> None
+        """Enables the gripper. The gripper will begin to hold position."""
+        self._switch_controller([self._controller_lookup[_BlueController.GRIPPER]], [])
+        self._gripper_enabled = True
+
+    def enable_gripper_async(self):  # type: (...) -> Future
+        """Non-blocking version of `enable_gripper()`.
+
+        Returns:
+            concurrent.futures.Future: Resolves to None once the gripper
+            controller has started, or fails with `ROSBridgeServiceError`.
+        """
+        return self._switch_gripper_async(True)
+
+    def disable_gripper(self):  # type: (...) -> None
+        """Disables the gripper. The gripper will become compliant."""
+        self._switch_controller([], [self._controller_lookup[_BlueController.GRIPPER]])
+        self._gripper_enabled = False
+
+    def disable_gripper_async(self):  # type: (...) -> Future
+        """Non-blocking version of `disable_gripper()`.
+
+        Returns:
+            concurrent.futures.Future: Resolves to None once the gripper
+            controller has stopped, or fails with `ROSBridgeServiceError`.
+        """
+        return self._switch_gripper_async(False)
+
+    def _switch_gripper_async(
+        self,
+        enabled,  # type: bool
+    ):  # type: (...) -> Future
+        controllers = [self._controller_lookup[_BlueController.GRIPPER]]
+
+        def update_gripper_enabled(response):
+            response.result()
+            self._gripper_enabled = enabled
+
+        if enabled:
+            switched = self._switch_controller_async(controllers, [])
+        else:
+            switched = self._switch_controller_async([], controllers)
+        return _then(switched, update_gripper_enabled)
+
+    def inverse_kinematics(
+        self,
+        position,  # type: np.ndarray
+        orientation,  # type: np.ndarray
+        seed_joint_positions=[],  # type: Sequence
+        solver="trac-ik",  # type: str
+    ):  # type: (...) -> np.ndarray
+        """Given a desired cartesian pose for the end effector, compute the
+        necessary joint angles. Note that the system is underparameterized and
+        there are an infinite number of possible solutions; this will only
+        return a single possible one.
+
+        Args:
+            position (iterable): A length-3 array containing a cartesian position
+                (x,y,z), wrt the world frame.
+            orientation (iterable): A length-4 array containing a quaternion
+                (x,y,z,w), wrt the world frame.
+            seed_joint_positions (iterable, optional): An array of 7 joint
+                angles, to be used to initalize the IK solver.
+            solver (str, optional): "trac-ik" to solve on the robot through
+                its IK service, or "local" to solve in-process with
+                `KinematicChain.inverse_kinematics()`, which avoids the network
+                round trip. The local solver starts from the current joint
+                positions if no seed is given. Defaults to "trac-ik".
+        Returns:
+            numpy.ndarray: An array of 7 joint angles, or an empty array if no
+            solution was found.
+        """
+        return self.inverse_kinematics_async(
+            position, orientation, seed_joint_positions, solver
+        ).result()
+
+    def inverse_kinematics_async(
+        self,
+        position,  # type: np.ndarray
+        orientation,  # type: np.ndarray
+        seed_joint_positions=[],  # type: Sequence
+        solver="trac-ik",  # type: str
+    ):  # type: (...) -> Future
+        """Non-blocking version of `inverse_kinematics()`. Any number of
+        requests can be in flight at once.
+
+        Args:
+            position (iterable): A length-3 array containing a cartesian position
+                (x,y,z), wrt the world frame.
+            orientation (iterable): A length-4 array containing a quaternion
+                (x,y,z,w), wrt the world frame.
+            seed_joint_positions (iterable, optional): An array of 7 joint
+                angles, to be used to initalize the IK solver.
+            solver (str, optional): "trac-ik" to solve on the robot through
+                its IK service, or "local" to solve in-process with
+                `KinematicChain.inverse_kinematics()`, which avoids the network
+                round trip. The local solver starts from the current joint
+                positions if no seed is given. Defaults to "trac-ik".
+                The local solver runs before this returns.
+        Returns:
+            concurrent.futures.Future: Resolves to the same value that
+            `inverse_kinematics()` returns.
+        """
+
+        cache = self._ik_cache
+        if cache is not None:
+            key = cache.key(
+                position, orientation, seed_joint_positions, solver, self._side
+            )
+            solution = cache.get(key)
+            if solution is not None:
+                future = Future()  # type: Future
+                future.set_result(solution)
+                return future
+        seed_joint_positions = self._ik_seed(
+            position, orientation, seed_joint_positions
+        )
+
+        def parse(response):
+            try:
+                values = response.result()
+            except ROSBridgeServiceError as e:
+                solution = np.asarray([])
+                found = _is_no_solution(e.values)
+            else:
+                solution = np.asarray(values["ik_joint_positions"])
+                found = True
+            if cache is not None and found:
+                cache.put(key, solution)
+            return solution
+
+        if solver == "local":
+            future = Future()
+            try:
+                future.set_result(
+                    self._local_inverse_kinematics(
+                        position, orientation, seed_joint_positions
+                    )
+                )
+            except Exception as e:
+                future.set_exception(e)
+            # A local solve can fail from one start and succeed from another,
+            # so only solutions are cached
+            if (
+                cache is not None
+                and future.exception() is None
+                and len(future.result()) != 0
+            ):
+                cache.put(key, future.result())
+            return future
+
+        request_msg = self._inverse_kinematics_request(
+            position, orientation, seed_joint_positions, solver
+        )
+        return _then(
+            self._inverse_kinematics_client.call_async(
+                request_msg, self._service_timeout
+            ),
+            parse,
+        )
+
+    def inverse_kinematics_many(
+        self,
+        positions,  # type: np.ndarray
+        orientations,  # type: np.ndarray
+        seeds=None,  # type: Optional[np.ndarray]
+        chain_seeds=True,  # type: bool
+        max_in_flight=8,  # type: int
+        solver="trac-ik",  # type: str
+    ):  # type: (...) -> Tuple[np.ndarray, np.ndarray]
+        """Solve inverse kinematics for many poses, eg the waypoints of a path,
+        keeping up to `max_in_flight` requests outstanding at once.
+
+        Args:
+            positions (numpy.ndarray): (N, 3) cartesian positions (x,y,z), wrt
+                the world frame.
+            orientations (numpy.ndarray): (N, 4) quaternions (x,y,z,w), wrt the
+                world frame.
+            seeds (numpy.ndarray, optional): (N, 7) seed joint angles, one per
+                pose. Defaults to None.
+            chain_seeds (bool, optional): When `seeds` isn't given, seed each
+                request with the solution for the latest earlier pose that has
+                been solved. With `max_in_flight=1` every pose is seeded with
+                the previous one's solution; larger windows trade some of that
+                continuity for throughput. Defaults to True.
+            max_in_flight (int, optional): Maximum number of outstanding
+                requests. Defaults to 8.
+            solver (str, optional): See `inverse_kinematics()`. For the local
+                solver, `get_kinematics().inverse_kinematics()` can also solve
+                a whole batch in one vectorized call.
+
+        Returns:
+            tuple: (N, 7) joint angles, with NaN rows where no solution was
+            found, and an (N,) boolean array that's True where one was.
+        """
+        positions = np.asarray(positions, dtype=np.float64)
+        orientations = np.asarray(orientations, dtype=np.float64)
+        count = len(positions)
+        assert positions.shape == (count, 3) and orientations.shape == (count, 4)
+        assert seeds is None or np.shape(seeds) == (count, 7)
+        assert max_in_flight > 0
+
+        solutions = np.full((count, 7), np.nan)
+        success = np.zeros(count, dtype=bool)
+        self._inverse_kinematics_pipeline(
+            positions,
+            orientations,
+            seeds,
+            chain_seeds,
+            max_in_flight,
+            solver,
+            solutions,
+            success,
+        )
+        return solutions, success
+
+    def _inverse_kinematics_pipeline(
+        self,
+        positions,  # type: np.ndarray
+        orientations,  # type: np.ndarray
+        seeds,  # type: Optional[np.ndarray]
+        chain_seeds,  # type: bool
+        max_in_flight,  # type: int
+        solver,  # type: str
+        solutions,  # type: np.ndarray
+        success,  # type: np.ndarray
+        on_solved=None,  # type: Optional[Callable[[int], bool]]
+    ):  # type: (...) -> None
+        # Fills in `solutions` and `success` as responses arrive, calling
+        # `on_solved(index)` after each; it can return False to stop sending
+        # new requests. Poses already marked as solved are skipped, but still
+        # seed the poses after them
+        count = len(positions)
+        solved = np.flatnonzero(success)
+        latest_solved = solved[-1] if len(solved) > 0 else -1
+        pending = {}  # type: Dict[Future, int]
+        next_index = 0
+        stopped = False
+        while (next_index < count and not stopped) or len(pending) > 0:
+            while next_index < count and not stopped and len(pending) < max_in_flight:
+                if success[next_index]:
+                    next_index += 1
+                    continue
+                if seeds is not None:
+                    seed = seeds[next_index]  # type: Sequence
+                elif chain_seeds and latest_solved >= 0:
+                    seed = solutions[latest_solved]
+                else:
+                    seed = []
+                future = self.inverse_kinematics_async(
+                    positions[next_index], orientations[next_index], seed, solver
+                )
+                pending[future] = next_index
+                next_index += 1
+
+            done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                solution = future.result()
+                if len(solution) != 0:
+                    solutions[index] = solution
+                    success[index] = True
+                    latest_solved = max(latest_solved, index)
+                if on_solved is not None and on_solved(index) is False:
+                    stopped = True
+
+    def wait_for_state(
+        self,
+        after_seq=None,  # type: Optional[int]
+        timeout=None,  # type: Optional[float]
+    ):  # type: (...) -> BlueState
+        """Wait for a new robot state. Wakes up as soon as the state arrives,
+        so loops that call this run in lockstep with the robot:
+
+        .. code-block:: python
+
+           state = blue.get_state()
+           while True:
+               state = blue.wait_for_state(state.seq)
+               ...
+
+        Args:
+            after_seq (int, optional): Return the first state with a `seq`
+                greater than this; if it has already arrived, return
+                immediately. Defaults to None, which waits for the next state.
+            timeout (float, optional): Seconds to wait before raising
+                `concurrent.futures.TimeoutError`. Defaults to None, which
+                waits forever.
+
+        Returns:
+            BlueState: The newest state.
+        """
+        with self._state_condition:
+            if after_seq is None:
+                after_seq = self._state_seq
+            if timeout is not None:
+                deadline = time.time() + timeout
+            state = self._state
+            while state is None or state.seq <= after_seq:
+                remaining = None if timeout is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("No new robot state after {}s".format(timeout))
+                self._state_condition.wait(remaining)
+                state = self._state
+        return state
+
+    def stream_states(
+        self,
+        on_overrun="skip",  # type: str
+        timeout=None,  # type: Optional[float]
+    ):  # type: (...) -> Iterator[BlueState]
+        """Iterate over robot states as they arrive, starting with the next one.
+
+        Args:
+            on_overrun (str, optional): What to do when the loop body takes
+                longer than the robot's publish interval and states are
+                missed. "skip" continues with the newest state, "warn" does the
+                same but prints how many were missed, and "raise" raises
+                `RuntimeError`. `get_history(since_seq=...)` can recover
+                missed joint states. Defaults to "skip".
+            timeout (float, optional): Seconds to wait for each state before
+                raising `concurrent.futures.TimeoutError`. Defaults to None,
+                which waits forever.
+
+        Yields:
+            BlueState: Each new state.
+        """
+        assert on_overrun in ("skip", "warn", "raise")
+        seq = self._state_seq
+        while True:
+            state = self.wait_for_state(seq, timeout)
+            missed = state.seq - seq - 1
+            if missed > 0 and on_overrun == "raise":
+                raise RuntimeError("Missed {} robot states".format(missed))
+            if missed > 0 and on_overrun == "warn":
+                print("Missed {} robot states".format(missed))
+            seq = state.seq
+            yield state
+
+    def _stream_start_positions(self):  # type: (...) -> np.ndarray
+        # Continue from wherever the running motion has got to, so preempting
+        # it doesn't jump back to the (lagging) measured position
+        start_positions = self._scheduler.current_target()
+        if start_positions is None:
+            start_positions = self.get_joint_positions()
+        return start_positions
+
+    def _stream(
+        self,
+        sample,  # type: Callable[[float], Tuple[np.ndarray, bool]]
+        soft_position_control,  # type: bool
+        wait,  # type: bool
+    ):  # type: (...) -> MotionHandle
+        self._end_torque_controller("preempted")
+        if soft_position_control:
+            self._set_control_mode(_BlueController.SOFT_POSITION)
+            publish = self._joint_soft_position_publisher.publish_float64_array
+        else:
+            self._set_control_mode(_BlueController.POSITION)
+            publish = self._joint_position_publisher.publish_float64_array
+        handle = self._scheduler.start(sample, publish)
+        if wait:
+            handle.wait()
+        return handle
+
+    def _publish_state(
+        self,
+        receive_time,  # type: float
+        stamp,  # type: Optional[float]
+    ):  # type: (...) -> None
+        _BlueInterfaceBase._publish_state(self, receive_time, stamp)
+        controller = self._torque_controller
+        if controller is not None and not controller.handle.done():
+            controller(self._state)
+        with self._state_condition:
+            self._state_condition.notify_all()
+
+    def _cancel_torque_controller(
+        self,
+        handle,  # type: MotionHandle
+    ):  # type: (...) -> None
+        controller = self._torque_controller
+        if controller is not None and controller.handle is handle:
+            self._end_torque_controller("cancelled")
+
+    def _end_torque_controller(
+        self,
+        status,  # type: str
+    ):  # type: (...) -> None
+        controller = self._torque_controller
+        if controller is not None and not controller.handle.done():
+            controller.handle._end(status)
+
+    def _set_control_mode(
+        self,
+        mode,  # type: _BlueController
+    ):  # type: (...) -> bool
+        if mode == self._control_mode:
+            return True
+        self._switch_controller(
+            [self._controller_lookup[mode]],
+            [self._controller_lookup[self._control_mode]],
+            new_control_mode=mode,
+        )
+        return mode == self._control_mode
+
+    def _switch_controller(
+        self,
+        start,  # type: List[str]
+        stop,  # type: List[str]
+        new_control_mode=None,  # type: Optional[_BlueController]
+    ):  # type: (...) -> None
+        try:
+            self._switch_controller_async(start, stop, new_control_mode).result()
+        except ROSBridgeServiceError:
+            # The control mode is left unchanged
+            pass
 
         # Even after the controller is successfully switched, it needs a moment
         # to instantiate the command topic subscriber, etc
         time.sleep(0.01)
 
+    def _switch_controller_async(
+        self,
+        start,  # type: List[str]
+        stop,  # type: List[str]
+        new_control_mode=None,  # type: Optional[_BlueController]
+    ):  # type: (...) -> Future
+        def update_control_mode(response):
+            response.result()
+            if new_control_mode is not None:
+                self._control_mode = new_control_mode
+
+        request_msg = self._switch_controller_request(start, stop)
+        return _then(
+            self._switch_controller_service_client.call_async(
+                request_msg, self._service_timeout
+            ),
+            update_control_mode,
+        )
+
     def _load_controller(
-        self, name  # type: str
+        self,
+        name,  # type: str
+    ):  # type: (...) -> None
+        self._load_controller_async(name).result()
+
+    def _load_controller_async(
+        self,
+        name,  # type: str
+    ):  # type: (...) -> Future
+        return self._load_controller_service_client.call_async(
+            {"name": name}, self._service_timeout
+        )
+
+    def _unload_controller(
+        self,
+        name,  # type: str
     ):  # type: (...) -> None
-        request_msg = {"name": name}
+        self._unload_controller_async(name).result()
 
-        s = threading.Semaphore(0)
+    def _unload_controller_async(
+        self,
+        name,  # type: str
+    ):  # type: (...) -> Future
+        return self._unload_controller_service_client.call_async(
+            {"name": name}, self._service_timeout
+        )
 
-        def callback(success, values):
-            s.release()
 
-        self._load_controller_service_client.request(request_msg, callback)
-        s.acquire()
+class BlueSession:
+    """A rosbridge connection shared by several arms in one process.
 
-    def _unload_controller(
-        self, name  # type: str
+    Arms created from the same session share one websocket and one joint
+    state subscription, which is decoded once per message and routed to each
+    arm:
+
+    .. code-block:: python
+
+       session = BlueSession(ip="127.0.0.1")
+       left = session.arm("left")
+       right = session.arm("right")
+
+    Args:
+        ip (str): The IP address of the robot, which by default should have
+            a running rosbridge server.
+        port (int, optional): The websocket port number for rosbridge.
+            Defaults to 9090.
+        compression (str, optional): See `BlueInterface`. Defaults to "cbor".
+        state_rate (float, optional): See `BlueInterface`. Defaults to None.
+        startup_timeout (float, optional): Seconds to wait for the connection
+            to open before raising `concurrent.futures.TimeoutError`. None
+            waits forever. Defaults to 10.
+    """
+
+    def __init__(
+        self,
+        ip,  # type: str
+        port=9090,  # type: int
+        compression="cbor",  # type: str
+        state_rate=None,  # type: Optional[float]
+        startup_timeout=10.0,  # type: Optional[float]
+    ):  # type: (...) -> None
+        self._RBC = ROSBridgeClient(ip, port, startup_timeout)
+        self._compression = compression
+        self._state_rate = state_rate
+
+        # Registered before any arm, so it runs after every arm's shutdown
+        atexit.register(self.close)
+
+    def arm(
+        self,
+        side,  # type: str
+        service_timeout=10.0,  # type: Optional[float]
+        startup_timeout=10.0,  # type: Optional[float]
+        history_size=None,  # type: Optional[int]
+        pose_source="local",  # type: str
+        ik_cache=None,  # type: Optional[IKCache]
+        workspace_map=None,  # type: Optional[WorkspaceMap]
+        stream_rate=60.0,  # type: float
+    ):  # type: (...) -> BlueInterface
+        """Create an interface for one arm on this connection.
+
+        Args:
+            side (str): side of the arm, "left" or "right"
+            service_timeout (float, optional): See `BlueInterface`.
+            startup_timeout (float, optional): See `BlueInterface`.
+            history_size (int, optional): See `BlueInterface`.
+            pose_source (str, optional): See `BlueInterface`.
+            ik_cache (IKCache, optional): See `BlueInterface`.
+            workspace_map (WorkspaceMap, optional): See `BlueInterface`.
+            stream_rate (float, optional): See `BlueInterface`.
+
+        Returns:
+            BlueInterface: The arm interface.
+        """
+        return BlueInterface(
+            side,
+            service_timeout=service_timeout,
+            session=self,
+            startup_timeout=startup_timeout,
+            history_size=history_size,
+            pose_source=pose_source,
+            ik_cache=ik_cache,
+            workspace_map=workspace_map,
+            stream_rate=stream_rate,
+        )
+
+    def close(self):  # type: (...) -> None
+        """Close the shared connection. Arms should be shut down first."""
+        self._RBC.close()
+
+
+class _JointStateStream:
+    """The `/joint_states` subscription for one rosbridge connection.
+
+    Each message is decoded once, its numeric fields are converted to NumPy
+    arrays once, and it's then routed only to the arms whose joints it
+    contains. Routes are cached per joint name layout.
+
+    Args:
+        rosbridge (ROSBridgeProtocol): The rosbridge client.
+        compression (str): Compression requested for the stream.
+        state_rate (float, optional): Maximum stream rate, in Hz.
+    """
+
+    _lock = threading.Lock()
+
+    @classmethod
+    def shared(
+        cls,
+        rosbridge,  # type: ROSBridgeProtocol
+        compression,  # type: str
+        state_rate,  # type: Optional[float]
+        joint_names,  # type: List[str]
+        callback,  # type: Callable[[Dict[str, Any]], None]
+    ):  # type: (...) -> _JointStateStream
+        """Get the stream for a rosbridge connection, creating it if needed,
+        and `attach()` a callback to it. Only the first caller's options are
+        used. The stream is kept on the connection, and unsubscribes once its
+        last callback is detached."""
+        with cls._lock:
+            stream = rosbridge._joint_state_stream
+            if stream is None:
+                stream = cls(rosbridge, compression, state_rate)
+                rosbridge._joint_state_stream = stream
+            stream._attach(joint_names, callback)
+        return stream
+
+    def __init__(
+        self,
+        rosbridge,  # type: ROSBridgeProtocol
+        compression,  # type: str
+        state_rate,  # type: Optional[float]
+    ):  # type: (...) -> None
+        self._rosbridge = rosbridge
+        self._callbacks = ()  # type: Tuple[Tuple[frozenset, Callable], ...]
+        self._routes = {}  # type: Dict[Tuple[str, ...], Tuple[Callable, ...]]
+        self._subscriber = rosbridge.subscriber(
+            "/joint_states",
+            "sensor_msgs/JointState",
+            self._callback,
+            compression=compression,
+            throttle_rate=None if state_rate is None else int(1000.0 / state_rate),
+            queue_length=None if state_rate is None else 1,
+        )
+
+    def _attach(
+        self,
+        joint_names,  # type: List[str]
+        callback,  # type: Callable[[Dict[str, Any]], None]
+    ):  # type: (...) -> None
+        # Route messages containing any of `joint_names` to `callback`
+        self._callbacks += ((frozenset(joint_names), callback),)
+        self._routes = {}
+
+    def detach(
+        self,
+        callback,  # type: Callable[[Dict[str, Any]], None]
+    ):  # type: (...) -> None
+        """Stop routing messages to `callback`, unsubscribing if it was the
+        last one."""
+        with self._lock:
+            self._callbacks = tuple(c for c in self._callbacks if c[1] != callback)
+            self._routes = {}
+            if len(self._callbacks) == 0:
+                self._subscriber.unregister()
+                if self._rosbridge._joint_state_stream is self:
+                    self._rosbridge._joint_state_stream = None
+
+    def _callback(
+        self,
+        message,  # type: Dict[str, Any]
     ):  # type: (...) -> None
-        request_msg = {"name": name}
+        # Read the route cache before the callback list: `attach()` and
+        # `detach()` write them in the opposite order, so a stale route can
+        # only ever be stored in a cache that has already been replaced
+        routes = self._routes
+        names = tuple(message["name"])
+        callbacks = routes.get(names)
+        if callbacks is None:
+            callbacks = tuple(
+                callback
+                for joint_names, callback in self._callbacks
+                if not joint_names.isdisjoint(names)
+            )
+            routes[names] = callbacks
+        if len(callbacks) == 0:
+            return
+
+        for key in ("position", "velocity", "effort"):
+            message[key] = np.asarray(message[key], dtype=np.float64)
+        for callback in callbacks:
+            callback(message)
+
+
+class BlueState(
+    collections.namedtuple(
+        "BlueState",
+        [
+            "seq",
+            "receive_time",
+            "stamp",
+            "joint_positions",
+            "joint_velocities",
+            "joint_torques",
+            "gripper_position",
+            "gripper_effort",
+            "end_effector_position",
+            "end_effector_orientation",
+        ],
+    )
+):
+    """An immutable snapshot of an arm's state, returned by `get_state()`.
+    Arrays are read-only.
+
+    Attributes:
+        seq (int): Increases by one for every joint state received by the arm.
+        receive_time (float): When the joint state was received, as a Unix
+            timestamp.
+        stamp (float): The joint state message's header stamp, in seconds, or
+            None if the message has no header.
+        joint_positions (numpy.ndarray): 7 joint angles, in radians, ordered
+            from proximal to distal.
+        joint_velocities (numpy.ndarray): 7 joint velocities, in rad/s.
+        joint_torques (numpy.ndarray): 7 joint torques, in Nm.
+        gripper_position (float): The gripper gap in cm, or None if not yet
+            received.
+        gripper_effort (float): The gripper effort in N, or None if not yet
+            received.
+        end_effector_position (numpy.ndarray): The newest end effector position
+            (x,y,z) wrt the world frame, or None if not yet received.
+        end_effector_orientation (numpy.ndarray): The newest end effector
+            orientation quaternion (x,y,z,w) wrt the world frame, or None if
+            not yet received.
+    """
+
+    __slots__ = ()
+
+
+def _header_stamp(
+    message,  # type: Dict[str, Any]
+):  # type: (...) -> Optional[float]
+    header = message.get("header")
+    if header is None:
+        return None
+    stamp = header["stamp"]
+    return stamp["secs"] + stamp["nsecs"] * 1e-9
+
 
-        s = threading.Semaphore(0)
+def _is_no_solution(
+    values,  # type: Any
+):  # type: (...) -> bool
+    """Check whether a failed IK service call means the pose has no solution,
+    rather than eg the service being unavailable, which may not happen again.
 
-        def callback(success, values):
-            s.release()
+    rosbridge reports a service whose handler returned false, which is how
+    the IK service says there's no solution, as "service [...] responded with
+    an error".
+    """
+    return "responded with an error" in str(values)
+
+
+def _then(
+    future,  # type: Future
+    fn,  # type: Callable[[Future], Any]
+):  # type: (...) -> Future
+    """Chain a function onto a future.
 
-        self._unload_controller_service_client.request(request_msg, callback)
-        s.acquire()
+    Args:
+        future (concurrent.futures.Future): The future to chain onto.
+        fn (function): Called with `future` once it completes successfully or
+            fails. Its return value (or exception) resolves the output future.
+
+    Returns:
+        concurrent.futures.Future: A future for the result of `fn`. Cancelling
+        it also cancels `future`.
+    """
+    output = Future()  # type: Future
+
+    def done(f):
+        if f.cancelled():
+            output.cancel()
+            return
+        if not output.set_running_or_notify_cancel():
+            return
+        try:
+            output.set_result(fn(f))
+        except Exception as e:
+            output.set_exception(e)
+
+    def cancel(o):
+        if o.cancelled():
+            future.cancel()
+
+    output.add_done_callback(cancel)
+    future.add_done_callback(done)
+    return output
 
 
 class _BlueController(Enum):
@@ -0,0 +1,162 @@
+"""A minimal CBOR (RFC 7049) decoder for rosbridge binary frames.
+
+rosbridge encodes numeric arrays (`float64[]`, `int32[]`, etc.) as RFC 8746 typed
+arrays when a subscription requests `cbor` compression. These are decoded directly
+into NumPy arrays with `numpy.frombuffer`, so joint states arrive without any text
+parsing or per-element Python objects.
+"""
+
+import struct
+
+import numpy as np
+
+# RFC 8746 typed array tags => NumPy dtypes
+_TYPED_ARRAY_DTYPES = {
+    64: np.dtype("u1"),
+    65: np.dtype(">u2"),
+    66: np.dtype(">u4"),
+    67: np.dtype(">u8"),
+    68: np.dtype("u1"),
+    69: np.dtype("<u2"),
+    70: np.dtype("<u4"),
+    71: np.dtype("<u8"),
+    72: np.dtype("i1"),
+    73: np.dtype(">i2"),
+    74: np.dtype(">i4"),
+    75: np.dtype(">i8"),
+    77: np.dtype("<i2"),
+    78: np.dtype("<i4"),
+    79: np.dtype("<i8"),
+    80: np.dtype(">f2"),
+    81: np.dtype(">f4"),
+    82: np.dtype(">f8"),
+    84: np.dtype("<f2"),
+    85: np.dtype("<f4"),
+    86: np.dtype("<f8"),
+}
+
+_BREAK = object()
+
+
+class CBORDecodeError(ValueError):
+    """Raised when a frame is not valid CBOR."""
+
+
+def loads(data):
+    """Decode a single CBOR data item.
+
+    Args:
+        data (bytes): The encoded frame.
+
+    Returns:
+        The decoded Python object. Maps become dicts, typed arrays become
+        (read-only when `data` is immutable) NumPy arrays that share memory with
+        `data`.
+    """
+    try:
+        value, offset = _decode(data, 0)
+    except (struct.error, IndexError) as e:
+        raise CBORDecodeError("Truncated CBOR frame: {}".format(e))
+    if value is _BREAK:
+        raise CBORDecodeError("Unexpected break code")
+    return value
+
+
+def _decode_length(data, offset, info):
+    if info < 24:
+        return info, offset
+    if info == 24:
+        return struct.unpack_from(">B", data, offset)[0], offset + 1
+    if info == 25:
+        return struct.unpack_from(">H", data, offset)[0], offset + 2
+    if info == 26:
+        return struct.unpack_from(">I", data, offset)[0], offset + 4
+    if info == 27:
+        return struct.unpack_from(">Q", data, offset)[0], offset + 8
+    if info == 31:
+        return None, offset
+    raise CBORDecodeError("Invalid additional info {}".format(info))
+
+
+def _decode_string(data, offset, length, major):
+    if length is not None:
+        return bytes(data[offset : offset + length]), offset + length
+
+    # Indefinite length: a sequence of definite-length chunks until a break
+    chunks = []
+    while True:
+        chunk, offset = _decode(data, offset)
+        if chunk is _BREAK:
+            break
+        chunks.append(chunk.encode("utf-8") if major == 3 else chunk)
+    return b"".join(chunks), offset
+
+
+def _decode(data, offset):
+    initial = struct.unpack_from(">B", data, offset)[0]
+    offset += 1
+    major = initial >> 5
+    info = initial & 0x1F
+
+    if major == 7:
+        if info == 20:
+            return False, offset
+        if info == 21:
+            return True, offset
+        if info == 22 or info == 23:
+            return None, offset
+        if info == 25:
+            return float(np.frombuffer(data, ">f2", 1, offset)[0]), offset + 2
+        if info == 26:
+            return struct.unpack_from(">f", data, offset)[0], offset + 4
+        if info == 27:
+            return struct.unpack_from(">d", data, offset)[0], offset + 8
+        if info == 31:
+            return _BREAK, offset
+        if info < 24:
+            return info, offset
+        return struct.unpack_from(">B", data, offset)[0], offset + 1
+
+    length, offset = _decode_length(data, offset, info)
+
+    if major == 0:
+        return length, offset
+    if major == 1:
+        return -1 - length, offset
+    if major == 2:
+        return _decode_string(data, offset, length, major)
+    if major == 3:
+        value, offset = _decode_string(data, offset, length, major)
+        return value.decode("utf-8"), offset
+    if major == 4:
+        items = []
+        while length is None or len(items) < length:
+            item, offset = _decode(data, offset)
+            if item is _BREAK:
+                break
+            items.append(item)
+        return items, offset
+    if major == 5:
+        mapping = {}
+        count = 0
+        while length is None or count < length:
+            key, offset = _decode(data, offset)
+            if key is _BREAK:
+                break
+            mapping[key], offset = _decode(data, offset)
+            count += 1
+        return mapping, offset
+
+    # Major type 6: tagged item
+    dtype = _TYPED_ARRAY_DTYPES.get(length)
+    if dtype is None:
+        # Unknown tags are transparent
+        return _decode(data, offset)
+
+    payload_initial = struct.unpack_from(">B", data, offset)[0]
+    if payload_initial >> 5 != 2 or payload_initial & 0x1F == 31:
+        value, offset = _decode(data, offset)
+        return np.frombuffer(value, dtype), offset
+    nbytes, offset = _decode_length(data, offset + 1, payload_initial & 0x1F)
+    array = np.frombuffer(data, dtype, nbytes // dtype.itemsize, offset)
+    return array, offset + nbytes
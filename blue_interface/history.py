@@ -0,0 +1,134 @@
+import collections
+from typing import Optional
+
+import numpy as np
+
+
+class BlueHistory(
+    collections.namedtuple(
+        "BlueHistory",
+        [
+            "seq",
+            "receive_time",
+            "stamp",
+            "joint_positions",
+            "joint_velocities",
+            "joint_torques",
+        ],
+    )
+):
+    """Recent joint states, oldest first, returned by `get_history()`. Fields
+    are named like `BlueState`'s, with one row per sample.
+
+    The arrays are read-only views into the history buffer, which keeps being
+    overwritten as new states arrive. A history of N samples stays unchanged
+    until `history_size + 2 - N` more states have arrived, so a full history
+    survives the next state but not the one after; copy the arrays to keep
+    them for longer.
+
+    Attributes:
+        seq (numpy.ndarray): (N,) state sequence numbers.
+        receive_time (numpy.ndarray): (N,) Unix timestamps of when each state
+            was received.
+        stamp (numpy.ndarray): (N,) header stamps, in seconds, or NaN for
+            messages without a header.
+        joint_positions (numpy.ndarray): (N, 7) joint angles, in radians.
+        joint_velocities (numpy.ndarray): (N, 7) joint velocities, in rad/s.
+        joint_torques (numpy.ndarray): (N, 7) joint torques, in Nm.
+    """
+
+    __slots__ = ()
+
+
+class _HistoryBuffer:
+    """A fixed-size ring buffer of joint states.
+
+    Every sample is written twice, at slots `i` and `i + capacity`, so the
+    newest `n <= size` samples are always one contiguous slice and can be
+    returned without copying. The ring has one more slot than `size`, so the
+    next append never writes into a slice that's been handed out. Appending
+    never allocates.
+
+    Args:
+        size (int): Number of samples to keep.
+    """
+
+    def __init__(
+        self,
+        size,  # type: int
+    ):  # type: (...) -> None
+        assert size > 0
+        self._size = size
+        self._capacity = size + 1
+        self._count = 0
+        self._seq = np.zeros(2 * self._capacity, dtype=np.int64)
+        self._receive_time = np.zeros(2 * self._capacity)
+        self._stamp = np.zeros(2 * self._capacity)
+        self._values = np.zeros((2 * self._capacity, 3, 7))
+
+    def append(
+        self,
+        seq,  # type: int
+        receive_time,  # type: float
+        stamp,  # type: Optional[float]
+        values,  # type: np.ndarray
+    ):  # type: (...) -> None
+        """Add a sample. `values` is a (3, 7) array of positions, velocities,
+        and torques."""
+        if stamp is None:
+            stamp = np.nan
+        slot = self._count % self._capacity
+        for array, value in (
+            (self._seq, seq),
+            (self._receive_time, receive_time),
+            (self._stamp, stamp),
+            (self._values, values),
+        ):
+            array[slot] = value
+            array[slot + self._capacity] = value
+        self._count += 1
+
+    def latest(
+        self,
+        n,  # type: int
+    ):  # type: (...) -> BlueHistory
+        """Get up to the `n` newest samples."""
+        count = self._count
+        n = max(0, min(n, count, self._size))
+        start = (count - n) % self._capacity
+        end = start + n
+        values = self._values[start:end]
+        history = BlueHistory(
+            self._seq[start:end],
+            self._receive_time[start:end],
+            self._stamp[start:end],
+            values[:, 0],
+            values[:, 1],
+            values[:, 2],
+        )
+        for array in history:
+            array.flags.writeable = False
+        return history
+
+    def since_seq(
+        self,
+        seq,  # type: int
+    ):  # type: (...) -> BlueHistory
+        """Get the samples with sequence numbers greater than `seq`."""
+        history = self.latest(self._size)
+        start = np.searchsorted(history.seq, seq, side="right")
+        return BlueHistory(*[array[start:] for array in history])
+
+    def window(
+        self,
+        seconds,  # type: float
+    ):  # type: (...) -> BlueHistory
+        """Get the samples received in the last `seconds` before the newest
+        one."""
+        history = self.latest(self._size)
+        if len(history.seq) == 0:
+            return history
+        start = np.searchsorted(
+            history.receive_time, history.receive_time[-1] - seconds, side="right"
+        )
+        return BlueHistory(*[array[start:] for array in history])
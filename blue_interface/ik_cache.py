@@ -0,0 +1,173 @@
+import collections
+import json
+import threading
+from typing import Any, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class IKCache(object):
+    """A bounded cache of inverse kinematics solutions, evicting the least
+    recently used entry when full.
+
+    Poses and seeds are quantized before lookup, so requests that differ by
+    less than the resolutions share an entry. Entries are keyed by arm, so one
+    cache can be shared between both arms of a robot. Poses the IK service
+    reports no solution for are cached too, but failed service calls, eg
+    timeouts, and failed local solves aren't. Pass an
+    instance to `BlueInterface` to use it:
+
+    .. code-block:: python
+
+       path = "ik_cache.json"
+       cache = IKCache.load(path) if os.path.exists(path) else IKCache()
+       blue = BlueInterface(side="right", ip="127.0.0.1", ik_cache=cache)
+       ...
+       cache.save(path)
+
+    Args:
+        max_size (int, optional): Maximum number of entries. Defaults to 4096.
+        position_resolution (float, optional): Position quantization, in
+            meters. Defaults to 1e-4.
+        orientation_resolution (float, optional): Quaternion component
+            quantization. Defaults to 1e-4.
+        seed_resolution (float, optional): Seed joint angle quantization, in
+            radians. Defaults to 1e-3.
+    """
+
+    def __init__(
+        self,
+        max_size=4096,  # type: int
+        position_resolution=1e-4,  # type: float
+        orientation_resolution=1e-4,  # type: float
+        seed_resolution=1e-3,  # type: float
+    ):  # type: (...) -> None
+        assert max_size > 0
+        self.max_size = max_size
+        self.position_resolution = position_resolution
+        self.orientation_resolution = orientation_resolution
+        self.seed_resolution = seed_resolution
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()  # type: collections.OrderedDict
+        self._lock = threading.Lock()
+
+    def __len__(self):  # type: (...) -> int
+        return len(self._entries)
+
+    def key(
+        self,
+        position,  # type: np.ndarray
+        orientation,  # type: np.ndarray
+        seed_joint_positions,  # type: Sequence[float]
+        solver,  # type: str
+        side,  # type: str
+    ):  # type: (...) -> Tuple
+        """Build the lookup key for an IK request for the arm on `side`."""
+        orientation = np.asarray(orientation, dtype=np.float64)
+        if orientation[3] < 0:
+            # q and -q are the same rotation
+            orientation = -orientation
+        return (
+            side,
+            solver,
+            _quantize(position, self.position_resolution),
+            _quantize(orientation, self.orientation_resolution),
+            _quantize(seed_joint_positions, self.seed_resolution),
+        )
+
+    def get(
+        self,
+        key,  # type: Tuple
+    ):  # type: (...) -> Optional[np.ndarray]
+        """Look up a solution, counting a hit or miss.
+
+        Returns:
+            numpy.ndarray: A copy of the cached solution (empty if the solve
+            failed), or None if it isn't cached.
+        """
+        with self._lock:
+            # Reinserting marks the entry as most recently used
+            solution = self._entries.pop(key, None)
+            if solution is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries[key] = solution
+        return solution.copy()
+
+    def put(
+        self,
+        key,  # type: Tuple
+        solution,  # type: np.ndarray
+    ):  # type: (...) -> None
+        """Store a solution, evicting the least recently used if full."""
+        solution = np.array(solution, dtype=np.float64)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = solution
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):  # type: (...) -> None
+        """Remove every entry, eg after the robot's kinematics change. The
+        hit and miss counters are kept."""
+        with self._lock:
+            self._entries.clear()
+
+    def save(
+        self,
+        path,  # type: str
+    ):  # type: (...) -> None
+        """Write the entries to a JSON file, least recently used first."""
+        with self._lock:
+            entries = [
+                [list(key), solution.tolist()]
+                for key, solution in self._entries.items()
+            ]
+        with open(path, "w") as f:
+            json.dump(
+                {
+                    "max_size": self.max_size,
+                    "position_resolution": self.position_resolution,
+                    "orientation_resolution": self.orientation_resolution,
+                    "seed_resolution": self.seed_resolution,
+                    "entries": entries,
+                },
+                f,
+            )
+
+    @classmethod
+    def load(
+        cls,
+        path,  # type: str
+    ):  # type: (...) -> IKCache
+        """Read a cache written by `save()`.
+
+        Returns:
+            IKCache: The cache, with the settings it was saved with.
+        """
+        with open(path) as f:
+            data = json.load(f)
+        cache = cls(
+            data["max_size"],
+            data["position_resolution"],
+            data["orientation_resolution"],
+            data["seed_resolution"],
+        )
+        for key, solution in data["entries"]:
+            side, solver, position, orientation, seed = key
+            cache.put(
+                (side, solver, tuple(position), tuple(orientation), tuple(seed)),
+                solution,
+            )
+        return cache
+
+
+def _quantize(
+    values,  # type: Any
+    resolution,  # type: float
+):  # type: (...) -> Tuple[int, ...]
+    return tuple(
+        int(v) for v in np.round(np.asarray(values, dtype=np.float64) / resolution)
+    )
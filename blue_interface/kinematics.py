@@ -0,0 +1,451 @@
+import xml.etree.ElementTree as ET
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class KinematicChain(object):
+    """A serial chain of joints, for computing forward kinematics locally.
+
+    Usually created from a URDF with `from_urdf()`. All methods accept either
+    a single configuration of shape (J,) or a batch of shape (N, J), where J
+    is the number of joints, and return results with a matching leading
+    dimension.
+
+    Args:
+        joint_names (list): Names of the J actuated joints, base to tip.
+        origins (numpy.ndarray): (J, 4, 4) fixed transforms from each joint's
+            parent frame to the joint frame, at a joint position of zero.
+        axes (numpy.ndarray): (J, 3) unit joint axes, in the joint frames.
+        prismatic (numpy.ndarray): (J,) True for prismatic joints, False for
+            revolute joints.
+        tip (numpy.ndarray): (4, 4) fixed transform from the last joint frame
+            to the tip frame.
+        lower (numpy.ndarray): (J,) lower joint limits; -inf if unlimited.
+        upper (numpy.ndarray): (J,) upper joint limits; inf if unlimited.
+    """
+
+    def __init__(
+        self,
+        joint_names,  # type: List[str]
+        origins,  # type: np.ndarray
+        axes,  # type: np.ndarray
+        prismatic,  # type: np.ndarray
+        tip,  # type: np.ndarray
+        lower,  # type: np.ndarray
+        upper,  # type: np.ndarray
+    ):  # type: (...) -> None
+        self.joint_names = list(joint_names)
+        self._origins = np.asarray(origins, dtype=np.float64)
+        self._axes = np.asarray(axes, dtype=np.float64)
+        self._prismatic = np.asarray(prismatic, dtype=bool)
+        self._tip = np.asarray(tip, dtype=np.float64)
+        self.lower = np.asarray(lower, dtype=np.float64)
+        self.upper = np.asarray(upper, dtype=np.float64)
+
+        count = len(self.joint_names)
+        assert self._origins.shape == (count, 4, 4)
+        assert self._axes.shape == (count, 3)
+        assert self._prismatic.shape == self.lower.shape == self.upper.shape
+        assert self._tip.shape == (4, 4)
+
+        # Skew-symmetric matrices of the axes, and their squares, for
+        # Rodrigues' rotation formula
+        skew = np.zeros((count, 3, 3))
+        skew[:, 0, 1] = -self._axes[:, 2]
+        skew[:, 0, 2] = self._axes[:, 1]
+        skew[:, 1, 0] = self._axes[:, 2]
+        skew[:, 1, 2] = -self._axes[:, 0]
+        skew[:, 2, 0] = -self._axes[:, 1]
+        skew[:, 2, 1] = self._axes[:, 0]
+        self._skew = skew
+        self._skew_squared = np.matmul(skew, skew)
+
+    @classmethod
+    def from_urdf(
+        cls,
+        urdf,  # type: str
+        base_link,  # type: str
+        tip_link,  # type: str
+        joint_names=None,  # type: Optional[Sequence[str]]
+    ):  # type: (...) -> KinematicChain
+        """Build the chain between two links of a URDF.
+
+        Args:
+            urdf (str): The URDF XML.
+            base_link (str): Name of the link that poses are expressed in.
+            tip_link (str): Name of the link to compute the pose of.
+            joint_names (list, optional): The joints to treat as actuated, in
+                base to tip order. Other movable joints on the chain are held
+                at zero. Defaults to None, which actuates every movable joint.
+
+        Returns:
+            KinematicChain: The chain.
+        """
+        root = ET.fromstring(urdf)
+        joint_by_child = dict(
+            (joint.find("child").get("link"), joint)  # type: ignore
+            for joint in root.findall("joint")
+        )
+
+        # Walk from the tip up to the base
+        chain = []  # type: List[ET.Element]
+        link = tip_link
+        while link != base_link:
+            assert link in joint_by_child, "No chain from {} to {}".format(
+                base_link, tip_link
+            )
+            joint = joint_by_child[link]
+            chain.append(joint)
+            link = joint.find("parent").get("link")  # type: ignore
+        chain.reverse()
+
+        names = []  # type: List[str]
+        origins = []  # type: List[np.ndarray]
+        axes = []  # type: List[np.ndarray]
+        prismatic = []  # type: List[bool]
+        lower = []  # type: List[float]
+        upper = []  # type: List[float]
+        transform = np.eye(4)
+        for joint in chain:
+            joint_type = joint.get("type")
+            assert joint_type in (
+                "fixed",
+                "revolute",
+                "continuous",
+                "prismatic",
+            ), "Unsupported joint type: {}".format(joint_type)
+            transform = np.matmul(transform, _urdf_origin(joint.find("origin")))
+            name = joint.get("name")
+            if joint_type == "fixed" or (
+                joint_names is not None and name not in joint_names
+            ):
+                continue
+
+            axis = joint.find("axis")
+            axis_xyz = _urdf_vector(None if axis is None else axis.get("xyz"), 1.0)
+            limit = joint.find("limit")
+            names.append(name)  # type: ignore
+            origins.append(transform)
+            axes.append(axis_xyz / np.linalg.norm(axis_xyz))
+            prismatic.append(joint_type == "prismatic")
+            if joint_type == "continuous" or limit is None:
+                lower.append(-np.inf)
+                upper.append(np.inf)
+            else:
+                lower.append(float(limit.get("lower", 0.0)))
+                upper.append(float(limit.get("upper", 0.0)))
+            transform = np.eye(4)
+
+        assert joint_names is None or names == list(
+            joint_names
+        ), "Joints {} not found in order on the chain from {} to {}".format(
+            joint_names, base_link, tip_link
+        )
+        return cls(
+            names,
+            np.array(origins).reshape((-1, 4, 4)),
+            np.array(axes).reshape((-1, 3)),
+            np.array(prismatic, dtype=bool),
+            transform,
+            np.array(lower),
+            np.array(upper),
+        )
+
+    def forward_kinematics(
+        self,
+        joint_positions,  # type: np.ndarray
+    ):  # type: (...) -> Tuple[np.ndarray, np.ndarray]
+        """Compute the pose of the tip link.
+
+        Args:
+            joint_positions (numpy.ndarray): (J,) or (N, J) joint positions.
+
+        Returns:
+            tuple: Positions (x,y,z) of shape (3,) or (N, 3), and orientation
+            quaternions (x,y,z,w) of shape (4,) or (N, 4), wrt the base link.
+        """
+        tip = self.tip_transform(joint_positions)
+        return tip[..., :3, 3], matrix_to_quaternion(tip[..., :3, :3])
+
+    def jacobian(
+        self,
+        joint_positions,  # type: np.ndarray
+    ):  # type: (...) -> np.ndarray
+        """Compute the geometric Jacobian of the tip link.
+
+        Args:
+            joint_positions (numpy.ndarray): (J,) or (N, J) joint positions.
+
+        Returns:
+            numpy.ndarray: (6, J) or (N, 6, J) Jacobians wrt the base link.
+            Rows are the linear velocity (x,y,z) followed by the angular
+            velocity (x,y,z) of the tip, per unit joint velocity.
+        """
+        return self.forward_kinematics_and_jacobian(joint_positions)[2]
+
+    def forward_kinematics_and_jacobian(
+        self,
+        joint_positions,  # type: np.ndarray
+    ):  # type: (...) -> Tuple[np.ndarray, np.ndarray, np.ndarray]
+        """Compute the pose and Jacobian of the tip link together, sharing the
+        work between them.
+
+        Args:
+            joint_positions (numpy.ndarray): (J,) or (N, J) joint positions.
+
+        Returns:
+            tuple: Positions, orientation quaternions, and Jacobians, as
+            returned by `forward_kinematics()` and `jacobian()`.
+        """
+        frames, tip = self._transforms(joint_positions)
+
+        # Joint axes and origins in the base frame: (..., J, 3)
+        axes = np.matmul(frames[..., :3, :3], self._axes[..., None])[..., 0]
+        origins = frames[..., :3, 3]
+        tip_position = tip[..., :3, 3]
+
+        revolute = ~self._prismatic[:, None]
+        linear = np.where(
+            revolute, np.cross(axes, tip_position[..., None, :] - origins), axes
+        )
+        angular = np.where(revolute, axes, 0.0)
+        jacobian = np.concatenate([linear, angular], axis=-1)
+        return (
+            tip_position,
+            matrix_to_quaternion(tip[..., :3, :3]),
+            np.swapaxes(jacobian, -1, -2),
+        )
+
+    def inverse_kinematics(
+        self,
+        position,  # type: np.ndarray
+        orientation,  # type: np.ndarray
+        seed=None,  # type: Optional[np.ndarray]
+        max_iterations=100,  # type: int
+        position_tolerance=1e-4,  # type: float
+        orientation_tolerance=1e-3,  # type: float
+        damping=0.05,  # type: float
+    ):  # type: (...) -> Tuple[np.ndarray, np.ndarray]
+        """Find joint positions that put the tip at a pose, using damped least
+        squares. Solutions are kept within the joint limits. Batches of poses
+        are solved together, in one set of vectorized iterations.
+
+        Args:
+            position (numpy.ndarray): (3,) or (N, 3) target positions (x,y,z).
+            orientation (numpy.ndarray): (4,) or (N, 4) target quaternions
+                (x,y,z,w).
+            seed (numpy.ndarray, optional): (J,) or (N, J) initial joint
+                positions. Defaults to None, which starts from zero, clipped
+                to the joint limits.
+            max_iterations (int, optional): Iteration limit. Defaults to 100.
+            position_tolerance (float, optional): Position error, in meters,
+                below which a solution is accepted. Defaults to 1e-4.
+            orientation_tolerance (float, optional): Orientation error, in
+                radians, below which a solution is accepted. Defaults to 1e-3.
+            damping (float, optional): Damping factor; larger values are more
+                robust near singularities but converge more slowly. Defaults to
+                0.05.
+
+        Returns:
+            tuple: (J,) or (N, J) joint positions, and a boolean or (N,)
+            boolean array that's True where the solver converged.
+        """
+        position = np.asarray(position, dtype=np.float64)
+        orientation = np.asarray(orientation, dtype=np.float64)
+        single = position.ndim == 1
+        position = np.atleast_2d(position)
+        orientation = np.atleast_2d(orientation)
+        count = len(position)
+        assert position.shape == (count, 3) and orientation.shape == (count, 4)
+
+        if seed is None:
+            seed = np.zeros(len(self.joint_names))
+        q = np.clip(
+            np.broadcast_to(
+                np.asarray(seed, dtype=np.float64), (count, len(self.joint_names))
+            ),
+            self.lower,
+            self.upper,
+        )
+        converged = np.zeros(count, dtype=bool)
+        damping_matrix = damping**2 * np.eye(6)
+
+        # Only the unconverged poses are iterated on
+        active = np.arange(count)
+        for _ in range(max_iterations):
+            current_position, current_orientation, jacobian = (
+                self.forward_kinematics_and_jacobian(q[active])
+            )
+            error = np.concatenate(
+                [
+                    position[active] - current_position,
+                    quaternion_error(orientation[active], current_orientation),
+                ],
+                axis=-1,
+            )
+            done = (np.linalg.norm(error[:, :3], axis=-1) < position_tolerance) & (
+                np.linalg.norm(error[:, 3:], axis=-1) < orientation_tolerance
+            )
+            converged[active[done]] = True
+            active, jacobian, error = active[~done], jacobian[~done], error[~done]
+            if len(active) == 0:
+                break
+
+            # dq = J^T (J J^T + damping^2 I)^-1 e
+            jacobian_t = np.swapaxes(jacobian, -1, -2)
+            step = np.matmul(
+                jacobian_t,
+                np.linalg.solve(
+                    np.matmul(jacobian, jacobian_t) + damping_matrix, error[..., None]
+                ),
+            )[..., 0]
+            q[active] = np.clip(q[active] + step, self.lower, self.upper)
+
+        if single:
+            return q[0], converged[0]
+        return q, converged
+
+    def tip_transform(
+        self,
+        joint_positions,  # type: np.ndarray
+    ):  # type: (...) -> np.ndarray
+        """Compute the homogeneous transform of the tip link.
+
+        Args:
+            joint_positions (numpy.ndarray): (J,) or (N, J) joint positions.
+
+        Returns:
+            numpy.ndarray: (4, 4) or (N, 4, 4) transforms wrt the base link.
+        """
+        return self._transforms(joint_positions)[1]
+
+    def _transforms(
+        self,
+        joint_positions,  # type: np.ndarray
+    ):  # type: (...) -> Tuple[np.ndarray, np.ndarray]
+        """Compute the transforms of every joint frame and of the tip.
+
+        Returns:
+            tuple: (..., J, 4, 4) joint frame transforms, after each joint's
+            motion is applied, and (..., 4, 4) tip transforms.
+        """
+        q = np.asarray(joint_positions, dtype=np.float64)
+        assert q.shape[-1] == len(self.joint_names)
+        batch_shape = q.shape[:-1]
+
+        # Motion of every joint at once: (..., J, 4, 4)
+        motion = np.zeros(batch_shape + (len(self.joint_names), 4, 4))
+        angle = np.where(self._prismatic, 0.0, q)[..., None, None]
+        motion[..., :3, :3] = (
+            np.eye(3)
+            + np.sin(angle) * self._skew
+            + (1.0 - np.cos(angle)) * self._skew_squared
+        )
+        motion[..., :3, 3] = np.where(self._prismatic, q, 0.0)[..., None] * self._axes
+        motion[..., 3, 3] = 1.0
+        local = np.matmul(self._origins, motion)
+
+        frames = np.empty_like(local)
+        transform = np.broadcast_to(np.eye(4), batch_shape + (4, 4))
+        for i in range(len(self.joint_names)):
+            transform = np.matmul(transform, local[..., i, :, :])
+            frames[..., i, :, :] = transform
+        return frames, np.matmul(transform, self._tip)
+
+
+def matrix_to_quaternion(
+    rotation,  # type: np.ndarray
+):  # type: (...) -> np.ndarray
+    """Convert rotation matrices to quaternions.
+
+    Args:
+        rotation (numpy.ndarray): (..., 3, 3) rotation matrices.
+
+    Returns:
+        numpy.ndarray: (..., 4) quaternions (x,y,z,w), with w >= 0.
+    """
+    r = np.asarray(rotation, dtype=np.float64)
+    r00, r01, r02 = r[..., 0, 0], r[..., 0, 1], r[..., 0, 2]
+    r10, r11, r12 = r[..., 1, 0], r[..., 1, 1], r[..., 1, 2]
+    r20, r21, r22 = r[..., 2, 0], r[..., 2, 1], r[..., 2, 2]
+
+    # Row i is the quaternion, in (x,y,z,w) order, scaled by 4 times its i-th
+    # component; the row with the largest scale is the best conditioned
+    candidates = np.empty(r.shape[:-2] + (4, 4))
+    candidates[..., 0, 0] = 1 + r00 - r11 - r22
+    candidates[..., 1, 1] = 1 - r00 + r11 - r22
+    candidates[..., 2, 2] = 1 - r00 - r11 + r22
+    candidates[..., 3, 3] = 1 + r00 + r11 + r22
+    candidates[..., 0, 1] = candidates[..., 1, 0] = r01 + r10
+    candidates[..., 0, 2] = candidates[..., 2, 0] = r02 + r20
+    candidates[..., 1, 2] = candidates[..., 2, 1] = r12 + r21
+    candidates[..., 0, 3] = candidates[..., 3, 0] = r21 - r12
+    candidates[..., 1, 3] = candidates[..., 3, 1] = r02 - r20
+    candidates[..., 2, 3] = candidates[..., 3, 2] = r10 - r01
+
+    best = np.argmax(np.diagonal(candidates, axis1=-2, axis2=-1), axis=-1)
+    quaternion = np.take_along_axis(candidates, best[..., None, None], axis=-2)[
+        ..., 0, :
+    ]
+    quaternion /= np.linalg.norm(quaternion, axis=-1, keepdims=True)
+    return np.where(quaternion[..., 3:] < 0, -quaternion, quaternion)
+
+
+def quaternion_error(
+    target,  # type: np.ndarray
+    current,  # type: np.ndarray
+):  # type: (...) -> np.ndarray
+    """Find the rotation from one orientation to another.
+
+    Args:
+        target (numpy.ndarray): (..., 4) target quaternions (x,y,z,w).
+        current (numpy.ndarray): (..., 4) current quaternions (x,y,z,w).
+
+    Returns:
+        numpy.ndarray: (..., 3) rotation vectors, in the base frame, that
+        rotate `current` onto `target`.
+    """
+    # target * conjugate(current)
+    tx, ty, tz, tw = np.moveaxis(np.asarray(target, dtype=np.float64), -1, 0)
+    cx, cy, cz, cw = np.moveaxis(np.asarray(current, dtype=np.float64), -1, 0)
+    x = cw * tx - tw * cx - ty * cz + tz * cy
+    y = cw * ty - tw * cy - tz * cx + tx * cz
+    z = cw * tz - tw * cz - tx * cy + ty * cx
+    w = tw * cw + tx * cx + ty * cy + tz * cz
+
+    # Take the short way around
+    sign = np.where(w < 0, -1.0, 1.0)
+    vector = np.stack([x, y, z], -1) * sign[..., None]
+    sin_half = np.linalg.norm(vector, axis=-1)
+    angle = 2.0 * np.arctan2(sin_half, np.abs(w))
+    scale = np.where(sin_half > 1e-12, angle / np.maximum(sin_half, 1e-12), 2.0)
+    return vector * scale[..., None]
+
+
+def _urdf_vector(
+    text,  # type: Optional[str]
+    default_x=0.0,  # type: float
+):  # type: (...) -> np.ndarray
+    if text is None:
+        return np.array([default_x, 0.0, 0.0])
+    return np.array([float(v) for v in text.split()])
+
+
+def _urdf_origin(
+    origin,  # type: Optional[ET.Element]
+):  # type: (...) -> np.ndarray
+    transform = np.eye(4)
+    if origin is None:
+        return transform
+    roll, pitch, yaw = _urdf_vector(origin.get("rpy"))
+    cr, sr = np.cos(roll), np.sin(roll)
+    cp, sp = np.cos(pitch), np.sin(pitch)
+    cy, sy = np.cos(yaw), np.sin(yaw)
+    transform[:3, :3] = [
+        [cy * cp, cy * sp * sr - sy * cr, cy * sp * cr + sy * sr],
+        [sy * cp, sy * sp * sr + cy * cr, sy * sp * cr - cy * sr],
+        [-sp, cp * sr, cp * cr],
+    ]
+    transform[:3, 3] = _urdf_vector(origin.get("xyz"))
+    return transform
@@ -6,53 +6,94 @@ call services and use action client.
 # TODO: look into replacing this with something like
 # https://github.com/gramaziokohler/roslibpy
 
+import collections
+import itertools
 import json
 import threading
-import time
+import traceback
 import uuid
+from concurrent.futures import Future, TimeoutError
+from typing import Optional
 
-from pydispatch import dispatcher
+import numpy as np
 from ws4py.client.threadedclient import WebSocketClient
 
+from . import cbor
 
-class ROSBridgeClient(WebSocketClient):
-    """ROSBridgeClient extends WebSocketClient and manages connection to the server and all interactions with ROS.
+# Supported values for the rosbridge `compression` subscription field
+SUBSCRIPTION_COMPRESSIONS = ("none", "cbor", "cbor-raw")
 
-    It keeps a record of all publishers, subscriber, service request callbacks and action clients.
-    """
+# Leading bytes of publish frames sent by rosbridge, up to the start of the topic name
+_JSON_PUBLISH_PREFIX = '{"op": "publish", "topic": "'
+_JSON_PUBLISH_PREFIX_BYTES = b'{"op": "publish", "topic": "'
+_CBOR_PUBLISH_PREFIX = b"\xa3\x62op\x67publish\x65topic"
 
-    def __init__(self, ip, port=9090):
-        """Constructor for ROSBridgeClient
 
-        Args:
-            ip (str): The robot IP address.
-            port (int, optional): The WebSocket port number for rosbridge. Defaults to 9090.
-        """
-        WebSocketClient.__init__(self, "ws://{}:{}".format(ip, port))
-        self._connected = False
-        self._id_counter = 0
+class ROSBridgeServiceError(Exception):
+    """Raised when a ROS service call fails, ie. rosbridge responds with `result: false`."""
+
+    def __init__(self, service_name, values):
+        Exception.__init__(
+            self, "Service call to {} failed: {}".format(service_name, values)
+        )
+        self.service_name = service_name
+        self.values = values
+
+
+class ROSBridgeProtocol(object):
+    """ROSBridgeProtocol implements the transport-independent half of a rosbridge client.
+
+    It keeps a record of all publishers, subscriber, service request callbacks and action clients, and
+    decodes and dispatches incoming frames. Topic messages are dispatched through a table that maps each
+    topic to a tuple of callbacks; the table is replaced rather than mutated, so dispatching never locks.
+
+    Subclasses provide the connection, a `send(payload)` method that queues a text frame for the server,
+    and call `_handle_frame()` for every frame received. They may also override `send_latest()` to let
+    newer frames replace unsent ones.
+    """
+
+    def __init__(self):
+        """Constructor for ROSBridgeProtocol"""
+        self._ids = itertools.count(1)
         self._publishers = {}
         self._subscribers = {}
+        self._dispatch_table = {}
+        # Held by writers of `_subscribers` and `_dispatch_table`; dispatching reads the current table
+        # without it
+        self._subscribers_lock = threading.Lock()
         self._services = {}
         self._action_clients = {}
-        self.connect()
-        th = threading.Thread(target=self.run_forever)
-        th.daemon = True
-        th.start()
-        while not self._connected:
-            time.sleep(0.1)
+        # Pieces of fragmented messages received so far, by message ID
+        self._fragments = {}
+        # The `/joint_states` subscription shared by the arms on this connection;
+        # see `blue_interface._JointStateStream`
+        self._joint_state_stream = None
 
     @property
     def id_counter(self):
         """Generate an auto-incremental ID starts from 1.
 
+        Thread-safe: each call returns a distinct ID, even from concurrent threads.
+
         Returns:
             A auto-incremented ID.
         """
-        self._id_counter += 1
-        return self._id_counter
+        return next(self._ids)
+
+    def send_latest(self, key, payload):
+        """Queue a text frame that replaces any unsent frame queued with the same key.
+
+        The default implementation sends every frame, like `send()`.
+
+        Args:
+            key (str): Frames with equal keys supersede each other, eg. a topic name.
+            payload (str): The serialized rosbridge message.
+        """
+        self.send(payload)
 
-    def publisher(self, topic_name, message_type, latch=False, queue_size=1):
+    def publisher(
+        self, topic_name, message_type, latch=False, queue_size=1, latest_only=False
+    ):
         """Create a _Publisher object if the given topic hasn't been advertised, otherwise return the existing
         publisher that is currently advertising the topic.
 
@@ -61,6 +102,9 @@ class ROSBridgeClient(WebSocketClient):
             message_type (str): The ROS message type, such as `std_msgs/String`.
             latch (bool, optional): Whether the topic is latched when publishing. Defaults to False.
             queue_size (int): The queue created at bridge side for re-publishing. Defaults to 1.
+            latest_only (bool, optional): If the connection is backed up, drop unsent messages on this
+                topic when a newer one is published. Suited to command setpoints. Only applies when the
+                topic hasn't been advertised yet. Defaults to False.
 
         Returns:
             A _Publisher object.
@@ -70,7 +114,9 @@ class ROSBridgeClient(WebSocketClient):
             publisher.usage += 1
         else:
             print("Advertising topic {} for publishing".format(topic_name))
-            publisher = _Publisher(self, topic_name, message_type, latch, queue_size)
+            publisher = _Publisher(
+                self, topic_name, message_type, latch, queue_size, latest_only
+            )
             self._publishers[topic_name] = publisher
         return publisher
 
@@ -84,39 +130,71 @@ class ROSBridgeClient(WebSocketClient):
             print("Stop advertising topic {} for publishing".format(topic_name))
             del self._publishers[topic_name]
 
-    def subscriber(self, topic_name, message_type, cb):
+    def subscriber(
+        self,
+        topic_name,
+        message_type,
+        cb,
+        compression="none",
+        throttle_rate=None,
+        queue_length=None,
+        fragment_size=None,
+    ):
         """Create a _Subscriber object on a given topic with a callback function.
 
         If the topic hasn't been subscribed yet, subscribe the topic. Otherwise, it adds the subscriber
         with callback function into the topic subscription list.
 
+        With `cbor` compression, rosbridge sends binary frames and numeric arrays in the message
+        (eg. `position` in a `sensor_msgs/JointState`) are passed to the callback as NumPy arrays.
+        With `cbor-raw`, the callback receives `{"secs", "nsecs", "bytes"}` where `bytes` is the
+        serialized ROS message.
+
         Args:
             topic_name (str): The ROS topic name.
             message_type (str): The ROS message type, such as `std_msgs/String`.
             cb (function): A function will be called when a message is received on that topic.
+            compression (str, optional): One of "none", "cbor", or "cbor-raw". Defaults to "none".
+            throttle_rate (int, optional): Minimum time in milliseconds between messages sent by
+                rosbridge. Defaults to None, which sends every message.
+            queue_length (int, optional): Number of messages buffered at the bridge side while
+                throttling. Defaults to None, which uses the rosbridge default.
+            fragment_size (int, optional): Maximum size in bytes of a message before rosbridge
+                splits it into fragments. Defaults to None, which never fragments.
+
+        The subscription options only apply when the topic isn't subscribed yet; additional
+        subscribers on the same topic share the existing subscription.
 
         Returns:
             A _Subscriber object.
         """
+        assert compression in SUBSCRIPTION_COMPRESSIONS
         subscriber = _Subscriber(self, topic_name, cb)
-        if topic_name in self._subscribers:
-            self._subscribers.get(topic_name).get("subscribers").append(subscriber)
-        else:
-            subscribe_id = "subscribe:{}:{}".format(topic_name, self._id_counter)
-            print("Sending request to subscribe topic {}".format(topic_name))
-            self.send(
-                json.dumps(
-                    {
-                        "op": "subscribe",
-                        "id": subscribe_id,
-                        "topic": topic_name,
-                        "type": message_type,
-                    }
-                )
-            )
-            self._subscribers[topic_name] = {}
-            self._subscribers[topic_name]["subscribe_id"] = subscribe_id
-            self._subscribers[topic_name]["subscribers"] = [subscriber]
+        with self._subscribers_lock:
+            if topic_name in self._subscribers:
+                self._subscribers.get(topic_name).get("subscribers").append(subscriber)
+            else:
+                subscribe_id = "subscribe:{}:{}".format(topic_name, self.id_counter)
+                print("Sending request to subscribe topic {}".format(topic_name))
+                request = {
+                    "op": "subscribe",
+                    "id": subscribe_id,
+                    "topic": topic_name,
+                    "type": message_type,
+                }
+                if compression != "none":
+                    request["compression"] = compression
+                if throttle_rate is not None:
+                    request["throttle_rate"] = int(throttle_rate)
+                if queue_length is not None:
+                    request["queue_length"] = int(queue_length)
+                if fragment_size is not None:
+                    request["fragment_size"] = int(fragment_size)
+                self.send(json.dumps(request))
+                self._subscribers[topic_name] = {}
+                self._subscribers[topic_name]["subscribe_id"] = subscribe_id
+                self._subscribers[topic_name]["subscribers"] = [subscriber]
+            self._update_dispatch_table(topic_name)
         return subscriber
 
     def unsubscribe(self, subscriber):
@@ -128,21 +206,42 @@ class ROSBridgeClient(WebSocketClient):
             subscriber (_Subscriber): A subscriber with callback function that listen to the topic.
         """
         topic_name = subscriber.topic_name
-        if topic_name not in self._subscribers:
-            return
-        subscribe_id = self._subscribers.get(topic_name).get("subscribe_id")
-        subscribers = self._subscribers.get(topic_name).get("subscribers")
-        if subscriber in subscribers:
-            subscribers.remove(subscriber)
-        if len(subscribers) == 0:
-            print("Sending request to unsubscribe topic {}".format(topic_name))
-            del subscribers[:]
-            self.send(
-                json.dumps(
-                    {"op": "unsubscribe", "id": subscribe_id, "topic": topic_name}
+        with self._subscribers_lock:
+            if topic_name not in self._subscribers:
+                return
+            subscribe_id = self._subscribers.get(topic_name).get("subscribe_id")
+            subscribers = self._subscribers.get(topic_name).get("subscribers")
+            if subscriber in subscribers:
+                subscribers.remove(subscriber)
+            self._update_dispatch_table(topic_name)
+            if len(subscribers) == 0:
+                print("Sending request to unsubscribe topic {}".format(topic_name))
+                del subscribers[:]
+                self.send(
+                    json.dumps(
+                        {"op": "unsubscribe", "id": subscribe_id, "topic": topic_name}
+                    )
                 )
-            )
-            del self._subscribers[topic_name]
+                del self._subscribers[topic_name]
+
+    def _update_dispatch_table(self, topic_name):
+        """Rebuild the callbacks dispatched to for a topic from its subscription list. The caller must hold
+        `_subscribers_lock`.
+
+        Args:
+            topic_name (str): The ROS topic name.
+        """
+        dispatch_table = dict(self._dispatch_table)
+        callbacks = tuple(
+            s.callback
+            for s in self._subscribers.get(topic_name, {}).get("subscribers", [])
+            if callable(s.callback)
+        )
+        if len(callbacks) > 0:
+            dispatch_table[topic_name] = callbacks
+        elif topic_name in dispatch_table:
+            del dispatch_table[topic_name]
+        self._dispatch_table = dispatch_table
 
     def service(self, service_name, service_type):
         """Create a ROS service client.
@@ -165,6 +264,17 @@ class ROSBridgeClient(WebSocketClient):
         """
         self._services[service_id] = cb
 
+    def unregister_service_callback(self, service_id):
+        """Remove a service callback, so it won't be called when the service server responses.
+
+        Args:
+            service_id (str): The service request ID.
+
+        Returns:
+            The removed callback function, or None if it was already called or removed.
+        """
+        return self._services.pop(service_id, None)
+
     def action_client(self, server_name, action_name):
         """Create a ROS action client if there was no client created for the action server.
         Otherwise return that action client.
@@ -195,9 +305,188 @@ class ROSBridgeClient(WebSocketClient):
         if server_name + ":" + action_name in self._action_clients:
             del self._action_clients[server_name + ":" + action_name]
 
+    def _handle_frame(self, frame, is_binary):
+        """Decode a frame received from the ROS server and dispatch it.
+
+        Only handle the message with `topic` or `service` keywords and trigger corresponding callback functions.
+        Binary frames are CBOR-encoded messages from subscriptions with compression enabled. Publish frames
+        for topics without callbacks are dropped before being decoded. Fragments are collected until the whole
+        message has arrived, which is then handled like any other frame.
+
+        Args:
+            frame (bytes): The raw frame payload.
+            is_binary (bool): Whether the frame was sent as a binary WebSocket message.
+        """
+        topic_name = _peek_topic(frame, is_binary)
+        if topic_name is not None and topic_name not in self._dispatch_table:
+            return
+
+        if is_binary:
+            data = cbor.loads(frame)
+        else:
+            if isinstance(frame, (bytes, bytearray)):
+                frame = frame.decode()
+            data = json.loads(frame)
+        if data.get("op") == "fragment":
+            self._handle_fragment(data)
+            return
+        if "topic" in data:
+            topic_name = data.get("topic")
+            message = data.get("msg")
+            for callback in self._dispatch_table.get(topic_name, ()):
+                # A failing callback mustn't stop the others, or the reader
+                try:
+                    callback(message)
+                except Exception:
+                    print("Error in callback for topic {}:".format(topic_name))
+                    traceback.print_exc()
+        if "service" in data:
+            service_id = data.get("id")
+            success = data.get("result")
+            values = data.get("values")
+            callback = self.unregister_service_callback(service_id)
+            if callback is not None:
+                try:
+                    callback(success, values)
+                except Exception:
+                    print("Error in callback for service call {}:".format(service_id))
+                    traceback.print_exc()
+
+    def _handle_fragment(self, data):
+        """Store one fragment of a message that rosbridge split up, and handle the message once all of its
+        fragments have arrived.
+
+        Args:
+            data (dict): The decoded fragment, with the message `id`, the fragment `num`, the `total` number
+                of fragments, and the fragment's `data`.
+        """
+        message_id = data.get("id")
+        total = data.get("total")
+        fragments = self._fragments.setdefault(message_id, {})
+        fragments[data.get("num")] = data.get("data")
+        if len(fragments) < total:
+            return
+        del self._fragments[message_id]
+        self._handle_frame("".join(fragments[num] for num in range(total)), False)
+
+
+def _peek_topic(frame, is_binary):
+    """Read the topic name of a rosbridge publish frame without decoding the whole frame.
+
+    Args:
+        frame (bytes): The raw frame payload.
+        is_binary (bool): Whether the frame is CBOR-encoded.
+
+    Returns:
+        The topic name, or None if the frame isn't a publish frame in the layout rosbridge sends.
+    """
+    if is_binary:
+        if not frame.startswith(_CBOR_PUBLISH_PREFIX):
+            return None
+        start = len(_CBOR_PUBLISH_PREFIX)
+        header = bytearray(frame[start : start + 2])
+        if len(header) < 2 or header[0] & 0xE0 != 0x60:
+            return None
+        if header[0] < 0x78:
+            length, start = header[0] & 0x1F, start + 1
+        elif header[0] == 0x78:
+            length, start = header[1], start + 2
+        else:
+            return None
+        return bytes(frame[start : start + length]).decode("utf-8")
+
+    if isinstance(frame, str):
+        prefix = _JSON_PUBLISH_PREFIX
+    else:
+        prefix = _JSON_PUBLISH_PREFIX_BYTES
+    if not frame.startswith(prefix):
+        return None
+    end = frame.find(prefix[-1:], len(prefix))
+    if end == -1:
+        return None
+    topic_name = frame[len(prefix) : end]
+    return topic_name if isinstance(topic_name, str) else topic_name.decode("utf-8")
+
+
+class ROSBridgeClient(WebSocketClient, ROSBridgeProtocol):
+    """ROSBridgeClient extends WebSocketClient and manages connection to the server and all interactions with ROS.
+
+    Callbacks are run on a background thread that reads from the socket. Outgoing frames are written by
+    another background thread, so `send()` never blocks on the socket.
+    """
+
+    def __init__(self, ip, port=9090, timeout=None):
+        """Constructor for ROSBridgeClient
+
+        Args:
+            ip (str): The robot IP address.
+            port (int, optional): The WebSocket port number for rosbridge. Defaults to 9090.
+            timeout (float, optional): Seconds to wait for the connection to open before raising
+                `concurrent.futures.TimeoutError`. Defaults to None, which waits forever.
+        """
+        WebSocketClient.__init__(self, "ws://{}:{}".format(ip, port))
+        ROSBridgeProtocol.__init__(self)
+        self._opened = threading.Event()
+        self._outbox = _Outbox()
+        self.connect()
+        th = threading.Thread(target=self.run_forever)
+        th.daemon = True
+        th.start()
+        self._writer = threading.Thread(target=self._write_forever)
+        self._writer.daemon = True
+        self._writer.start()
+        if not self._opened.wait(timeout):
+            self.close_connection()
+            raise TimeoutError(
+                "Timed out after {}s connecting to rosbridge at {}".format(
+                    timeout, self.url
+                )
+            )
+
+    def send(self, payload, binary=False):
+        """Queue a frame to be sent by the writer thread.
+
+        Args:
+            payload (str): The frame to send.
+            binary (bool, optional): Whether to send a binary frame. Defaults to False.
+        """
+        self._outbox.put((payload, binary))
+
+    def send_latest(self, key, payload):
+        """Queue a text frame that replaces any unsent frame queued with the same key. The frame keeps
+        the place in line of the frame it replaces.
+
+        Args:
+            key (str): Frames with equal keys supersede each other, eg. a topic name.
+            payload (str): The serialized rosbridge message.
+        """
+        self._outbox.put((payload, False), key)
+
+    def close(self, code=1000, reason=""):
+        """Send any queued frames, then close the connection.
+
+        Args:
+            code (int, optional): A status code. Defaults to 1000.
+            reason (str, optional): A human readable message. Defaults to "".
+        """
+        self._outbox.close()
+        if self._writer is not threading.current_thread():
+            self._writer.join(1.0)
+        WebSocketClient.close(self, code, reason)
+
+    def _write_forever(self):
+        while True:
+            frame = self._outbox.get()
+            if frame is None:
+                return
+            try:
+                WebSocketClient.send(self, *frame)
+            except Exception as e:
+                self.unhandled_error(e)
+
     def opened(self):
         """Called when the connection to ROS established."""
-        self._connected = True
+        self._opened.set()
         print("Connected with rosbridge")
 
     def closed(self, code, reason=None):
@@ -212,22 +501,10 @@ class ROSBridgeClient(WebSocketClient):
     def received_message(self, message):
         """Called when message received from ROS server.
 
-        Only handle the message with `topic` or `service` keywords and trigger corresponding callback functions.
-
         Args:
             message(ws4py.messaging.Message): A message that sent from ROS server.
         """
-        message.data = message.data.decode()
-        data = json.loads(message.data)
-        if "topic" in data:
-            dispatcher.send(data.get("topic"), message=data.get("msg"))
-        if "service" in data:
-            service_id = data.get("id")
-            success = data.get("result")
-            values = data.get("values")
-            if service_id in self._services:
-                self._services[service_id](success, values)
-                del self._services[service_id]
+        self._handle_frame(message.data, message.is_binary)
 
     def unhandled_error(self, error):
         """Called when a socket or OS error is raised.
@@ -238,22 +515,91 @@ class ROSBridgeClient(WebSocketClient):
         print(error)
 
 
+class _Outbox(object):
+    def __init__(self):
+        """Constructor for _Outbox, a queue of frames waiting to be written to the socket.
+
+        Frames put with a key occupy a slot: a newer frame with the same key replaces the unsent one
+        in place, so only the latest value is ever written.
+        """
+        self._condition = threading.Condition()
+        self._order = collections.deque()
+        self._slots = {}
+        self._closed = False
+
+    def put(self, frame, key=None):
+        """Queue a frame.
+
+        Args:
+            frame (tuple): The frame to write.
+            key (str, optional): The slot for the frame. Defaults to None, which always queues it.
+        """
+        with self._condition:
+            if key is None:
+                self._order.append((None, frame))
+            else:
+                if key not in self._slots:
+                    self._order.append((key, None))
+                self._slots[key] = frame
+            self._condition.notify()
+
+    def get(self):
+        """Wait for the next frame.
+
+        Returns:
+            The next frame to write, or None once the outbox is closed and empty.
+        """
+        with self._condition:
+            while len(self._order) == 0 and not self._closed:
+                self._condition.wait()
+            if len(self._order) == 0:
+                return None
+            key, frame = self._order.popleft()
+            if key is not None:
+                frame = self._slots.pop(key)
+            return frame
+
+    def close(self):
+        """Stop waiting for frames once the queued ones are written."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+
 class _Publisher(object):
-    def __init__(self, rosbridge, topic_name, message_type, latch=False, queue_size=1):
+    def __init__(
+        self,
+        rosbridge,
+        topic_name,
+        message_type,
+        latch=False,
+        queue_size=1,
+        latest_only=False,
+    ):
         """Constructor for _Publisher.
 
         Args:
-            rosbridge (ROSBridgeClient): The ROSBridgeClient object.
+            rosbridge (ROSBridgeProtocol): The rosbridge client object.
             topic_name (str): The ROS topic name.
             message_type (str): The ROS message type, such as `std_msgs/String`.
             latch (bool, optional): Whether the topic is latched when publishing. Defaults to False.
             queue_size (int): The queue created at bridge side for re-publishing. Defaults to 1.
+            latest_only (bool, optional): Let newer messages replace unsent ones. Defaults to False.
         """
         self._advertise_id = "advertise:{}:{}".format(topic_name, rosbridge.id_counter)
         self._rosbridge = rosbridge
         self._topic_name = topic_name
+        self._latest_only = latest_only
         self._usage = 1
 
+        # Serialized publish frame for `std_msgs/Float64MultiArray`, split around the data array
+        envelope = json.dumps(
+            {"op": "publish", "topic": topic_name, "msg": {"layout": {}, "data": None}}
+        )
+        self._float64_array_prefix, self._float64_array_suffix = envelope.rsplit(
+            "null", 1
+        )
+
         rosbridge.send(
             json.dumps(
                 {
@@ -281,7 +627,7 @@ class _Publisher(object):
         Args:
             message (dict): A message to send.
         """
-        self._rosbridge.send(
+        self._send_message(
             json.dumps(
                 {
                     "op": "publish",
@@ -294,6 +640,33 @@ class _Publisher(object):
             )
         )
 
+    def publish_float64_array(self, data):
+        """Publish a `std_msgs/Float64MultiArray` message with an empty layout.
+
+        This is a fast path for fixed-shape command messages: the frame envelope is serialized
+        once when the publisher is created, and only the numeric payload is formatted per call.
+        Unlike `publish()`, frames don't carry a message ID.
+
+        Args:
+            data (numpy.ndarray): A 1D array of values to send.
+        """
+        values = np.asarray(data, dtype=np.float64)
+        if not np.isfinite(values).all():
+            # JSON has no representation for these; let the json module spell them
+            self.publish({"layout": {}, "data": values.tolist()})
+            return
+        self._send_message(
+            self._float64_array_prefix
+            + str(values.tolist())
+            + self._float64_array_suffix
+        )
+
+    def _send_message(self, payload):
+        if self._latest_only:
+            self._rosbridge.send_latest(self._topic_name, payload)
+        else:
+            self._rosbridge.send(payload)
+
     def unregister(self):
         """Reduce the usage of the publisher. If the usage is 0, unadvertise this topic."""
         self._usage -= 1
@@ -315,26 +688,26 @@ class _Subscriber(object):
         """Constructor for _Subscriber.
 
         Args:
-            rosbridge (ROSBridgeClient): The ROSBridgeClient object.
+            rosbridge (ROSBridgeProtocol): The rosbridge client object.
             topic_name (str): The ROS topic name.
             cb (function): A function will be called when a message is received on that topic.
         """
         self._rosbridge = rosbridge
         self._topic_name = topic_name
         self._cb = cb
-        if callable(self._cb):
-            dispatcher.connect(self._cb, signal=topic_name)
 
     @property
     def topic_name(self):
         return self._topic_name
 
+    @property
+    def callback(self):
+        return self._cb
+
     def unregister(self):
         """Remove the current callback function from listening to the topic,
         and from the rosbridge client subscription list
         """
-        if callable(self._cb):
-            dispatcher.disconnect(self._cb, signal=self._topic_name)
         self._rosbridge.unsubscribe(self)
 
 
@@ -343,7 +716,7 @@ class _Service(object):
         """Constructor for _Service.
 
         Args:
-            rosbridge (ROSBridgeClient): The ROSBridgeClient object.
+            rosbridge (ROSBridgeProtocol): The rosbridge client object.
             service_name (str): The ROS service name.
             service_type (str): The ROS service type.
         """
@@ -359,7 +732,7 @@ class _Service(object):
             cb (function): A function will be called when the service server responses.
 
         Returns:
-
+            The service request ID.
         """
         service_id = "call_service:{}:{}".format(
             self._service_name, self._rosbridge.id_counter
@@ -376,6 +749,80 @@ class _Service(object):
                 }
             )
         )
+        return service_id
+
+    def call_async(self, request, timeout=None):
+        """Send a request to the ROS service server without waiting for the response.
+
+        Any number of calls can be in flight at once. Cancelling the returned future discards the
+        response when it arrives.
+
+        Args:
+            request (dict): A request message to send.
+            timeout (float, optional): Seconds to wait for the response before failing the future with
+                `concurrent.futures.TimeoutError`. Defaults to None, which waits forever.
+
+        Returns:
+            A `concurrent.futures.Future` that resolves to the response values, or fails with
+            `ROSBridgeServiceError` if the service call fails.
+        """
+        future = Future()  # type: Future
+        timer = None  # type: Optional[threading.Timer]
+
+        def callback(success, values):
+            if timer is not None:
+                timer.cancel()
+            if not future.set_running_or_notify_cancel():
+                return
+            if success:
+                future.set_result(values)
+            else:
+                future.set_exception(ROSBridgeServiceError(self._service_name, values))
+
+        service_id = self.request(request, callback)
+
+        def expire():
+            # Whichever of the response and the timeout unregisters the callback first wins
+            if self._rosbridge.unregister_service_callback(service_id) is None:
+                return
+            if future.set_running_or_notify_cancel():
+                future.set_exception(
+                    TimeoutError(
+                        "No response from {} after {}s".format(
+                            self._service_name, timeout
+                        )
+                    )
+                )
+
+        def done(f):
+            if f.cancelled():
+                self._rosbridge.unregister_service_callback(service_id)
+                if timer is not None:
+                    timer.cancel()
+
+        future.add_done_callback(done)
+        if timeout is not None and not future.done():
+            timer = threading.Timer(timeout, expire)
+            timer.daemon = True
+            timer.start()
+        return future
+
+    def call(self, request, timeout=None):
+        """Send a request to the ROS service server and wait for the response.
+
+        Args:
+            request (dict): A request message to send.
+            timeout (float, optional): Seconds to wait for the response. Defaults to None, which waits
+                forever.
+
+        Returns:
+            The response values.
+
+        Raises:
+            ROSBridgeServiceError: If the service call fails.
+            concurrent.futures.TimeoutError: If no response arrives within `timeout`.
+        """
+        return self.call_async(request, timeout).result()
 
 
 class _ActionClient(object):
@@ -383,7 +830,7 @@ class _ActionClient(object):
         """Constructor for _ActionClient
 
         Args:
-            rosbridge (ROSBridgeClient): The ROSBridgeClient object.
+            rosbridge (ROSBridgeProtocol): The rosbridge client object.
             server_name (str): The ROS action server name.
             action_name (str): The ROS action name.
         """
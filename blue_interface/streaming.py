@@ -0,0 +1,312 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+# time.monotonic is Python 3 only
+_clock = getattr(time, "monotonic", time.time)
+
+
+class MotionHandle(object):
+    """A motion being streamed to the arm, eg by `set_joint_positions()`, or a
+    controller started by `run_torque_controller()`.
+
+    Attributes:
+        status (str): "running", then one of "finished", "cancelled" (by
+            `cancel()`), "preempted" (by a newer motion), or "failed".
+        error (Exception): Why the motion failed, eg a pose on a cartesian
+            path with no inverse kinematics solution, or None.
+    """
+
+    def __init__(
+        self,
+        cancel,  # type: Callable[[MotionHandle], None]
+    ):  # type: (...) -> None
+        self.status = "running"
+        self.error = None  # type: Optional[Exception]
+        self._cancel = cancel
+        self._done = threading.Event()
+
+    def wait(
+        self,
+        timeout=None,  # type: Optional[float]
+    ):  # type: (...) -> bool
+        """Wait for the motion to end.
+
+        Args:
+            timeout (float, optional): Seconds to wait. Defaults to None, which
+                waits forever.
+
+        Returns:
+            bool: True if the motion has ended.
+        """
+        return self._done.wait(timeout)
+
+    def done(self):  # type: (...) -> bool
+        """Check whether the motion has ended.
+
+        Returns:
+            bool: True if the motion has ended.
+        """
+        return self._done.is_set()
+
+    def cancel(self):  # type: (...) -> None
+        """Stop streaming the motion. The arm holds the last target sent."""
+        self._cancel(self)
+
+    def _end(
+        self,
+        status,  # type: str
+        error=None,  # type: Optional[Exception]
+    ):  # type: (...) -> None
+        self.status = status
+        self.error = error
+        self._done.set()
+
+
+class _Motion(object):
+    """A motion for `_StreamScheduler`.
+
+    Args:
+        sample (function): Called with the seconds since the motion started,
+            returning the target to publish and whether the motion is done.
+        publish (function): Publishes a target.
+    """
+
+    def __init__(
+        self,
+        sample,  # type: Callable[[float], Tuple[Any, bool]]
+        publish,  # type: Callable[[Any], None]
+        handle,  # type: MotionHandle
+    ):  # type: (...) -> None
+        self.sample = sample
+        self.publish = publish
+        self.handle = handle
+        self.start_time = 0.0
+        self.tick = 0
+        self.last_target = None  # type: Any
+
+
+class _StreamScheduler(object):
+    """Streams one motion at a time to the robot from a background thread.
+
+    Ticks are scheduled on absolute deadlines from the start of each motion,
+    so timing errors don't accumulate. A tick that starts more than a period
+    late counts as an overrun, and the missed ticks are skipped rather than
+    sent in a burst. Motions are sampled at the actual tick time, so a late
+    tick still publishes the right target. If sampling or publishing raises, the
+    motion fails and the arm holds the last target sent.
+
+    Args:
+        rate (float): Ticks per second.
+    """
+
+    def __init__(
+        self,
+        rate,  # type: float
+    ):  # type: (...) -> None
+        assert rate > 0
+        self.period = 1.0 / rate
+        self._condition = threading.Condition()
+        self._motion = None  # type: Optional[_Motion]
+        self._closed = False
+        self._thread = None  # type: Optional[threading.Thread]
+        self._ticks = 0
+        self._overruns = 0
+        self._total_lateness = 0.0
+        self._max_lateness = 0.0
+
+    def start(
+        self,
+        sample,  # type: Callable[[float], Tuple[Any, bool]]
+        publish,  # type: Callable[[Any], None]
+    ):  # type: (...) -> MotionHandle
+        """Start a motion, preempting the current one."""
+        handle = MotionHandle(self.cancel)
+        motion = _Motion(sample, publish, handle)
+        with self._condition:
+            assert not self._closed, "Streaming has been stopped"
+            previous = self._motion
+            if previous is not None:
+                previous.handle._end("preempted")
+            motion.start_time = _clock()
+            self._motion = motion
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+            self._condition.notify_all()
+        return handle
+
+    def current_target(self):  # type: (...) -> Any
+        """Get the last target sent by the current motion, or None if there's
+        no motion running."""
+        motion = self._motion
+        return None if motion is None else motion.last_target
+
+    def cancel(
+        self,
+        handle=None,  # type: Optional[MotionHandle]
+    ):  # type: (...) -> None
+        """Cancel a motion if it's still running. Defaults to the current
+        motion."""
+        with self._condition:
+            motion = self._motion
+            if motion is not None and (handle is None or motion.handle is handle):
+                self._motion = None
+                motion.handle._end("cancelled")
+                self._condition.notify_all()
+
+    def stop(self):  # type: (...) -> None
+        """Cancel the current motion and stop the thread."""
+        with self._condition:
+            self._closed = True
+            if self._motion is not None:
+                self._motion.handle._end("cancelled")
+                self._motion = None
+            self._condition.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def stats(self):  # type: (...) -> Dict[str, float]
+        """Get timing statistics; see `BlueInterface.get_stream_stats()`."""
+        with self._condition:
+            return {
+                "ticks": self._ticks,
+                "overruns": self._overruns,
+                "mean_lateness": self._total_lateness / max(self._ticks, 1),
+                "max_lateness": self._max_lateness,
+            }
+
+    def _run(self):  # type: (...) -> None
+        while True:
+            with self._condition:
+                # Sleep until the current motion's next deadline; starting,
+                # cancelling, or preempting a motion wakes us up early
+                while True:
+                    if self._closed:
+                        return
+                    motion = self._motion
+                    if motion is None:
+                        self._condition.wait()
+                        continue
+                    deadline = motion.start_time + motion.tick * self.period
+                    remaining = deadline - _clock()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+
+            now = _clock()
+            lateness = now - deadline
+            elapsed = now - motion.start_time
+            try:
+                target, finished = motion.sample(elapsed)
+                with self._condition:
+                    # Publishing under the lock means a motion preempted or
+                    # cancelled while it was sampled never sends its target
+                    if self._motion is not motion:
+                        continue
+                    motion.publish(target)
+            except Exception as e:
+                with self._condition:
+                    if self._motion is motion:
+                        self._motion = None
+                        motion.handle._end("failed", e)
+                continue
+            motion.last_target = target
+
+            with self._condition:
+                self._ticks += 1
+                self._total_lateness += lateness
+                self._max_lateness = max(self._max_lateness, lateness)
+                if lateness > self.period:
+                    self._overruns += 1
+                motion.tick = int(elapsed / self.period) + 1
+                if finished and self._motion is motion:
+                    self._motion = None
+                    motion.handle._end("finished")
+
+
+def _linear_joint_motion(
+    start,  # type: np.ndarray
+    end,  # type: np.ndarray
+    duration,  # type: float
+):  # type: (...) -> Callable[[float], Tuple[np.ndarray, bool]]
+    """Build a sample function interpolating linearly between two joint
+    configurations."""
+    start = np.asarray(start, dtype=np.float64)
+    end = np.asarray(end, dtype=np.float64)
+
+    def sample(elapsed):
+        if elapsed >= duration:
+            return end, True
+        return start + (elapsed / duration) * (end - start), False
+
+    return sample
+
+
+class _TorqueController(object):
+    """Calls a control function on each robot state and publishes the
+    torques it returns, keeping timing statistics.
+
+    Args:
+        fn (function): Called with a `BlueState`, returning 7 joint torques.
+        publish (function): Publishes joint torques.
+        handle (MotionHandle): Handle for the controller.
+    """
+
+    def __init__(
+        self,
+        fn,  # type: Callable[[Any], Any]
+        publish,  # type: Callable[[Any], None]
+        handle,  # type: MotionHandle
+    ):  # type: (...) -> None
+        self.handle = handle
+        self._fn = fn
+        self._publish = publish
+        self._cycles = 0
+        self._total_latency = 0.0
+        self._max_latency = 0.0
+        self._total_compute = 0.0
+        self._max_compute = 0.0
+        self._last_latency = 0.0
+
+    def __call__(
+        self,
+        state,  # type: Any
+    ):  # type: (...) -> None
+        """Run one cycle. If the function raises, publish zero torques and
+        end the controller."""
+        start = time.time()
+        try:
+            torques = self._fn(state)
+            assert len(torques) == 7, "Expected 7 joint torques"
+        except Exception as e:
+            self._publish(np.zeros(7))
+            self.handle._end("failed", e)
+            return
+        self._publish(torques)
+        end = time.time()
+
+        compute = end - start
+        latency = end - state.receive_time
+        self._cycles += 1
+        self._total_compute += compute
+        self._max_compute = max(self._max_compute, compute)
+        self._total_latency += latency
+        self._max_latency = max(self._max_latency, latency)
+        self._last_latency = latency
+
+    def stats(self):  # type: (...) -> Dict[str, float]
+        """Get timing statistics; see
+        `BlueInterface.get_torque_controller_stats()`."""
+        cycles = max(self._cycles, 1)
+        return {
+            "cycles": self._cycles,
+            "mean_compute": self._total_compute / cycles,
+            "max_compute": self._max_compute,
+            "mean_latency": self._total_latency / cycles,
+            "max_latency": self._max_latency,
+            "last_latency": self._last_latency,
+        }
@@ -0,0 +1,471 @@
+import threading
+from typing import Any, Callable, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .streaming import _clock
+
+PROFILES = ("cubic", "quintic", "min_jerk")
+
+
+def _knot_derivatives(
+    positions,  # type: np.ndarray
+    times,  # type: np.ndarray
+    profile,  # type: str
+):  # type: (...) -> Tuple[np.ndarray, np.ndarray]
+    """Pick the velocity and acceleration at each knot for a profile. The
+    trajectory starts and ends at rest.
+
+    Args:
+        positions (np.ndarray): (N, D) knot positions.
+        times (np.ndarray): (N,) strictly increasing knot times.
+        profile (str): One of `PROFILES`.
+
+    Returns:
+        (np.ndarray, np.ndarray): (N, D) velocities and accelerations.
+    """
+    count = len(positions)
+    h = np.diff(times)[:, None]
+    slopes = np.diff(positions, axis=0) / h
+    velocities = np.zeros_like(positions)
+    accelerations = np.zeros_like(positions)
+
+    if profile == "min_jerk":
+        # Rest-to-rest minimum jerk between each pair of waypoints
+        pass
+    elif profile == "quintic":
+        # Pass through interior waypoints at the average of the neighbouring
+        # slopes, or stop where the path turns around
+        average = 0.5 * (slopes[:-1] + slopes[1:])
+        turning = slopes[:-1] * slopes[1:] <= 0
+        velocities[1:-1] = np.where(turning, 0.0, average)
+    else:
+        # Clamped C2 cubic spline: solve the tridiagonal system for the
+        # interior knot velocities
+        if count > 2:
+            system = np.zeros((count - 2, count - 2))
+            index = np.arange(count - 2)
+            system[index, index] = 2 * (h[:-1, 0] + h[1:, 0])
+            system[index[1:], index[:-1]] = h[2:, 0]
+            system[index[:-1], index[1:]] = h[:-2, 0]
+            rhs = 3 * (h[1:] * slopes[:-1] + h[:-1] * slopes[1:])
+            velocities[1:-1] = np.linalg.solve(system, rhs)
+        accelerations[:-1] = (6 * slopes - 4 * velocities[:-1] - 2 * velocities[1:]) / h
+        accelerations[-1] = (
+            -6 * slopes[-1] + 2 * velocities[-2] + 4 * velocities[-1]
+        ) / h[-1]
+    return velocities, accelerations
+
+
+def _quintic_coefficients(
+    positions,  # type: np.ndarray
+    velocities,  # type: np.ndarray
+    accelerations,  # type: np.ndarray
+    h,  # type: np.ndarray
+):  # type: (...) -> np.ndarray
+    """Build the quintic matching position, velocity and acceleration at both
+    ends of each segment. Cubic spline segments are reproduced exactly.
+
+    Returns:
+        np.ndarray: (N - 1, 6, D) coefficients of each segment, in powers of
+        the normalized segment time s in [0, 1].
+    """
+    h = h[:, None]
+    p0 = positions[:-1]
+    dp = positions[1:] - p0
+    v0 = velocities[:-1] * h
+    v1 = velocities[1:] * h
+    a0 = accelerations[:-1] * h * h
+    a1 = accelerations[1:] * h * h
+    return np.stack(
+        [
+            p0,
+            v0,
+            0.5 * a0,
+            10 * dp - 6 * v0 - 4 * v1 - 1.5 * a0 + 0.5 * a1,
+            -15 * dp + 8 * v0 + 7 * v1 + 1.5 * a0 - a1,
+            6 * dp - 3 * v0 - 3 * v1 - 0.5 * a0 + 0.5 * a1,
+        ],
+        axis=1,
+    )
+
+
+def _evaluate(
+    coefficients,  # type: np.ndarray
+    times,  # type: np.ndarray
+    sample_times,  # type: np.ndarray
+):  # type: (...) -> Tuple[np.ndarray, np.ndarray, np.ndarray]
+    """Evaluate piecewise quintics at many times at once.
+
+    Returns:
+        (np.ndarray, np.ndarray, np.ndarray): (M, D) positions, velocities
+        and accelerations.
+    """
+    segment = np.clip(
+        np.searchsorted(times, sample_times, side="right") - 1,
+        0,
+        len(coefficients) - 1,
+    )
+    h = (times[1:] - times[:-1])[segment][:, None]
+    s = ((sample_times - times[segment])[:, None]) / h
+    c = coefficients[segment]
+
+    position = c[:, 5]
+    velocity = 5 * c[:, 5]
+    acceleration = 20 * c[:, 5]
+    for power in range(4, -1, -1):
+        position = position * s + c[:, power]
+        if power >= 1:
+            velocity = velocity * s + power * c[:, power]
+        if power >= 2:
+            acceleration = acceleration * s + power * (power - 1) * c[:, power]
+    return position, velocity / h, acceleration / (h * h)
+
+
+def _plan_trajectory(
+    start,  # type: np.ndarray
+    waypoints,  # type: np.ndarray
+    times,  # type: np.ndarray
+    profile,  # type: str
+    period,  # type: float
+    max_velocity=None,  # type: Optional[Union[float, Sequence[float]]]
+    max_acceleration=None,  # type: Optional[Union[float, Sequence[float]]]
+):  # type: (...) -> np.ndarray
+    """Sample a trajectory through waypoints into a table, one row per
+    streaming period.
+
+    If the trajectory would exceed the velocity or acceleration limits, all
+    of its times are stretched by the same factor until it doesn't.
+
+    Args:
+        start (np.ndarray): (D,) position at time 0.
+        waypoints (np.ndarray): (N, D) positions to pass through.
+        times (np.ndarray): (N,) strictly increasing arrival times, in
+            seconds, for each waypoint.
+        profile (str): One of `PROFILES`.
+        period (float): Seconds between table rows.
+        max_velocity (float or iterable, optional): Velocity limit, for all
+            or for each dimension. Defaults to None.
+        max_acceleration (float or iterable, optional): Acceleration limit,
+            for all or for each dimension. Defaults to None.
+
+    Returns:
+        np.ndarray: (M, D) read-only table, ending exactly on the last
+        waypoint.
+    """
+    assert profile in PROFILES, "Unknown profile {}, expected one of {}".format(
+        profile, PROFILES
+    )
+    positions = np.vstack([start, waypoints]).astype(np.float64)
+    knots = np.concatenate([[0.0], np.asarray(times, dtype=np.float64)])
+    assert len(knots) == len(positions), "Need one time per waypoint"
+    assert np.all(np.diff(knots) > 0), "Times must be positive and increasing"
+
+    def sample(knot_times):
+        velocities, accelerations = _knot_derivatives(positions, knot_times, profile)
+        coefficients = _quintic_coefficients(
+            positions, velocities, accelerations, np.diff(knot_times)
+        )
+        count = int(np.ceil(knot_times[-1] / period - 1e-9)) + 1
+        sample_times = np.minimum(np.arange(count) * period, knot_times[-1])
+        return _evaluate(coefficients, knot_times, sample_times)
+
+    table, velocity, acceleration = sample(knots)
+
+    # Stretching time by k divides velocity by k and acceleration by k^2
+    scale = 1.0
+    if max_velocity is not None:
+        peak = np.max(np.abs(velocity), axis=0)
+        scale = max(scale, np.max(peak / np.asarray(max_velocity)))
+    if max_acceleration is not None:
+        peak = np.max(np.abs(acceleration), axis=0)
+        scale = max(scale, np.sqrt(np.max(peak / np.asarray(max_acceleration))))
+    if scale > 1.0:
+        table = sample(knots * scale)[0]
+
+    table[-1] = positions[-1]
+    table.flags.writeable = False
+    return table
+
+
+def _table_motion(
+    table,  # type: np.ndarray
+    period,  # type: float
+):  # type: (...) -> Callable[[float], Tuple[np.ndarray, bool]]
+    """Build a sample function that looks up precomputed targets by time."""
+    last = len(table) - 1
+
+    def sample(elapsed):
+        index = int(elapsed / period)
+        if index >= last:
+            return table[last], True
+        return table[index], False
+
+    return sample
+
+
+def _min_jerk(
+    tau,  # type: np.ndarray
+):  # type: (...) -> np.ndarray
+    """Rest-to-rest minimum jerk progress, from 0 to 1 as `tau` goes from 0 to
+    1."""
+    tau = np.clip(tau, 0.0, 1.0)
+    return tau * tau * tau * (10 + tau * (-15 + 6 * tau))
+
+
+def _densify_path(
+    positions,  # type: np.ndarray
+    orientations,  # type: np.ndarray
+    max_step,  # type: float
+    max_angle_step,  # type: float
+):  # type: (...) -> Tuple[np.ndarray, np.ndarray, np.ndarray]
+    """Subdivide a cartesian path so that consecutive poses are at most
+    `max_step` meters and `max_angle_step` radians apart, interpolating
+    positions linearly and orientations by slerp.
+
+    Args:
+        positions (np.ndarray): (N, 3) positions.
+        orientations (np.ndarray): (N, 4) quaternions (x,y,z,w).
+        max_step (float): Maximum distance between poses, in meters.
+        max_angle_step (float): Maximum rotation between poses, in radians.
+
+    Returns:
+        (np.ndarray, np.ndarray, np.ndarray): (M, 3) positions, (M, 4)
+        quaternions, and (M,) progress along the path from 0 to 1, measured
+        in the larger of translation and rotation steps.
+    """
+    orientations = orientations / np.linalg.norm(orientations, axis=1)[:, None]
+    # q and -q are the same rotation; pick signs so each orientation is on the
+    # same side as the one before, for the short way around
+    dots = np.sum(orientations[:-1] * orientations[1:], axis=1)
+    signs = np.cumprod(np.concatenate([[1.0], np.where(dots < 0, -1.0, 1.0)]))
+    orientations = orientations * signs[:, None]
+
+    distances = np.linalg.norm(np.diff(positions, axis=0), axis=1)
+    dots = np.clip(np.abs(dots), 0.0, 1.0)
+    angles = 2 * np.arccos(dots)
+    lengths = np.maximum(distances / max_step, angles / max_angle_step)
+    steps = np.maximum(np.ceil(lengths - 1e-9), 1).astype(int)
+
+    segment = np.append(np.repeat(np.arange(len(steps)), steps), len(steps) - 1)
+    starts = np.cumsum(steps) - steps
+    fraction = np.append(
+        (np.arange(np.sum(steps)) - np.repeat(starts, steps))
+        / np.repeat(steps, steps).astype(np.float64),
+        1.0,
+    )[:, None]
+
+    dense_positions = positions[segment] + fraction * (
+        positions[segment + 1] - positions[segment]
+    )
+
+    q0 = orientations[segment]
+    q1 = orientations[segment + 1]
+    theta = 0.5 * angles[segment][:, None]
+    sin_theta = np.sin(theta)
+    small = sin_theta < 1e-6
+    safe = np.where(small, 1.0, sin_theta)
+    w0 = np.where(small, 1 - fraction, np.sin((1 - fraction) * theta) / safe)
+    w1 = np.where(small, fraction, np.sin(fraction * theta) / safe)
+    dense_orientations = w0 * q0 + w1 * q1
+    dense_orientations /= np.linalg.norm(dense_orientations, axis=1)[:, None]
+
+    cumulative = np.concatenate([[0.0], np.cumsum(lengths)])
+    total = cumulative[-1]
+    if total > 0:
+        progress = (cumulative[segment] + fraction[:, 0] * lengths[segment]) / total
+    else:
+        progress = np.linspace(0.0, 1.0, len(segment))
+    return dense_positions, dense_orientations, progress
+
+
+class _PathMotion(object):
+    """Streams joint solutions for a densified cartesian path while they're
+    still being solved.
+
+    Solutions become usable once every pose up to them has been solved. If
+    the motion catches up with the solver it holds its last target and its
+    clock stops, so it picks up where it left off rather than jumping. It
+    fails on reaching a pose with no solution, or where consecutive solutions
+    jump by more than `max_joint_step`.
+
+    Args:
+        progress (np.ndarray): Fractional index into the path for each tick.
+        period (float): Seconds per tick.
+        solutions (np.ndarray): (M, 7) joint solutions, filled in as they're
+            solved; the first must already be solved.
+        success (np.ndarray): (M,) True where a solution has been found.
+        max_joint_step (float): Largest allowed change in any joint between
+            consecutive poses, in radians.
+    """
+
+    def __init__(
+        self,
+        progress,  # type: np.ndarray
+        period,  # type: float
+        solutions,  # type: np.ndarray
+        success,  # type: np.ndarray
+        max_joint_step,  # type: float
+    ):  # type: (...) -> None
+        assert success[0]
+        self.handle = None  # type: Any
+        self.error = None  # type: Optional[Exception]
+        self.ready = 1
+        self._progress = progress
+        self._period = period
+        self._solutions = solutions
+        self._success = success
+        self._max_joint_step = max_joint_step
+        self._done = success.copy()
+        self._condition = threading.Condition()
+        self._time = 0.0
+        self._last_elapsed = 0.0
+        self._target = solutions[0]
+
+    def solved(
+        self,
+        index,  # type: int
+    ):  # type: (...) -> bool
+        """Record that a pose has been attempted. Returns False once there's
+        no point in solving further poses."""
+        with self._condition:
+            self._done[index] = True
+            ready = self.ready
+            while ready < len(self._done) and self._done[ready]:
+                if not self._success[ready]:
+                    self.error = RuntimeError(
+                        "No inverse kinematics solution for path pose {}".format(ready)
+                    )
+                    break
+                step = np.max(
+                    np.abs(self._solutions[ready] - self._solutions[ready - 1])
+                )
+                if step > self._max_joint_step:
+                    self.error = RuntimeError(
+                        "Inverse kinematics solutions jump by {:.3f} rad at path "
+                        "pose {}".format(step, ready)
+                    )
+                    break
+                ready += 1
+            self.ready = ready
+            self._condition.notify_all()
+        return self.error is None and not (
+            self.handle is not None and self.handle.done()
+        )
+
+    def fail(
+        self,
+        error,  # type: Exception
+    ):  # type: (...) -> None
+        with self._condition:
+            if self.error is None:
+                self.error = error
+            self._condition.notify_all()
+
+    def wait_ready(
+        self,
+        time,  # type: float
+    ):  # type: (...) -> None
+        """Wait until the poses needed for the first `time` seconds are solved,
+        or solving has failed."""
+        tick = min(int(time / self._period), len(self._progress) - 1)
+        needed = int(np.ceil(self._progress[tick]))
+        with self._condition:
+            while self.ready <= needed and self.error is None:
+                self._condition.wait()
+
+    def __call__(
+        self,
+        elapsed,  # type: float
+    ):  # type: (...) -> Tuple[np.ndarray, bool]
+        time = self._time + elapsed - self._last_elapsed
+        self._last_elapsed = elapsed
+        last = len(self._progress) - 1
+        tick = min(int(time / self._period), last)
+        position = self._progress[tick]
+        index = int(position)
+        upper = min(index + 1, len(self._solutions) - 1)
+        if upper >= self.ready:
+            if self.error is not None:
+                raise self.error
+            return self._target, False
+
+        self._time = time
+        solutions = self._solutions
+        self._target = solutions[index] + (position - index) * (
+            solutions[upper] - solutions[index]
+        )
+        return self._target, tick == last
+
+
+class _VelocityMotion(object):
+    """Integrates a cartesian velocity of the tip into joint targets, using
+    the damped pseudo-inverse of the Jacobian at the latest measured joint
+    positions. Never finishes on its own.
+
+    Args:
+        chain (KinematicChain): The arm's kinematics.
+        joint_positions (function): Returns the latest measured joint
+            positions.
+        start (np.ndarray): Joint targets to integrate from.
+        timeout (float): Seconds after the last `set_twist()` to stop moving
+            and hold the current target.
+        damping (float): Damping factor for the pseudo-inverse.
+        max_joint_velocity (float): Joint velocities are scaled down together
+            so that none exceeds this, in radians per second.
+    """
+
+    def __init__(
+        self,
+        chain,  # type: Any
+        joint_positions,  # type: Callable[[], np.ndarray]
+        start,  # type: np.ndarray
+        timeout,  # type: float
+        damping,  # type: float
+        max_joint_velocity,  # type: float
+    ):  # type: (...) -> None
+        self.handle = None  # type: Any
+        self._chain = chain
+        self._joint_positions = joint_positions
+        self._target = np.clip(
+            np.asarray(start, dtype=np.float64), chain.lower, chain.upper
+        )
+        self._timeout = timeout
+        self._damping_matrix = damping**2 * np.eye(6)
+        self._max_joint_velocity = max_joint_velocity
+        self._twist = np.zeros(6)
+        self._expiry = 0.0
+        self._last_elapsed = 0.0
+
+    def set_twist(
+        self,
+        twist,  # type: np.ndarray
+    ):  # type: (...) -> None
+        # Swapped in whole, so the streaming thread never sees half an update
+        self._twist = twist
+        self._expiry = _clock() + self._timeout
+
+    def __call__(
+        self,
+        elapsed,  # type: float
+    ):  # type: (...) -> Tuple[np.ndarray, bool]
+        dt = elapsed - self._last_elapsed
+        self._last_elapsed = elapsed
+        if dt <= 0 or _clock() > self._expiry:
+            return self._target, False
+
+        # dq = J^T (J J^T + damping^2 I)^-1 twist
+        jacobian = self._chain.jacobian(self._joint_positions())
+        velocity = np.dot(
+            jacobian.T,
+            np.linalg.solve(
+                np.dot(jacobian, jacobian.T) + self._damping_matrix, self._twist
+            ),
+        )
+        peak = np.max(np.abs(velocity))
+        if peak > self._max_joint_velocity:
+            velocity *= self._max_joint_velocity / peak
+        self._target = np.clip(
+            self._target + dt * velocity, self._chain.lower, self._chain.upper
+        )
+        return self._target, False
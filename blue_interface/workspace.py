@@ -0,0 +1,194 @@
+from typing import Optional
+
+import numpy as np
+
+from .kinematics import KinematicChain
+
+
+class WorkspaceMap(object):
+    """A precomputed table of end effector poses and the joint positions that
+    reach them, for seeding inverse kinematics near the target pose.
+
+    Build one offline with `sample()`, which writes the table to a `.npy`
+    file, then `load()` it (memory-mapped, so it's shared between processes
+    and only paged in as needed) and pass it to `BlueInterface`:
+
+    .. code-block:: python
+
+       blue = BlueInterface(side="right", ip="127.0.0.1")
+       WorkspaceMap.sample(blue.get_kinematics(), 1000000, "right_arm.npy")
+
+       workspace_map = WorkspaceMap.load("right_arm.npy")
+       blue = BlueInterface(
+           side="right", ip="127.0.0.1", workspace_map=workspace_map
+       )
+
+    Args:
+        table (numpy.ndarray): (N, 14) rows of joint positions (7), position
+            (3), and orientation quaternion (4, x,y,z,w).
+        cell_size (float, optional): Edge length, in meters, of the grid cells
+            used to index positions. Defaults to 0.05.
+        orientation_weight (float, optional): How many meters of position
+            error one unit of orientation error (1 - |q1 . q2|) is worth when
+            ranking neighbours. Defaults to 0.5.
+    """
+
+    def __init__(
+        self,
+        table,  # type: np.ndarray
+        cell_size=0.05,  # type: float
+        orientation_weight=0.5,  # type: float
+    ):  # type: (...) -> None
+        assert table.ndim == 2 and table.shape[1] == 14 and len(table) > 0
+        self.table = table
+        self.cell_size = cell_size
+        self.orientation_weight = orientation_weight
+
+        # Grid index: rows sorted by cell, and each occupied cell's range
+        cells = np.floor(table[:, 7:10] / cell_size).astype(np.int64)
+        self._cell_min = cells.min(axis=0)
+        self._cell_dims = cells.max(axis=0) - self._cell_min + 1
+        cell_keys = self._cell_key(cells)
+        self._order = np.argsort(cell_keys, kind="stable")
+        self._keys, self._starts, self._counts = np.unique(
+            cell_keys[self._order], return_index=True, return_counts=True
+        )
+
+    @classmethod
+    def sample(
+        cls,
+        chain,  # type: KinematicChain
+        count,  # type: int
+        path,  # type: str
+        batch_size=100000,  # type: int
+        seed=None,  # type: Optional[int]
+    ):  # type: (...) -> WorkspaceMap
+        """Sample random joint positions within the joint limits and write
+        their poses to a file. Unlimited joints are sampled in [-pi, pi].
+
+        Args:
+            chain (KinematicChain): The arm's kinematics, from
+                `BlueInterface.get_kinematics()`.
+            count (int): Number of samples.
+            path (str): Where to write the table, as a `.npy` file of float32.
+            batch_size (int, optional): Samples computed at a time, bounding
+                memory use. Defaults to 100000.
+            seed (int, optional): Random seed, for reproducible maps.
+
+        Returns:
+            WorkspaceMap: The map, memory-mapped from `path`.
+        """
+        assert len(chain.joint_names) == 7
+        lower = np.where(np.isfinite(chain.lower), chain.lower, -np.pi)
+        upper = np.where(np.isfinite(chain.upper), chain.upper, np.pi)
+        rng = np.random.RandomState(seed)
+
+        table = np.lib.format.open_memmap(
+            path, mode="w+", dtype=np.float32, shape=(count, 14)
+        )
+        for start in range(0, count, batch_size):
+            end = min(start + batch_size, count)
+            joint_positions = rng.uniform(lower, upper, size=(end - start, 7))
+            position, orientation = chain.forward_kinematics(joint_positions)
+            table[start:end, :7] = joint_positions
+            table[start:end, 7:10] = position
+            table[start:end, 10:] = orientation
+        table.flush()
+        del table
+        return cls.load(path)
+
+    @classmethod
+    def load(
+        cls,
+        path,  # type: str
+        cell_size=0.05,  # type: float
+        orientation_weight=0.5,  # type: float
+    ):  # type: (...) -> WorkspaceMap
+        """Memory-map a table written by `sample()`.
+
+        Args:
+            path (str): The `.npy` file.
+            cell_size (float, optional): See `WorkspaceMap`.
+            orientation_weight (float, optional): See `WorkspaceMap`.
+
+        Returns:
+            WorkspaceMap: The map.
+        """
+        return cls(np.load(path, mmap_mode="r"), cell_size, orientation_weight)
+
+    def nearest(
+        self,
+        position,  # type: np.ndarray
+        orientation,  # type: np.ndarray
+    ):  # type: (...) -> np.ndarray
+        """Find stored joint positions with a pose close to a target.
+
+        Cells are searched in growing cubes around the target, stopping at the
+        first cube with any samples in it, so the result is near but not
+        necessarily the nearest.
+
+        Args:
+            position (iterable): Target position (x,y,z).
+            orientation (iterable): Target quaternion (x,y,z,w).
+
+        Returns:
+            numpy.ndarray: 7 joint angles.
+        """
+        position = np.asarray(position, dtype=np.float64)
+        orientation = np.asarray(orientation, dtype=np.float64)
+        # Targets outside the grid start from the closest cell inside it
+        center = np.clip(
+            np.floor(position / self.cell_size).astype(np.int64),
+            self._cell_min,
+            self._cell_min + self._cell_dims - 1,
+        )
+
+        radius = 0
+        rows = np.zeros(0, dtype=np.int64)
+        max_radius = int(self._cell_dims.max())
+        while len(rows) == 0 and radius <= max_radius:
+            rows = self._rows_near(center, radius)
+            radius += 1
+        if len(rows) == 0:
+            rows = self._order
+
+        candidates = np.asarray(self.table[np.sort(rows)], dtype=np.float64)
+        cost = np.linalg.norm(candidates[:, 7:10] - position, axis=1)
+        cost += self.orientation_weight * (
+            1.0 - np.abs(np.dot(candidates[:, 10:], orientation))
+        )
+        return candidates[np.argmin(cost), :7]
+
+    def _rows_near(
+        self,
+        center,  # type: np.ndarray
+        radius,  # type: int
+    ):  # type: (...) -> np.ndarray
+        """Get the table rows in a cube of cells around `center`."""
+        offsets = np.arange(-radius, radius + 1)
+        cells = center + np.stack(
+            np.meshgrid(offsets, offsets, offsets, indexing="ij"), -1
+        ).reshape(-1, 3)
+        local = cells - self._cell_min
+        inside = np.all((local >= 0) & (local < self._cell_dims), axis=1)
+        keys = self._cell_key(cells[inside])
+
+        slots = np.searchsorted(self._keys, keys)
+        slots = slots[slots < len(self._keys)]
+        slots = slots[np.isin(self._keys[slots], keys)]
+        if len(slots) == 0:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate(
+            [
+                self._order[start : start + count]
+                for start, count in zip(self._starts[slots], self._counts[slots])
+            ]
+        )
+
+    def _cell_key(
+        self,
+        cells,  # type: np.ndarray
+    ):  # type: (...) -> np.ndarray
+        local = cells - self._cell_min
+        dims = self._cell_dims
+        return (local[:, 0] * dims[1] + local[:, 1]) * dims[2] + local[:, 2]
@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+
+# An example of precomputing a workspace map, which seeds inverse kinematics
+# with a stored configuration near each target pose.
+
+import numpy as np
+
+from blue_interface import BlueInterface, WorkspaceMap
+
+side = "right"
+ip = "127.0.0.1"
+path = "{}_arm_workspace.npy".format(side)
+blue = BlueInterface(side, ip)
+
+# One million samples take about 56MB on disk
+WorkspaceMap.sample(blue.get_kinematics(), 1000000, path)
+blue.shutdown()
+
+# Later, load the map and pass it in; inverse_kinematics() calls without a
+# seed will then use it
+blue = BlueInterface(side, ip, workspace_map=WorkspaceMap.load(path))
+position = np.array([0.4, 0.0, 0.0])
+orientation = np.array([0.0, 0.0, 0.0, 1.0])
+print(blue.inverse_kinematics(position, orientation))
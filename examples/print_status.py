@@ -10,7 +10,12 @@ from blue_interface import BlueInterface
 
 side = "right"
 ip = "127.0.0.1"
-blue = BlueInterface(side, ip)
+# We only print twice a second, so there's no need to receive every state update
+blue = BlueInterface(side, ip, state_rate=2)
+print(
+    "Connected in {total:.3f}s (connect {connect:.3f}s, controllers "
+    "{controllers:.3f}s, first state {state:.3f}s)".format(**blue.get_startup_times())
+)
 
 
 def print_aligned(left, right):
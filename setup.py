@@ -14,7 +14,14 @@ setup(
     author_email="brentyi@berkeley.edu",
     license="BSD",
     packages=["blue_interface"],
-    install_requires=["ws4py", "PyDispatcher", "numpy", "enum34", "typing"],
+    install_requires=[
+        "ws4py",
+        "numpy",
+        "enum34",
+        "typing",
+        'futures; python_version < "3"',
+    ],
+    extras_require={"asyncio": ["websockets"]},
     zip_safe=False,
     classifiers=[
         "Programming Language :: Python :: 2.7",
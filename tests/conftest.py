@@ -0,0 +1,199 @@
+import json
+import sys
+
+import numpy as np
+import pytest
+
+from blue_interface.rosbridge_client import ROSBridgeProtocol
+
+# The asyncio client tests use async/await and asyncio.run()
+collect_ignore = ["test_async.py"] if sys.version_info < (3, 7) else []
+
+_JOINT_NAMES = [
+    "right_" + name
+    for name in (
+        "base_roll_joint",
+        "shoulder_lift_joint",
+        "shoulder_roll_joint",
+        "elbow_lift_joint",
+        "elbow_roll_joint",
+        "wrist_lift_joint",
+        "wrist_roll_joint",
+    )
+]
+
+
+def _urdf():
+    links = ["base_link"] + ["link_{}".format(i) for i in range(7)]
+    links.append("right_gripper_finger_link")
+    joints = []
+    for i, parent in enumerate(links[:-1]):
+        name = _JOINT_NAMES[i] if i < 7 else "finger"
+        joints.append(
+            '<joint name="{}" type="{}">'
+            '<parent link="{}"/><child link="{}"/>'
+            '<origin xyz="0 0 0.1"/><axis xyz="{}"/>'
+            "</joint>".format(
+                name,
+                "revolute" if i < 7 else "fixed",
+                parent,
+                links[i + 1],
+                "0 1 0" if i % 2 else "0 0 1",
+            )
+        )
+    return "<robot>{}</robot>".format(
+        "".join('<link name="{}"/>'.format(link) for link in links) + "".join(joints)
+    )
+
+
+class _Loopback(ROSBridgeProtocol):
+    """A rosbridge client without a connection. It records the frames it
+    sends, and tests feed it frames from the server."""
+
+    def __init__(self):
+        ROSBridgeProtocol.__init__(self)
+        self.sent = []
+
+    def send(self, payload):
+        self.sent.append(json.loads(payload))
+
+    def respond(self, request, values, result=True):
+        self._handle_frame(
+            json.dumps(
+                {
+                    "op": "service_response",
+                    "id": request["id"],
+                    "service": request["service"],
+                    "values": values,
+                    "result": result,
+                }
+            ),
+            False,
+        )
+
+    def publish(self, topic, message):
+        self._handle_frame(
+            json.dumps({"op": "publish", "topic": topic, "msg": message}), False
+        )
+
+
+class _FakeRobot(_Loopback):
+    """Answers service calls in place of a robot. Load requests are only
+    answered once all four are outstanding, so serial loading would time out."""
+
+    def __init__(self):
+        _Loopback.__init__(self)
+        self._compression = "none"
+        self._state_rate = None
+        self._RBC = self
+        self.held = []
+        self.max_in_flight = 0
+        self.held_ik = []
+        self.ik_batch = 4
+        self.ik_seeds = []
+        self.published = {}
+
+    def send(self, payload):
+        _Loopback.send(self, payload)
+        message = self.sent[-1]
+        if message["op"] == "publish":
+            self.published.setdefault(message["topic"], []).append(message["msg"])
+        if message["op"] != "call_service":
+            return
+        service = message["service"]
+        if service.endswith("load_controller"):
+            self.held.append(message)
+            self.max_in_flight = max(self.max_in_flight, len(self.held))
+            if len(self.held) == 4:
+                held, self.held = self.held, []
+                for request in held:
+                    self.respond(request, {"ok": True})
+        elif service.endswith("inverse_kinematics"):
+            # Answered in batches, last first; the solution is the seed plus
+            # one, there's no solution for negative x, and the call fails for
+            # x below -5, as if the solver was unavailable
+            self.held_ik.append(message)
+            if len(self.held_ik) == self.ik_batch:
+                held, self.held_ik = self.held_ik, []
+                for request in reversed(held):
+                    args = request["args"]
+                    seed = args["seed_joint_positions"]
+                    self.ik_seeds.append(seed)
+                    x = args["end_effector_pose"]["pose"]["position"]["x"]
+                    if x >= 0:
+                        solution = (np.asarray(seed or [0.0] * 7) + 1).tolist()
+                        self.respond(request, {"ik_joint_positions": solution})
+                    elif x >= -5:
+                        self.respond(
+                            request,
+                            "service [{}] responded with an error: "
+                            "no solution".format(service),
+                            False,
+                        )
+                    else:
+                        self.respond(request, "timed out", False)
+        elif service == "/rosapi/get_param":
+            self.respond(message, {"value": json.dumps(_urdf())})
+        elif service == "/republish_tfs":
+            self.respond(message, {"topic_name": "/tf_repub"})
+        else:
+            self.respond(message, {})
+            self.publish_state()
+
+    def publish_state(self, positions=[0.0] * 7):
+        self.publish(
+            "/tf_repub",
+            {
+                "transforms": [
+                    {
+                        "transform": {
+                            "translation": {"x": 0, "y": 0, "z": 0},
+                            "rotation": {"x": 0, "y": 0, "z": 0, "w": 1},
+                        }
+                    }
+                ]
+            },
+        )
+        self.publish(
+            "/joint_states",
+            {
+                "name": _JOINT_NAMES,
+                "position": list(positions),
+                "velocity": [0.0] * 7,
+                "effort": [0.0] * 7,
+            },
+        )
+
+
+@pytest.fixture
+def make_protocol():
+    """Build rosbridge clients without a connection; see `_Loopback`."""
+    return _Loopback
+
+
+@pytest.fixture
+def robot():
+    """A fake robot to pass as the session of a `BlueInterface`."""
+    return _FakeRobot()
+
+
+@pytest.fixture
+def make_blue(monkeypatch, robot):
+    """Build a right arm `BlueInterface` talking to the `robot` fixture."""
+    from blue_interface import blue_interface
+
+    monkeypatch.setattr(blue_interface.atexit, "register", lambda *args, **kwargs: None)
+
+    def make_blue(**kwargs):
+        kwargs.setdefault("startup_timeout", 1.0)
+        return blue_interface.BlueInterface("right", session=robot, **kwargs)
+
+    return make_blue
+
+
+@pytest.fixture
+def chain():
+    """The kinematic chain of the `robot` fixture's URDF."""
+    from blue_interface.kinematics import KinematicChain
+
+    return KinematicChain.from_urdf(_urdf(), "base_link", "right_gripper_finger_link")
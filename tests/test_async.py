@@ -0,0 +1,118 @@
+import asyncio
+import json
+
+import pytest
+
+websockets = pytest.importorskip("websockets")
+
+
+async def _fake_rosbridge(websocket):
+    """Answer service calls with their own arguments, failing calls to /fail and
+    never answering calls to /slow, and publish one message on each topic as
+    soon as it's subscribed."""
+    async for frame in websocket:
+        request = json.loads(frame)
+        if request["op"] == "call_service" and request["service"] != "/slow":
+            await websocket.send(
+                json.dumps(
+                    {
+                        "op": "service_response",
+                        "id": request["id"],
+                        "service": request["service"],
+                        "values": request["args"],
+                        "result": request["service"] != "/fail",
+                    }
+                )
+            )
+        elif request["op"] == "subscribe":
+            await websocket.send(
+                json.dumps(
+                    {"op": "publish", "topic": request["topic"], "msg": {"data": 1}}
+                )
+            )
+
+
+def test_async_client_services_and_topics():
+    from blue_interface.async_rosbridge_client import AsyncROSBridgeClient
+    from blue_interface.rosbridge_client import ROSBridgeServiceError
+
+    async def main():
+        async with websockets.serve(_fake_rosbridge, "127.0.0.1", 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            async with AsyncROSBridgeClient("127.0.0.1", port) as client:
+                received = asyncio.get_event_loop().create_future()
+
+                def callback(message):
+                    received.set_result(message)
+
+                def broken(message):
+                    raise ValueError("boom")
+
+                # A failing callback doesn't take the reader down with it
+                client.subscriber("/broken", "std_msgs/Int32", broken)
+                client.subscriber("/chatter", "std_msgs/Int32", callback)
+                assert await asyncio.wait_for(received, 1.0) == {"data": 1}
+
+                service = client.service("/echo", "std_srvs/Trigger")
+                responses = await asyncio.gather(
+                    *[client.call_service(service, {"i": i}, 1.0) for i in range(10)]
+                )
+                assert responses == [{"i": i} for i in range(10)]
+
+                with pytest.raises(ROSBridgeServiceError):
+                    await client.call_service(
+                        client.service("/fail", "std_srvs/Trigger"), {}, 1.0
+                    )
+
+                # Timed out calls don't leave their callbacks behind
+                with pytest.raises(asyncio.TimeoutError):
+                    await client.call_service(
+                        client.service("/slow", "std_srvs/Trigger"), {}, 0.01
+                    )
+                assert len(client._services) == 0
+
+    asyncio.run(main())
+
+
+def test_async_client_send_errors(monkeypatch):
+    from blue_interface import AsyncBlueInterface
+    from blue_interface.async_rosbridge_client import AsyncROSBridgeClient
+    from blue_interface.rosbridge_client import ROSBridgeServiceError
+
+    closed = []
+    close = AsyncROSBridgeClient.close
+
+    async def recording_close(self):
+        closed.append(self)
+        await close(self)
+
+    monkeypatch.setattr(AsyncROSBridgeClient, "close", recording_close)
+
+    async def main():
+        async with websockets.serve(_fake_rosbridge, "127.0.0.1", 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            client = AsyncROSBridgeClient("127.0.0.1", port)
+            await client.connect()
+
+            async def broken_send(payload):
+                raise IOError("disconnected")
+
+            # A failed send fails pending calls right away, and closing
+            # doesn't wait for frames that will never be sent
+            client._websocket.send = broken_send
+            with pytest.raises(ROSBridgeServiceError):
+                await client.call_service(
+                    client.service("/echo", "std_srvs/Trigger"), {}, 10.0
+                )
+            client.send("{}")
+            await asyncio.wait_for(client.close(), 1.0)
+
+            # The fake never sends joint states, so startup times out, and the
+            # connection opened for it is closed
+            with pytest.raises(asyncio.TimeoutError):
+                await AsyncBlueInterface.create(
+                    "right", "127.0.0.1", port, startup_timeout=0.1
+                )
+            assert len(closed) == 2
+
+    asyncio.run(main())
@@ -0,0 +1,41 @@
+import struct
+
+import numpy as np
+
+
+def test_decode_joint_state_frame():
+    """Decode a hand-encoded rosbridge publish frame with a float64 typed array."""
+
+    from blue_interface import cbor
+
+    positions = np.array([0.5, -1.25, 3.0])
+    frame = (
+        b"\xa2"  # map(2)
+        + b"\x65topic"
+        + b"\x6d/joint_states"
+        + b"\x63msg"
+        + b"\xa2"  # map(2)
+        + b"\x64name"
+        + b"\x82\x61a\x61b"  # ["a", "b"]
+        + b"\x68position"
+        + b"\xd8\x56"  # tag(86): float64 little-endian typed array
+        + b"\x58\x18"  # bytes(24)
+        + positions.astype("<f8").tobytes()
+    )
+
+    data = cbor.loads(frame)
+    assert data["topic"] == "/joint_states"
+    assert data["msg"]["name"] == ["a", "b"]
+    assert isinstance(data["msg"]["position"], np.ndarray)
+    np.testing.assert_array_equal(data["msg"]["position"], positions)
+
+
+def test_decode_scalars():
+    from blue_interface import cbor
+
+    assert cbor.loads(b"\x17") == 23
+    assert cbor.loads(b"\x38\x63") == -100
+    assert cbor.loads(b"\xf5") is True
+    assert cbor.loads(b"\xf6") is None
+    assert cbor.loads(b"\xfb" + struct.pack(">d", 1.5)) == 1.5
+    assert cbor.loads(b"\x9f\x01\x02\xff") == [1, 2]
@@ -0,0 +1,254 @@
+import json
+
+import numpy as np
+
+
+def test_topic_dispatch(make_protocol):
+    rosbridge = make_protocol()
+    received = []
+    subscriber = rosbridge.subscriber("/chatter", "std_msgs/Int32", received.append)
+
+    rosbridge._handle_frame(
+        json.dumps({"op": "publish", "topic": "/chatter", "msg": {"data": 3}}), False
+    )
+    assert received == [{"data": 3}]
+
+    # Frames for topics without subscribers are dropped before decoding, so even
+    # a truncated frame is harmless
+    rosbridge._handle_frame(b'{"op": "publish", "topic": "/other", "msg": {', False)
+    rosbridge._handle_frame(b"\xa3\x62op\x67publish\x65topic\x66/other\xff", True)
+
+    subscriber.unregister()
+    rosbridge._handle_frame(
+        json.dumps({"op": "publish", "topic": "/chatter", "msg": {"data": 4}}), False
+    )
+    assert received == [{"data": 3}]
+    assert rosbridge.sent[-1]["op"] == "unsubscribe"
+
+
+def test_cbor_topic_dispatch(make_protocol):
+    rosbridge = make_protocol()
+    received = []
+    rosbridge.subscriber("/x", "std_msgs/Float64MultiArray", received.append, "cbor")
+
+    frame = (
+        b"\xa3\x62op\x67publish\x65topic\x62/x\x63msg"
+        + b"\xa1\x64data\xd8\x56\x48"
+        + np.array([1.0]).astype("<f8").tobytes()
+    )
+    rosbridge._handle_frame(frame, True)
+    assert len(received) == 1
+    np.testing.assert_array_equal(received[0]["data"], [1.0])
+
+
+def test_subscribe_options(make_protocol):
+    rosbridge = make_protocol()
+    rosbridge.subscriber("/plain", "std_msgs/Int32", None)
+    rosbridge.subscriber(
+        "/tuned",
+        "std_msgs/Int32",
+        None,
+        compression="cbor",
+        throttle_rate=50,
+        queue_length=1,
+        fragment_size=1000,
+    )
+    plain, tuned = rosbridge.sent
+    assert set(plain) == {"op", "id", "topic", "type"}
+    assert tuned["compression"] == "cbor"
+    assert tuned["throttle_rate"] == 50
+    assert tuned["queue_length"] == 1
+    assert tuned["fragment_size"] == 1000
+
+    # Later subscribers share the first subscription and its options
+    rosbridge.subscriber("/tuned", "std_msgs/Int32", None, throttle_rate=10)
+    assert len(rosbridge.sent) == 2
+
+
+def test_fragments_are_reassembled(make_protocol):
+    rosbridge = make_protocol()
+    received = []
+    rosbridge.subscriber("/chatter", "std_msgs/String", received.append)
+
+    message = json.dumps(
+        {"op": "publish", "topic": "/chatter", "msg": {"data": "x" * 100}}
+    )
+    pieces = [message[i : i + 30] for i in range(0, len(message), 30)]
+    # Fragments can arrive in any order, interleaved with other messages
+    for num in reversed(range(len(pieces))):
+        rosbridge._handle_frame(
+            json.dumps(
+                {
+                    "op": "fragment",
+                    "id": "publish:/chatter:1",
+                    "data": pieces[num],
+                    "num": num,
+                    "total": len(pieces),
+                }
+            ),
+            False,
+        )
+        if num == 2:
+            rosbridge.publish("/chatter", {"data": "y"})
+    assert received == [{"data": "y"}, {"data": "x" * 100}]
+    assert rosbridge._fragments == {}
+
+
+def test_state_rate_throttles_joint_states(make_protocol):
+    from blue_interface.blue_interface import _JointStateStream
+
+    rosbridge = make_protocol()
+    _JointStateStream.shared(rosbridge, "cbor", 20.0, ["a"], lambda message: None)
+    request = rosbridge.sent[-1]
+    assert request["topic"] == "/joint_states"
+    assert request["compression"] == "cbor"
+    assert request["throttle_rate"] == 50 and request["queue_length"] == 1
+
+    # Without a rate every joint state is sent, with rosbridge's default queue
+    rosbridge = make_protocol()
+    _JointStateStream.shared(rosbridge, "none", None, ["a"], lambda message: None)
+    request = rosbridge.sent[-1]
+    assert "throttle_rate" not in request and "queue_length" not in request
+    assert "compression" not in request
+
+
+def test_joint_state_stream_shared_between_arms(make_protocol):
+    import gc
+    import weakref
+
+    from blue_interface.blue_interface import _JointStateStream
+
+    rosbridge = make_protocol()
+    received = {"left": [], "right": []}
+    left = _JointStateStream.shared(
+        rosbridge, "none", None, ["left_a"], received["left"].append
+    )
+    right = _JointStateStream.shared(
+        rosbridge, "none", None, ["right_a"], received["right"].append
+    )
+    assert left is right
+    assert len([r for r in rosbridge.sent if r["op"] == "subscribe"]) == 1
+
+    rosbridge._handle_frame(
+        json.dumps(
+            {
+                "op": "publish",
+                "topic": "/joint_states",
+                "msg": {
+                    "name": ["left_a"],
+                    "position": [1.0],
+                    "velocity": [0.0],
+                    "effort": [0.0],
+                },
+            }
+        ),
+        False,
+    )
+    assert len(received["left"]) == 1 and len(received["right"]) == 0
+    assert isinstance(received["left"][0]["position"], np.ndarray)
+
+    # The last arm to detach unsubscribes, and nothing keeps the connection
+    # alive afterwards
+    left.detach(received["left"].append)
+    assert rosbridge.sent[-1]["op"] == "subscribe"
+    right.detach(received["right"].append)
+    assert rosbridge.sent[-1]["op"] == "unsubscribe"
+    assert rosbridge._joint_state_stream is None
+
+    reference = weakref.ref(rosbridge)
+    del rosbridge, left, right
+    gc.collect()
+    assert reference() is None
+
+
+def test_outbox_keeps_latest_command():
+    from blue_interface.rosbridge_client import _Outbox
+
+    outbox = _Outbox()
+    outbox.put("advertise")
+    outbox.put("command 1", "/command")
+    outbox.put("goal")
+    outbox.put("command 2", "/command")
+    outbox.close()
+
+    frames = []
+    frame = outbox.get()
+    while frame is not None:
+        frames.append(frame)
+        frame = outbox.get()
+    assert frames == ["advertise", "command 2", "goal"]
+
+
+def test_joint_state_extraction(robot, make_blue):
+    blue = make_blue()
+    seq = blue.get_state().seq
+    names = ["other", blue._gripper_joint_name] + blue._joint_names[::-1]
+    values = np.arange(len(names), dtype=np.float64)
+    message = {
+        "name": names,
+        "position": values.tolist(),
+        "velocity": (-values).tolist(),
+        "effort": (2 * values).tolist(),
+    }
+    robot.publish("/joint_states", message)
+    np.testing.assert_array_equal(blue.get_joint_positions(), values[:1:-1])
+    np.testing.assert_array_equal(blue.get_joint_velocities(), -values[:1:-1])
+    np.testing.assert_array_equal(blue.get_joint_torques(), 2 * values[:1:-1])
+    assert blue.get_gripper_position() == 1.0
+
+    # Getters return copies, and a new layout is picked up
+    positions = blue.get_joint_positions()
+    message["name"] = names[2:]
+    message["position"] = message["velocity"] = message["effort"] = (
+        values[2:] + 10
+    ).tolist()
+    robot.publish("/joint_states", message)
+    np.testing.assert_array_equal(blue.get_joint_positions(), values[:1:-1] + 10)
+    np.testing.assert_array_equal(positions, values[:1:-1])
+    assert blue._joint_state_layout[2] is None
+
+    # Snapshots are immutable and never change once taken
+    state = blue.get_state()
+    assert state.seq == seq + 2 and state.stamp is None
+    assert not state.joint_positions.flags.writeable
+    message["header"] = {"stamp": {"secs": 3, "nsecs": 500000000}}
+    message["position"] = (values[2:] + 20).tolist()
+    robot.publish("/joint_states", message)
+    np.testing.assert_array_equal(state.joint_positions, values[:1:-1] + 10)
+    assert blue.get_state().seq == seq + 3 and blue.get_state().stamp == 3.5
+    blue.shutdown()
+
+
+def test_concurrent_subscriptions(make_protocol):
+    import threading
+
+    rosbridge = make_protocol()
+
+    def subscribe(i):
+        for j in range(50):
+            topic_name = "/topic_{}_{}".format(i, j)
+            subscriber = rosbridge.subscriber(topic_name, "std_msgs/Int32", print)
+            rosbridge.subscriber(topic_name, "std_msgs/Int32", print)
+            subscriber.unregister()
+
+    threads = [threading.Thread(target=subscribe, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(rosbridge._subscribers) == len(rosbridge._dispatch_table) == 200
+
+
+def test_callback_errors_are_contained(make_protocol):
+    rosbridge = make_protocol()
+    received = []
+
+    def broken(message):
+        raise ValueError("boom")
+
+    rosbridge.subscriber("/chatter", "std_msgs/Int32", broken)
+    rosbridge.subscriber("/chatter", "std_msgs/Int32", received.append)
+    rosbridge._handle_frame(
+        json.dumps({"op": "publish", "topic": "/chatter", "msg": {"data": 3}}), False
+    )
+    assert received == [{"data": 3}]
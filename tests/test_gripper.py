@@ -0,0 +1,26 @@
+from concurrent.futures import TimeoutError
+
+import pytest
+
+_GRIPPER_TOPIC = "/right_arm/blue_controllers/gripper_controller/gripper_cmd"
+
+
+def test_command_gripper(robot, make_blue):
+    blue = make_blue(service_timeout=0.1)
+    blue.disable_gripper_async().result(1.0)
+    assert not blue._gripper_enabled
+
+    # Goals enable the gripper, and resolve once it reaches the goal
+    future = blue.command_gripper_async(1.0, 2.0)
+    assert blue._gripper_enabled and not future.done()
+    result = {"stalled": False, "reached_goal": True}
+    robot.publish(
+        _GRIPPER_TOPIC + "/result",
+        {"status": {"goal_id": {"id": blue._gripper_goal_id}}, "result": result},
+    )
+    assert future.result(0) == result
+
+    # Waiting is bounded by the service timeout
+    with pytest.raises(TimeoutError):
+        blue.command_gripper(1.0, 2.0, wait=True)
+    blue.shutdown()
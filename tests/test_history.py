@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+
+def _values(i):
+    return np.full((3, 7), float(i))
+
+
+def test_history_wraps_without_copying():
+    from blue_interface.history import _HistoryBuffer
+
+    history = _HistoryBuffer(4)
+    assert len(history.latest(4).seq) == 0
+    for i in range(1, 11):
+        history.append(i, 100.0 + i, None, _values(i))
+
+    latest = history.latest(10)
+    np.testing.assert_array_equal(latest.seq, [7, 8, 9, 10])
+    np.testing.assert_array_equal(latest.joint_positions[:, 0], [7, 8, 9, 10])
+    assert np.isnan(latest.stamp).all()
+    assert np.shares_memory(latest.joint_torques, history._values)
+    with pytest.raises(ValueError):
+        latest.joint_positions[0, 0] = 0.0
+
+    np.testing.assert_array_equal(history.since_seq(8).seq, [9, 10])
+    np.testing.assert_array_equal(history.since_seq(0).seq, [7, 8, 9, 10])
+    np.testing.assert_array_equal(history.window(1.5).seq, [9, 10])
+
+
+def test_history_views_survive_next_sample():
+    from blue_interface.history import _HistoryBuffer
+
+    history = _HistoryBuffer(4)
+    for i in range(1, 11):
+        history.append(i, 100.0 + i, None, _values(i))
+
+    for get in (
+        lambda: history.latest(4),
+        lambda: history.since_seq(0),
+        lambda: history.window(10.0),
+    ):
+        latest = get()
+        seq = latest.seq.copy()
+        positions = latest.joint_positions.copy()
+        history.append(seq[-1] + 100, 1000.0 + seq[-1], None, _values(-1))
+        np.testing.assert_array_equal(latest.seq, seq)
+        np.testing.assert_array_equal(latest.joint_positions, positions)
+
+    # Shorter histories last for more samples
+    latest = history.latest(2)
+    seq = latest.seq.copy()
+    for i in range(3):
+        history.append(1000 + i, 2000.0 + i, None, _values(i))
+    np.testing.assert_array_equal(latest.seq, seq)
@@ -0,0 +1,40 @@
+import numpy as np
+
+
+def test_lru_eviction_and_counters():
+    from blue_interface import IKCache
+
+    cache = IKCache(max_size=2)
+    keys = [
+        cache.key([i, 0, 0], [0, 0, 0, 1], [], "trac-ik", "right") for i in range(3)
+    ]
+    cache.put(keys[0], np.zeros(7))
+    cache.put(keys[1], np.ones(7))
+    assert cache.get(keys[0]) is not None  # now most recently used
+    cache.put(keys[2], np.asarray([]))
+    assert cache.get(keys[1]) is None
+    assert len(cache.get(keys[2])) == 0
+    assert (cache.hits, cache.misses) == (2, 1)
+
+    # Nearby poses, and the equivalent negated quaternion, share an entry
+    assert cache.key([1e-6, 0, 0], [0, 0, 0, -1], [], "trac-ik", "right") == keys[0]
+
+    # Each arm has its own entries
+    assert cache.key([0, 0, 0], [0, 0, 0, 1], [], "trac-ik", "left") != keys[0]
+
+    cache.invalidate()
+    assert len(cache) == 0
+
+
+def test_save_and_load(tmpdir):
+    from blue_interface import IKCache
+
+    cache = IKCache(max_size=10, position_resolution=1e-3)
+    key = cache.key([0.1, 0.2, 0.3], [0, 0, 0, 1], np.zeros(7), "trac-ik", "right")
+    cache.put(key, np.arange(7.0))
+    path = str(tmpdir.join("ik_cache.json"))
+    cache.save(path)
+
+    loaded = IKCache.load(path)
+    assert loaded.position_resolution == 1e-3
+    np.testing.assert_array_equal(loaded.get(key), np.arange(7.0))
@@ -0,0 +1,66 @@
+import numpy as np
+
+
+def test_inverse_kinematics_many(robot, make_blue):
+    blue = make_blue()
+
+    positions = np.zeros((8, 3))
+    positions[5, 0] = -1.0
+    orientations = np.tile([0.0, 0.0, 0.0, 1.0], (8, 1))
+    solutions, success = blue.inverse_kinematics_many(
+        positions, orientations, max_in_flight=4
+    )
+    np.testing.assert_array_equal(success, np.arange(8) != 5)
+    assert np.isnan(solutions[5]).all()
+
+    # The first window has no seeds; the second is seeded from pose 3, the
+    # latest solved pose before it
+    assert robot.ik_seeds[:4] == [[]] * 4
+    assert robot.ik_seeds[4:] == [[1.0] * 7] * 4
+    np.testing.assert_array_equal(solutions[6], [2.0] * 7)
+
+
+def test_inverse_kinematics_cache(robot, make_blue):
+    from blue_interface import IKCache
+
+    robot.ik_batch = 1
+    cache = IKCache()
+    blue = make_blue(ik_cache=cache)
+    orientation = [0.0, 0.0, 0.0, 1.0]
+    seed = np.zeros(7)
+    assert len(blue.inverse_kinematics([1.0, 0, 0], orientation, seed)) == 7
+    assert len(blue.inverse_kinematics([-1.0, 0, 0], orientation, seed)) == 0
+    assert len(blue.inverse_kinematics([-9.0, 0, 0], orientation, seed)) == 0
+    assert len(robot.ik_seeds) == 3
+
+    # Solutions and poses with no solution are cached, failed calls aren't
+    blue.inverse_kinematics([1.0, 0, 0], orientation, seed)
+    blue.inverse_kinematics([-1.0, 0, 0], orientation, seed)
+    blue.inverse_kinematics([-9.0, 0, 0], orientation, seed)
+    assert len(robot.ik_seeds) == 4 and len(cache) == 2
+
+    # The other arm doesn't get this arm's solutions
+    key = cache.key([1.0, 0, 0], orientation, seed, "trac-ik", "right")
+    assert cache.get(key) is not None
+    assert (
+        cache.get(cache.key([1.0, 0, 0], orientation, seed, "trac-ik", "left")) is None
+    )
+    blue.shutdown()
+
+
+def test_local_inverse_kinematics_cache(robot, make_blue, chain):
+    from blue_interface import IKCache
+
+    cache = IKCache()
+    blue = make_blue(ik_cache=cache)
+    start = np.array([0.3, -0.6, 0.4, 0.9, -0.2, 0.5, 0.1])
+    position, orientation = chain.forward_kinematics(start)
+
+    # Solutions are cached, but failures aren't, since the solver might
+    # succeed from another start
+    far = position + [10.0, 0.0, 0.0]
+    assert len(blue.inverse_kinematics(far, orientation, solver="local")) == 0
+    assert len(cache) == 0
+    solution = blue.inverse_kinematics(position, orientation, start, "local")
+    assert len(solution) == 7 and len(cache) == 1
+    blue.shutdown()
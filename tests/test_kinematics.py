@@ -0,0 +1,189 @@
+import numpy as np
+
+_URDF = """
+<robot name="test">
+  <link name="base_link"/>
+  <link name="a"/>
+  <link name="b"/>
+  <link name="c"/>
+  <link name="tip"/>
+  <joint name="mount" type="fixed">
+    <parent link="base_link"/>
+    <child link="a"/>
+    <origin xyz="0 0 1" rpy="0 0 1.5707963267948966"/>
+  </joint>
+  <joint name="shoulder" type="revolute">
+    <parent link="a"/>
+    <child link="b"/>
+    <axis xyz="0 0 1"/>
+    <limit lower="-1" upper="1"/>
+  </joint>
+  <joint name="elbow" type="continuous">
+    <parent link="b"/>
+    <child link="c"/>
+    <origin xyz="1 0 0"/>
+    <axis xyz="0 0 1"/>
+  </joint>
+  <joint name="wrist" type="fixed">
+    <parent link="c"/>
+    <child link="tip"/>
+    <origin xyz="1 0 0"/>
+  </joint>
+</robot>
+"""
+
+
+def _chain():
+    from blue_interface.kinematics import KinematicChain
+
+    return KinematicChain.from_urdf(_URDF, "base_link", "tip")
+
+
+def test_forward_kinematics():
+    chain = _chain()
+    assert chain.joint_names == ["shoulder", "elbow"]
+    np.testing.assert_array_equal(chain.lower, [-1, -np.inf])
+
+    # Planar two-link arm, rotated 90 degrees and raised 1m by the mount
+    q = np.array([[0.0, 0.0], [0.5, -0.25], [-1.0, 2.0]])
+    position, orientation = chain.forward_kinematics(q)
+    heading = np.pi / 2 + q[:, 0]
+    expected_x = np.cos(heading) + np.cos(heading + q[:, 1])
+    expected_y = np.sin(heading) + np.sin(heading + q[:, 1])
+    np.testing.assert_allclose(position[:, 0], expected_x, atol=1e-12)
+    np.testing.assert_allclose(position[:, 1], expected_y, atol=1e-12)
+    np.testing.assert_allclose(position[:, 2], 1.0)
+
+    yaw = heading + q[:, 1]
+    np.testing.assert_allclose(orientation[:, 2], np.abs(np.sin(yaw / 2)), atol=1e-12)
+    np.testing.assert_allclose(orientation[:, 3], np.abs(np.cos(yaw / 2)), atol=1e-12)
+
+    single_position, single_orientation = chain.forward_kinematics(q[1])
+    np.testing.assert_allclose(single_position, position[1])
+    np.testing.assert_allclose(single_orientation, orientation[1])
+
+
+def test_matrix_to_quaternion_round_trip():
+    from blue_interface.kinematics import matrix_to_quaternion
+
+    rng = np.random.RandomState(0)
+    quaternions = rng.normal(size=(100, 4))
+    quaternions /= np.linalg.norm(quaternions, axis=1, keepdims=True)
+    quaternions *= np.sign(quaternions[:, 3:])
+    x, y, z, w = quaternions.T
+    rotations = np.stack(
+        [
+            np.stack(
+                [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)], -1
+            ),
+            np.stack(
+                [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)], -1
+            ),
+            np.stack(
+                [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)], -1
+            ),
+        ],
+        -2,
+    )
+    np.testing.assert_allclose(matrix_to_quaternion(rotations), quaternions, atol=1e-12)
+
+
+def test_jacobian_matches_finite_differences():
+    from blue_interface.kinematics import KinematicChain
+
+    # Make the elbow a prismatic joint along a diagonal axis
+    urdf = _URDF.replace(
+        """type="continuous">
+    <parent link="b"/>
+    <child link="c"/>
+    <origin xyz="1 0 0"/>
+    <axis xyz="0 0 1"/>""",
+        """type="prismatic">
+    <parent link="b"/>
+    <child link="c"/>
+    <origin xyz="1 0 0"/>
+    <axis xyz="1 1 0"/>""",
+    )
+    chain = KinematicChain.from_urdf(urdf, "base_link", "tip")
+    q = np.array([[0.3, 0.2], [-0.7, 0.5]])
+    position, _, jacobian = chain.forward_kinematics_and_jacobian(q)
+    assert jacobian.shape == (2, 6, 2)
+    np.testing.assert_allclose(chain.jacobian(q[0]), jacobian[0])
+
+    epsilon = 1e-6
+    for i in range(2):
+        dq = np.zeros(2)
+        dq[i] = epsilon
+        moved = chain.tip_transform(q + dq)
+        np.testing.assert_allclose(
+            (moved[:, :3, 3] - position) / epsilon, jacobian[:, :3, i], atol=1e-5
+        )
+        # Angular velocity from the rotation's finite difference
+        rotation = chain.tip_transform(q)[:, :3, :3]
+        skew = np.matmul(moved[:, :3, :3] - rotation, np.swapaxes(rotation, 1, 2))
+        omega = np.stack([skew[:, 2, 1], skew[:, 0, 2], skew[:, 1, 0]], -1) / epsilon
+        np.testing.assert_allclose(omega, jacobian[:, 3:, i], atol=1e-5)
+
+
+def _seven_joint_chain():
+    from blue_interface.kinematics import KinematicChain
+
+    # A 7-joint arm with alternating axes
+    links = "".join('<link name="l{}"/>'.format(i) for i in range(9))
+    joints = "".join(
+        '<joint name="j{0}" type="revolute"><parent link="l{0}"/>'
+        '<child link="l{1}"/><origin xyz="0 0 0.2"/><axis xyz="{2}"/>'
+        '<limit lower="-2.5" upper="2.5"/></joint>'.format(
+            i, i + 1, "0 0 1" if i % 2 == 0 else "0 1 0"
+        )
+        for i in range(7)
+    )
+    tip = (
+        '<joint name="tip" type="fixed"><parent link="l7"/><child link="l8"/>'
+        '<origin xyz="0 0 0.1"/></joint>'
+    )
+    return KinematicChain.from_urdf(
+        "<robot>{}{}{}</robot>".format(links, joints, tip), "l0", "l8"
+    )
+
+
+def test_inverse_kinematics_batch():
+    chain = _seven_joint_chain()
+    rng = np.random.RandomState(1)
+    targets = rng.uniform(-1.0, 1.0, size=(20, 7))
+    position, orientation = chain.forward_kinematics(targets)
+    seeds = np.clip(targets + rng.normal(scale=0.3, size=targets.shape), -2.5, 2.5)
+    solutions, success = chain.inverse_kinematics(position, orientation, seeds)
+    assert success.mean() > 0.9
+    assert np.all(np.abs(solutions) <= 2.5)
+
+    solved_position, solved_orientation = chain.forward_kinematics(solutions[success])
+    np.testing.assert_allclose(solved_position, position[success], atol=1e-3)
+    dot = np.abs(np.sum(solved_orientation * orientation[success], axis=-1))
+    np.testing.assert_allclose(dot, 1.0, atol=1e-5)
+
+    single, single_success = chain.inverse_kinematics(
+        position[0], orientation[0], seeds[0]
+    )
+    assert single.shape == (7,) and single_success == success[0]
+
+
+def test_workspace_map_seeds(tmpdir):
+    from blue_interface import WorkspaceMap
+
+    chain = _seven_joint_chain()
+    path = str(tmpdir.join("workspace.npy"))
+    workspace_map = WorkspaceMap.sample(chain, 20000, path, batch_size=3000, seed=0)
+    assert isinstance(workspace_map.table, np.memmap)
+    assert workspace_map.table.dtype == np.float32
+
+    rng = np.random.RandomState(2)
+    targets = rng.uniform(-1.5, 1.5, size=(10, 7))
+    positions, orientations = chain.forward_kinematics(targets)
+    for position, orientation in zip(positions, orientations):
+        seed = workspace_map.nearest(position, orientation)
+        seed_position, _ = chain.forward_kinematics(seed)
+        assert np.linalg.norm(seed_position - position) < 0.1
+
+    # Far outside the workspace still finds something
+    assert workspace_map.nearest([10.0, 0, 0], [0, 0, 0, 1]).shape == (7,)
@@ -0,0 +1,64 @@
+import time
+
+import numpy as np
+
+_POSITION_TOPIC = "/right_arm/blue_controllers/joint_position_controller/command"
+
+
+def test_move_cartesian(robot, make_blue, chain):
+    blue = make_blue(stream_rate=200.0)
+    start = np.array([0.3, -0.6, 0.4, 0.9, -0.2, 0.5, 0.1])
+    robot.publish_state(start)
+    position, orientation = chain.forward_kinematics(start)
+
+    # A straight line out and back, holding orientation
+    line = position + [[0.03, 0.0, 0.0], [0.03, 0.02, 0.0], [0.0, 0.0, 0.0]]
+    handle = blue.move_cartesian(
+        line, np.tile(orientation, (3, 1)), 0.2, max_step=0.005, solver="local"
+    )
+    assert handle.status == "finished", handle.error
+
+    targets = np.array([m["data"] for m in robot.published[_POSITION_TOPIC]])
+    assert len(targets) > 20
+
+    # Every target stays on the path, which is in the xy plane, and the arm
+    # gets to the far corner and back
+    offsets = chain.forward_kinematics(targets)[0] - position
+    assert np.all(np.abs(offsets[:, 2]) < 1e-3)
+    assert np.max(offsets[:, 0]) > 0.029 and np.max(offsets[:, 1]) > 0.019
+    np.testing.assert_allclose(offsets[-1], 0.0, atol=1e-3)
+
+    # Unreachable poses fail, stopping at the last good target
+    handle = blue.move_cartesian(
+        position + [[10.0, 0.0, 0.0]], [orientation], 0.1, solver="local"
+    )
+    assert handle.status == "failed"
+    assert "No inverse kinematics solution" in str(handle.error)
+    blue.shutdown()
+
+
+def test_set_cartesian_velocity(robot, make_blue, chain):
+    blue = make_blue(stream_rate=200.0)
+    start = np.array([0.3, -0.6, 0.4, 0.9, -0.2, 0.5, 0.1])
+    robot.publish_state(start)
+    position, orientation = chain.forward_kinematics(start)
+
+    handle = blue.set_cartesian_velocity([0.05, 0, 0, 0, 0, 0], timeout=0.1)
+    for _ in range(10):
+        # The arm tracks its targets, moving the Jacobian along with it
+        time.sleep(0.01)
+        robot.publish_state(robot.published[_POSITION_TOPIC][-1]["data"])
+        assert blue.set_cartesian_velocity([0.05, 0, 0, 0, 0, 0]) is handle
+
+    # Moves along x, then holds once updates stop
+    time.sleep(0.2)
+    targets = np.array([m["data"] for m in robot.published[_POSITION_TOPIC]])
+    np.testing.assert_array_equal(targets[-1], targets[-2])
+    offset = chain.forward_kinematics(targets[-1])[0] - position
+    assert 0.003 < offset[0] < 0.02
+    assert np.all(np.abs(offset[1:]) < 0.1 * offset[0])
+
+    handle.cancel()
+    assert handle.status == "cancelled"
+    assert blue.set_cartesian_velocity(np.zeros(6)) is not handle
+    blue.shutdown()
@@ -0,0 +1,39 @@
+from concurrent.futures import TimeoutError
+
+import pytest
+
+
+def test_service_futures(make_protocol):
+    from blue_interface.rosbridge_client import ROSBridgeServiceError
+
+    rosbridge = make_protocol()
+    service = rosbridge.service("/add", "rospy_tutorials/AddTwoInts")
+
+    futures = [service.call_async({"a": i, "b": 1}) for i in range(5)]
+    assert len(set(r["id"] for r in rosbridge.sent)) == 5
+
+    # Responses can arrive in any order
+    for request in reversed(rosbridge.sent[1:]):
+        rosbridge.respond(request, {"sum": request["args"]["a"] + 1})
+    rosbridge.respond(rosbridge.sent[0], "boom", False)
+
+    assert [f.result(0) for f in futures[1:]] == [{"sum": i + 1} for i in range(1, 5)]
+    with pytest.raises(ROSBridgeServiceError):
+        futures[0].result(0)
+
+
+def test_service_timeout_and_cancel(make_protocol):
+    rosbridge = make_protocol()
+    service = rosbridge.service("/slow", "std_srvs/Trigger")
+
+    timed_out = service.call_async({}, timeout=0.01)
+    with pytest.raises(TimeoutError):
+        timed_out.result(1.0)
+
+    cancelled = service.call_async({})
+    assert cancelled.cancel()
+
+    # Late responses are dropped
+    for request in rosbridge.sent:
+        rosbridge.respond(request, {})
+    assert len(rosbridge._services) == 0
@@ -0,0 +1,51 @@
+import threading
+from concurrent.futures import TimeoutError
+
+import numpy as np
+import pytest
+
+
+def test_controllers_load_concurrently(robot, make_blue):
+    blue = make_blue(service_timeout=1.0)
+    assert robot.max_in_flight == 4
+    assert set(blue.get_startup_times()) == {
+        "connect",
+        "controllers",
+        "state",
+        "total",
+    }
+
+    blue.shutdown()
+    assert robot.max_in_flight == 4 and len(robot.held) == 0
+
+
+def test_wait_for_state(robot, make_blue):
+    blue = make_blue()
+
+    seq = blue.get_state().seq
+    assert blue.wait_for_state(seq - 1).seq == seq
+    with pytest.raises(TimeoutError):
+        blue.wait_for_state(timeout=0.01)
+
+    threading.Timer(0.01, robot.publish_state).start()
+    assert blue.wait_for_state(seq, timeout=1.0).seq == seq + 1
+
+    states = blue.stream_states(on_overrun="raise", timeout=1.0)
+    threading.Timer(0.01, robot.publish_state).start()
+    assert next(states).seq == seq + 2
+    robot.publish_state()
+    robot.publish_state()
+    with pytest.raises(RuntimeError):
+        next(states)
+
+
+def test_local_end_effector_pose(robot, make_blue, chain):
+    blue = make_blue()
+    assert robot._dispatch_table.get("/tf_repub") is None
+
+    positions = np.linspace(-1.0, 1.0, 7)
+    robot.publish_state(positions)
+    position, orientation = chain.forward_kinematics(positions)
+    state = blue.get_state()
+    np.testing.assert_allclose(state.end_effector_position, position)
+    np.testing.assert_allclose(blue.get_cartesian_pose()["orientation"], orientation)
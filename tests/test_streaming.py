@@ -0,0 +1,163 @@
+import numpy as np
+import pytest
+
+
+def test_stream_scheduler():
+    from blue_interface.streaming import _linear_joint_motion, _StreamScheduler
+
+    scheduler = _StreamScheduler(200.0)
+    published = []
+    handle = scheduler.start(
+        _linear_joint_motion(np.zeros(7), np.ones(7), 0.1), published.append
+    )
+    assert handle.wait(2.0) and handle.status == "finished"
+    np.testing.assert_array_equal(published[-1], np.ones(7))
+    assert np.all(np.diff([p[0] for p in published]) >= 0)
+    assert scheduler.current_target() is None
+
+    # Ticks are counted against absolute deadlines
+    stats = scheduler.stats()
+    assert stats["ticks"] == len(published)
+    assert 10 <= stats["ticks"] <= 25
+
+    # Starting a motion preempts the running one
+    def never(elapsed):
+        return np.zeros(7), False
+
+    first = scheduler.start(never, published.append)
+    second = scheduler.start(never, published.append)
+    assert first.done() and first.status == "preempted"
+    assert not second.done()
+    first.cancel()
+    assert not second.done()
+    second.cancel()
+    assert second.wait(1.0) and second.status == "cancelled"
+
+    # Stopping cancels the running motion and joins the thread
+    third = scheduler.start(never, published.append)
+    scheduler.stop()
+    assert third.status == "cancelled"
+    assert not scheduler._thread.is_alive()
+
+
+def test_stream_scheduler_publish_errors():
+    from blue_interface.streaming import _StreamScheduler
+
+    scheduler = _StreamScheduler(200.0)
+
+    def never(elapsed):
+        return np.zeros(7), False
+
+    # A failing publish fails the motion instead of killing the thread
+    def broken(target):
+        raise IOError("disconnected")
+
+    failed = scheduler.start(never, broken)
+    assert failed.wait(1.0) and failed.status == "failed"
+
+    # A motion preempted while it's sampled doesn't publish its target
+    published = []
+    replacement = []
+
+    def preempting(elapsed):
+        replacement.append(scheduler.start(never, lambda target: None))
+        return np.ones(7), False
+
+    preempted = scheduler.start(preempting, published.append)
+    assert preempted.wait(1.0) and preempted.status == "preempted"
+    assert published == []
+    assert not replacement[0].done()
+    scheduler.stop()
+
+
+def test_plan_trajectory():
+    from blue_interface.trajectory import _plan_trajectory, _table_motion
+
+    period = 0.01
+    waypoints = np.array([[1.0, 0.0], [0.5, 1.0], [2.0, 2.0]])
+    times = np.array([1.0, 2.0, 3.5])
+    for profile in ("cubic", "quintic", "min_jerk"):
+        table = _plan_trajectory(np.zeros(2), waypoints, times, profile, period)
+        assert table.shape == (351, 2) and not table.flags.writeable
+        np.testing.assert_allclose(table[[0, 100, 200, 350]][1:], waypoints)
+
+        # Smooth, and starting and ending at rest
+        velocity = np.diff(table, axis=0) / period
+        assert np.all(np.abs(velocity[[0, -1]]) < 0.05)
+        assert np.all(np.abs(np.diff(velocity, axis=0)) / period < 10)
+
+        limited = _plan_trajectory(
+            np.zeros(2),
+            waypoints,
+            times,
+            profile,
+            period,
+            max_velocity=[0.5, 1.0],
+            max_acceleration=2.0,
+        )
+        assert len(limited) > len(table)
+        velocity = np.diff(limited, axis=0) / period
+        assert np.all(np.max(np.abs(velocity), axis=0) <= [0.501, 1.001])
+        assert np.max(np.abs(np.diff(velocity, axis=0))) / period <= 2.01
+
+    # Min jerk stops at each waypoint, while the others keep moving through
+    # waypoints on a monotonic stretch
+    cubic = _plan_trajectory(np.zeros(2), waypoints, times, "cubic", period)
+    min_jerk = _plan_trajectory(np.zeros(2), waypoints, times, "min_jerk", period)
+    assert abs(cubic[201, 1] - cubic[199, 1]) > 0.01
+    assert abs(min_jerk[201, 1] - min_jerk[199, 1]) < 0.001
+
+    sample = _table_motion(table, period)
+    target, finished = sample(0.0)
+    np.testing.assert_array_equal(target, table[0])
+    assert not finished
+    np.testing.assert_array_equal(sample(1.0005)[0], table[100])
+    np.testing.assert_array_equal(sample(10.0)[0], waypoints[-1])
+    assert sample(10.0)[1]
+
+
+def test_densify_path():
+    from blue_interface.trajectory import _densify_path
+
+    positions = np.array([[0.0, 0.0, 0.0], [0.1, 0.0, 0.0], [0.1, 0.0, 0.0]])
+    # The last orientation is a half turn about z, written with a flipped sign
+    orientations = np.array(
+        [[0.0, 0.0, 0.0, 1.0], [0.0, 0.0, 0.0, 1.0], [0.0, 0.0, -1.0, 0.0]]
+    )
+    dense_positions, dense_orientations, progress = _densify_path(
+        positions, orientations, 0.01, 0.1
+    )
+    np.testing.assert_allclose(dense_positions[[0, -1]], positions[[0, -1]])
+    assert np.all(
+        np.linalg.norm(np.diff(dense_positions, axis=0), axis=1) <= 0.01 + 1e-9
+    )
+    dots = np.abs(np.sum(dense_orientations[:-1] * dense_orientations[1:], axis=1))
+    assert np.all(2 * np.arccos(np.minimum(dots, 1.0)) <= 0.1 + 1e-9)
+    assert np.abs(np.dot(dense_orientations[-1], orientations[-1])) > 1 - 1e-9
+    assert progress[0] == 0.0 and progress[-1] == 1.0
+    assert np.all(np.diff(progress) > 0)
+
+
+def test_path_motion_waits_for_solver():
+    from blue_interface.trajectory import _PathMotion
+
+    solutions = np.full((3, 7), np.nan)
+    success = np.array([True, False, False])
+    solutions[0] = 0.0
+    motion = _PathMotion(np.array([0.0, 0.5, 1.5, 2.0]), 1.0, solutions, success, 0.5)
+
+    # Holds the start, with its clock stopped, until pose 1 is solved
+    np.testing.assert_array_equal(motion(0.5)[0], solutions[0])
+    solutions[1] = 0.1
+    success[1] = True
+    assert motion.solved(1)
+    target, finished = motion(1.5)
+    np.testing.assert_allclose(target, 0.05)
+    assert not finished
+
+    # A jump fails the motion once it's reached
+    solutions[2] = 1.0
+    success[2] = True
+    assert not motion.solved(2)
+    with pytest.raises(RuntimeError, match="jump"):
+        motion(2.5)
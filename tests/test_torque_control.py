@@ -0,0 +1,40 @@
+import numpy as np
+
+
+def test_run_torque_controller(robot, make_blue):
+    blue = make_blue()
+    topic = "/right_arm/blue_controllers/joint_torque_controller/command"
+
+    seqs = []
+
+    def controller(state):
+        seqs.append(state.seq)
+        return -2.0 * state.joint_positions
+
+    handle = blue.run_torque_controller(controller)
+    for i in range(3):
+        robot.publish_state(np.full(7, float(i)))
+    assert seqs == list(range(seqs[0], seqs[0] + 3))
+    np.testing.assert_array_equal(robot.published[topic][-1]["data"], [-4.0] * 7)
+    stats = blue.get_torque_controller_stats()
+    assert stats["cycles"] == 3
+    assert 0 <= stats["mean_latency"] <= stats["max_latency"]
+
+    # Errors send zero torques and stop the controller
+    def broken(state):
+        raise ValueError("boom")
+
+    assert blue.run_torque_controller(broken) is not handle
+    assert handle.status == "preempted"
+    broken_handle = blue.run_torque_controller(broken)
+    robot.publish_state()
+    robot.publish_state()
+    assert broken_handle.status == "failed"
+    assert isinstance(broken_handle.error, ValueError)
+    np.testing.assert_array_equal(robot.published[topic][-1]["data"], [0.0] * 7)
+    assert len(robot.published[topic]) == 4
+
+    handle = blue.run_torque_controller(controller)
+    blue.set_joint_positions(np.zeros(7))
+    assert handle.status == "preempted"
+    blue.shutdown()